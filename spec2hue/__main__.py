@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""
+python -m spec2hue: 命令行批量计算, 见 batch.py
+python -m spec2hue watch: 监视文件夹增量计算, 见 watch.py
+"""
+import os.path
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+if sys.argv[1:2] == ['watch']:
+    from watch import main  # noqa: E402
+    sys.exit(main(sys.argv[2:]))
+
+from batch import main  # noqa: E402
+
+sys.exit(main())
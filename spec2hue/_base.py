@@ -1,91 +1,11 @@
 ﻿# -*- coding: utf-8 -*-
-import csv
 import json
 import os.path
-from itertools import chain
-from typing import Dict, List, Literal, Tuple, Union
+from typing import Dict, Literal, Union
 
-import chardet
-import openpyxl
-import pdfplumber
 import wx
-import xlrd
-
-
-def get_encoding(path: str) -> str:
-    """读取csv的编码"""
-    detect = chardet.detect(open(path, 'rb').read(4096))
-    return detect['encoding']
-
-
-def get_delimiter(path: str) -> Tuple[str, str]:
-    """读取csv的分隔符 return (delimiter, encoding)"""
-    sniffer = csv.Sniffer()
-    encoding = get_encoding(path)
-    with open(path, encoding=encoding) as fp:
-        delimiter = sniffer.sniff(fp.read(4096)).delimiter
-    return delimiter, encoding
-
-
-def read_txt(
-    path: str,
-    header: Union[int, None] = None,
-    col: slice = slice(0, None, None)
-) -> Tuple[List[List[str]], List[str]]:
-    """
-    读取csv txt
-
-    Parameters
-    ----------
-    path: str
-        地址
-    header: int | None
-        表头行号 int 从0开始计数; 若无表头None
-    col: slice
-        列读取范围
-
-    Returns
-    -------
-    data: List[List[str]]
-        读取的数据
-    header: List[str]
-        表头
-    """
-    delimiter, encoding = get_delimiter(path)
-    with open(path, encoding=encoding, newline='') as csvfile:
-        csv_reader = csv.reader(csvfile, delimiter=delimiter)
-        if header is None:
-            data_header = []
-        elif isinstance(header, int):
-            for _ in range(header):
-                next(csv_reader)
-            data_header = next(csv_reader)[col]
-        else:
-            raise ValueError('header')
-
-        data = [row[col] for row in csv_reader]
-    return data, data_header
-
-
-def read_pdf(path: str, data_ye: int = 0) -> List[List[str]]:
-    """
-    读取表格pdf
-    data_ye为数据跨了几页 0为数据单页
-    """
-    assert isinstance(data_ye, int)
-    data_ye += 1
-    arr_t, arr_0, num = [], [], 0
-    with pdfplumber.open(path) as pdf:
-        for page in pdf.pages:
-            table = page.extract_table()
-            del table[0]
-            arr_0.append(table)
-            num += 1
-            if num % data_ye == 0:
-                arr_t.append(list(chain.from_iterable(arr_0)))
-                arr_0 = []
-    pdf.flush_cache()  # 清理缓存 解除占用
-    return list(chain.from_iterable(arr_t))
+from reader import (close_book, get_delimiter, get_encoding, open_book,
+                    pdf_pages, read_pdf, read_txt, read_xls, read_xlsx)
 
 
 def line_h(parent):  # 横线
@@ -137,6 +57,8 @@ class ReadFileData(wx.Dialog):
         self.FONT0 = wx.Font(14, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_NORMAL,
                              wx.FONTWEIGHT_NORMAL, False, self.WIDGETS_LABEL['font'])
         self._suffix = self._path.rpartition('.')[-1].lower()
+        self._book = None  # 缓存的工作簿 只打开一次
+        self._n_pages = None  # pdf 的页数, 读取时不再打开文件计数
         self._init_ui()
         if self._suffix == 'pdf':
             self._init_ui_0()
@@ -179,6 +101,8 @@ class ReadFileData(wx.Dialog):
 
         self.Bind(wx.EVT_BUTTON, self._on_ok, self.btn_ok)
         self.Bind(wx.EVT_BUTTON, self._on_cancel, self.btn_cancel)
+        self.Bind(wx.EVT_CLOSE, self._on_close)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self._on_destroy)
 
     def _init_ui_1(self):
         self.lab_r3_00.SetLabel(self.WIDGETS_LABEL['r3_table0'])
@@ -189,11 +113,11 @@ class ReadFileData(wx.Dialog):
             xl1 = [self._path.rpartition('/')[-1][:-4]] # 读取文件名
         elif self._suffix == 'xlsx':
             # 读取Excel的sheetname
-            wb = openpyxl.load_workbook(self._path)
-            xl1 = wb.sheetnames
+            self._book = open_book(self._path)
+            xl1 = self._book.sheetnames
         else:
-            wb = xlrd.open_workbook(self._path)
-            xl1 = wb.sheet_names()
+            self._book = open_book(self._path)
+            xl1 = self._book.sheet_names()
 
         self.cb_r3_11 = wx.Choice(self, choices=xl1)
         self.cb_r3_11.SetSelection(0)
@@ -223,18 +147,31 @@ class ReadFileData(wx.Dialog):
 
     def _init_ui_0(self):
         self.lab_r3_00.SetLabel(self.WIDGETS_LABEL['r3_pdf'])
-        self.sc_r3_10.SetMax(len(pdfplumber.open(self._path).pages) - 1)
+        n = self._n_pages = pdf_pages(self._path)
+        self.sc_r3_10.SetMax(n - 1)
         self.sc_r3_10.SetValue(self.setting['pdf_page'])
+        # 读取的页码范围 从1开始计数
+        self.lab_r3_pages = wx.StaticText(self, label=self.WIDGETS_LABEL['r3_pdf_pages'])
+        self.sc_r3_p0 = wx.SpinCtrl(self, min=1, max=n, initial=1)
+        self.sc_r3_p1 = wx.SpinCtrl(self, min=1, max=n, initial=n)
+        self.lab_r3_pages.SetFont(self.FONT0)
+        self.sc_r3_p0.SetFont(self.FONT0)
+        self.sc_r3_p1.SetFont(self.FONT0)
 
         layout2 = wx.BoxSizer(wx.HORIZONTAL)
         layout2.Add(self.lab_r3_00, 1, wx.ALL | wx.ALIGN_CENTER_VERTICAL, 3)
         layout2.Add(self.sc_r3_10, 1, wx.ALL | wx.ALIGN_CENTER_VERTICAL, 3)
         self.layout0.Add(layout2, 0, wx.ALL | wx.EXPAND, 3)
+        layout3 = wx.BoxSizer(wx.HORIZONTAL)
+        layout3.Add(self.lab_r3_pages, 1, wx.ALL | wx.ALIGN_CENTER_VERTICAL, 3)
+        layout3.Add(self.sc_r3_p0, 1, wx.ALL | wx.ALIGN_CENTER_VERTICAL, 3)
+        layout3.Add(self.sc_r3_p1, 1, wx.ALL | wx.ALIGN_CENTER_VERTICAL, 3)
+        self.layout0.Add(layout3, 0, wx.ALL | wx.EXPAND, 3)
         self._add_line_h()
         self.layout0.Add(self.layout1, 0, wx.ALL | wx.EXPAND, 3)
         self.SetSizer(self.layout0)
 
-        self.SetSize((300, 310))
+        self.SetSize((400, 360))
 
     def _on_ok(self, event):
         if self._suffix == 'pdf':
@@ -243,14 +180,21 @@ class ReadFileData(wx.Dialog):
             self.setting['header_row'] = self.sc_r3_10.GetValue()
             self.setting['wavelength_col'] = self.sc_r3_12.GetValue()
         save_setting(self.setting)
-        self._read_data()
+        try:
+            self._read_data()
+        except Exception as e:
+            # 读取失败时保留工作簿, 修改设置后可再次读取
+            wx.MessageBox(str(e), '警告', wx.OK | wx.ICON_ERROR)
+            return
+        self._close_book()
         wx.LogMessage(self.WIDGETS_LABEL['message_ok'])
         self.EndModal(wx.ID_OK)
 
     def _read_data(self):
         ind1 = int(self.sc_r3_10.GetValue())  # 读取pdf的几页 or 读取Excel的第几行
         if self._suffix == 'pdf':
-            spec = read_pdf(self._path, ind1)
+            pages = range(self.sc_r3_p0.GetValue() - 1, self.sc_r3_p1.GetValue())
+            spec = read_pdf(self._path, ind1, pages, n_pages=self._n_pages)
             hea = ['波长'] + [f'Data{i}' for i in range(1, len(spec[0]))]
         else:
             ind2 = self.cb_r3_11.GetStringSelection()  # 读取Excel的sheetname
@@ -260,26 +204,9 @@ class ReadFileData(wx.Dialog):
                 spec, hea = read_txt(self._path, ind1_0, slice(ind3, None))
 
             elif self._suffix == 'xlsx':
-                wb1 = openpyxl.load_workbook(self._path)
-                ws1 = wb1[ind2]
-                spec: List[List[str]] = list(
-                    map(list,
-                        ws1.iter_rows(min_row=ind1,
-                                      min_col=ind3 + 1,
-                                      values_only=True)))
-
-                if ind1_0 is not None:
-                    hea = spec.pop(0)
-
+                spec, hea = read_xlsx(self._book, ind2, ind1_0, slice(ind3, None))
             else:
-                wb2: xlrd.book.Book = xlrd.open_workbook(self._path)
-                ws2 = wb2.sheet_by_name(ind2)
-                if ind1_0 is not None:
-                    hea = ws2.row_values(ind1_0, start_colx=ind3)
-                spec = [
-                    ws2.row_values(i, start_colx=ind3)
-                    for i in range(ind1, ws2.nrows)
-                ]
+                spec, hea = read_xls(self._book, ind2, ind1_0, slice(ind3, None))
 
             if ind1_0 is None:
                 hea = ['波长'] + [f'Data{i}' for i in range(1, len(spec[0]))]
@@ -293,6 +220,23 @@ class ReadFileData(wx.Dialog):
         # self._grid.SetSubject(spe)
         # self._grid.SetHeader([hea])
 
+    def _close_book(self):
+        # 只读模式的工作簿会占用文件 需要关闭
+        if self._book is not None:
+            close_book(self._book)
+            self._book = None
+
     def _on_cancel(self, event):
+        self._close_book()
         wx.LogMessage(self.WIDGETS_LABEL['message_cancel'])
         self.EndModal(wx.ID_CANCEL)
+
+    def _on_close(self, event):
+        # 右上角关闭
+        self._close_book()
+        event.Skip()
+
+    def _on_destroy(self, event):
+        if event.GetEventObject() is self:  # 子控件的销毁事件也会传到这里
+            self._close_book()
+        event.Skip()
@@ -1,11 +1,21 @@
 ﻿# -*- coding: utf-8 -*-
 import json
+from functools import lru_cache
+from typing import Dict, Tuple
 
 import wx
 from _base import DIRNAME
 from mywxwidgets.richtextbase import RichTextBase
 
 
+@lru_cache(maxsize=None)
+def load_about() -> Tuple[Dict, ...]:
+    """_about.json 按键排序的各段, 只读取和解析一次"""
+    with open(DIRNAME+'/_about.json', 'r', encoding='utf-8') as fp:
+        text = json.load(fp)
+    return tuple(text[i] for i in sorted(text))
+
+
 class AboutWin(RichTextBase):
 
     def set_text(self):
@@ -13,14 +23,11 @@ class AboutWin(RichTextBase):
         # red = (255,0,0)
         # blue = (0,0,255)
         # purple = (170,85,255)
-        with open(DIRNAME+'/_about.json', 'r', encoding='utf-8') as fp:
-            text = json.load(fp)
-        keys = sorted(text)
-        for i in keys:
-            if 'img' in text[i]:
-                self.write_img(text[i]['img'])
+        for part in load_about():
+            if 'img' in part:
+                self.write_img(part['img'])
             else:
-                self.write(**text[i])
+                self.write(**part)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio 接口, 不依赖 wx
+
+色度计算放在进程池, 文件解析放在线程池, 不阻塞事件循环.
+
+    async with AsyncColour(max_inflight=4) as ac:
+        data, hea = await ac.read_file('data.csv', 0)
+        async for start, hue in ac.colour_stream(data, 'D65', chunk=2000):
+            ...
+
+`values=True` 时返回 `CIE.colour_values()` 的数值结果, 进程间只传 float 数组,
+可用 `cie.ColourResult` 按名称取行. `kind` `dtype` 同 `CIE`, `read_file` 的 `dtype`
+同 `reader.read_file`.
+"""
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterator, List, Literal, Tuple, Union
+
+import reader
+from cie import colour_chunked
+from numpy import asarray, c_, float64, ndarray
+
+
+def _colour(spec: ndarray, si: str, va: int, unit: str, upper: int,
+            values: bool = False, kind: str = 'cubic', dtype: type = float64) -> ndarray:
+    # 进程池中执行
+    return colour_chunked(spec, si, va, unit, upper, kind=kind, dtype=dtype, values=values)
+
+
+class AsyncColour:
+    """
+    `CIE.colour()` 和 `reader` 的异步版本.
+
+    Parameters
+    ----------
+    max_inflight : int, default 4
+        同时在计算的批数上限, 超过时 `colour` 等待(背压).
+    cpu_executor : Executor or None
+        色度计算的执行器, None 为新建 `ProcessPoolExecutor`.
+    io_executor : Executor or None
+        文件解析的执行器, None 为新建 `ThreadPoolExecutor`.
+    """
+
+    def __init__(self, max_inflight: int = 4,
+                 cpu_executor: Union[Executor, None] = None,
+                 io_executor: Union[Executor, None] = None):
+        self._own = (cpu_executor is None, io_executor is None)
+        self._cpu = cpu_executor or ProcessPoolExecutor()
+        self._io = io_executor or ThreadPoolExecutor(max_workers=2)
+        self._max_inflight = max_inflight
+        self._sem: Union[asyncio.Semaphore, None] = None
+
+    async def __aenter__(self) -> 'AsyncColour':
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """关闭自己创建的执行器, 未开始的任务取消"""
+        if self._own[0]:
+            self._cpu.shutdown(wait=False, cancel_futures=True)
+        if self._own[1]:
+            self._io.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def _semaphore(self) -> asyncio.Semaphore:
+        # 在事件循环中创建
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self._max_inflight)
+        return self._sem
+
+    async def _run(self, executor: Executor, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+    async def colour(self, spec: Union[ndarray, list, tuple],
+                     si: Literal['A', 'D65', 'C', 'D50', 'D55', 'D75'] = 'D65',
+                     va: Literal[2, 10] = 2,
+                     unit: Literal['nm', 'um', 'μm'] = 'nm',
+                     upper: Literal[1, 100] = 100,
+                     values: bool = False,
+                     kind: str = 'cubic',
+                     dtype: type = float64) -> ndarray:
+        """
+        参数和返回值同 `CIE(spec, si, va, unit, upper, kind, dtype).colour()`;
+        `values` 为 True 时同 ``colour_values()``.
+        """
+        async with self._semaphore:
+            return await self._run(self._cpu, _colour, asarray(spec), si, va, unit, upper,
+                                   values, kind, dtype)
+
+    async def colour_stream(self, spec: Union[ndarray, list, tuple],
+                            si: Literal['A', 'D65', 'C', 'D50', 'D55', 'D75'] = 'D65',
+                            va: Literal[2, 10] = 2,
+                            unit: Literal['nm', 'um', 'μm'] = 'nm',
+                            upper: Literal[1, 100] = 100,
+                            chunk: int = 1000,
+                            values: bool = False,
+                            kind: str = 'cubic',
+                            dtype: type = float64) -> AsyncIterator[Tuple[int, ndarray]]:
+        """
+        按列分块计算, 按顺序逐块产出.
+
+        Yields
+        ------
+        start : int
+            本块第一个光谱的序号(不含波长列).
+        hue : ndarray
+            `CIE.colour()` (`values` 为 True 时 ``colour_values()``)
+            的 ``[:, start:start + chunk]`` 部分.
+
+        Notes
+        -----
+        同时提交的块数不超过 `max_inflight`; 停止迭代或取消时, 未完成的块被取消.
+        """
+        spec = asarray(spec)
+        n = spec.shape[1] - 1
+        starts = list(range(0, n, chunk))
+        tasks: List[asyncio.Task] = []
+
+        async def one(start: int) -> ndarray:
+            part = c_[spec[:, 0], spec[:, 1 + start:1 + start + chunk]]
+            return await self.colour(part, si, va, unit, upper, values, kind, dtype)
+
+        try:
+            nxt = 0
+            for i in range(len(starts)):
+                # 预先提交至多 max_inflight 块
+                while nxt < len(starts) and nxt < i + self._max_inflight:
+                    tasks.append(asyncio.ensure_future(one(starts[nxt])))
+                    nxt += 1
+                yield starts[i], await tasks[i]
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    async def read_txt(self, path: str, header: Union[int, None] = None,
+                       col: slice = slice(0, None, None)) -> Tuple[List[List[str]], List[str]]:
+        """同 `reader.read_txt`"""
+        return await self._run(self._io, reader.read_txt, path, header, col)
+
+    async def read_pdf(self, path: str, data_ye: int = 0,
+                       pages: Union[range, slice, None] = None) -> List[List[str]]:
+        """同 `reader.read_pdf`"""
+        return await self._run(self._io, reader.read_pdf, path, data_ye, pages)
+
+    async def read_file(self, path: str, header: Union[int, None] = None,
+                        col: slice = slice(0, None, None),
+                        sheet: Union[str, None] = None,
+                        dtype: type = float64) -> Tuple[ndarray, List[str]]:
+        """同 `reader.read_file`"""
+        return await self._run(self._io, reader.read_file, path, header, col, sheet,
+                               dtype=dtype)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+命令行批量计算, 不依赖 wx
+
+    python -m spec2hue data/*.csv --si D65 --va 10 -o result.csv
+
+输出按扩展名为 csv xlsx 或 npz, 见 `writer`; 逐个文件写入, 不在内存中合并.
+"""
+import argparse
+import glob
+import os.path
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from cache import ColourCache
+from cie import COLOUR_TITLE, ColourResult, aSIKeys, colour_chunked
+from interpolate import KIND_STR
+from reader import read_file
+from writer import WRITERS, CsvWriter, ResultWriter, format_values
+
+_CACHE: Dict[str, ColourCache] = {}  # 每个进程一个, 按缓存地址
+LABEL_NAMES = ('file', 'name')
+# calc_file_result 的 opts, 同名的命令行参数见 add_calc_arguments
+OPTION_KEYS = ('si', 'va', 'unit', 'upper', 'kind', 'dtype', 'header', 'col',
+               'sheet', 'items', 'cache', 'max_memory')
+
+
+def expand_paths(patterns: Sequence[str]) -> List[str]:
+    """展开通配符, 保持输入顺序并去重"""
+    paths: List[str] = []
+    for p in patterns:
+        found = sorted(glob.glob(p)) or ([p] if os.path.isfile(p) else [])
+        if not found:
+            raise FileNotFoundError(f'没有匹配的文件: {p}')
+        paths.extend(i for i in found if i not in paths)
+    return paths
+
+
+def calc_file_result(path: str, opts: Dict) -> Tuple[np.ndarray, ColourResult]:
+    """
+    计算一个文件
+
+    Parameters
+    ----------
+    path: str
+        数据文件地址, 第一列为波长
+    opts: dict
+        si va unit upper kind dtype header col sheet items cache max_memory, 含义同命令行参数
+
+    Returns
+    -------
+    labels: ndarray of str
+        (光谱数, 2), 每行为 [文件名, 光谱名], 见 `LABEL_NAMES`
+    result: ColourResult
+        只含 items 的行
+    """
+    header = None if opts['header'] == 0 else opts['header'] - 1
+    dtype = getattr(np, opts.get('dtype', 'float64'))
+    data, hea = read_file(path, header, slice(opts['col'] - 1, None),
+                          opts['sheet'], dtype=dtype)
+    args = (data, opts['si'], opts['va'], opts['unit'], opts['upper'])
+    max_memory = opts['max_memory'] * 1024 * 1024 if opts.get('max_memory') else None
+    if opts.get('cache'):
+        if opts['cache'] not in _CACHE:
+            _CACHE[opts['cache']] = ColourCache(path=opts['cache'], max_memory=max_memory)
+        val = _CACHE[opts['cache']].colour_values(*args, kind=opts.get('kind', 'cubic'),
+                                                  dtype=dtype)
+    else:
+        val = colour_chunked(*args, max_memory=max_memory, kind=opts.get('kind', 'cubic'),
+                             dtype=dtype, values=True)
+    result = ColourResult(val).select(opts['items'])
+    names = [str(i) for i in hea[1:]] if hea else []
+    names += [f'Data{i}' for i in range(len(names) + 1, result.size + 1)]
+    name = os.path.basename(path)
+    labels = np.array([[name, i] for i in names[:result.size]], str).reshape(-1, 2)
+    return labels, result
+
+
+def calc_file(path: str, opts: Dict) -> List[List[str]]:
+    """
+    计算一个文件, 每个光谱一行, 参数同 `calc_file_result`
+
+    Returns
+    -------
+    rows: List[List[str]]
+        [文件名, 光谱名, *items]
+    """
+    labels, result = calc_file_result(path, opts)
+    hue = format_values(result)
+    return [[*a, *b] for a, b in zip(labels.tolist(), hue.T.tolist())]
+
+
+def open_output(path: str, items: Sequence[str], meta: Dict,
+                decimals: int = None) -> ResultWriter:
+    """输出按扩展名选择导出器, None 为 stdout, 其他扩展名为 csv"""
+    suffix = os.path.splitext(path or '')[1][1:].lower()
+    cls = WRITERS.get(suffix, CsvWriter)
+    kwargs = {'decimals': decimals} if cls is CsvWriter else {}
+    return cls(path or sys.stdout, items, LABEL_NAMES, meta, **kwargs)
+
+
+def add_calc_arguments(parser: argparse.ArgumentParser):
+    """计算条件和读取方式的参数, 与 `watch` 共用; 见 `OPTION_KEYS`"""
+    parser.add_argument('--si', default='D65', type=str.upper, choices=aSIKeys,
+                        help='光源, 默认 D65')
+    parser.add_argument('--va', default=2, type=int, choices=(2, 10),
+                        help='视场角, 默认 2')
+    parser.add_argument('--unit', default='nm', choices=('nm', 'um', 'μm'),
+                        help='波长单位, 默认 nm')
+    parser.add_argument('--upper', default=100, type=int, choices=(1, 100),
+                        help='光谱上限, 默认 100')
+    parser.add_argument('--kind', default='cubic', type=str.lower, choices=KIND_STR,
+                        help='插值方法, 默认 cubic; sprague 要求等间距, sprague pchip akima 为局部插值')
+    parser.add_argument('--dtype', default='float64', choices=('float64', 'float32'),
+                        help='计算精度, 默认 float64; float32 内存减半, ΔE 误差见 cie.CIE')
+    parser.add_argument('--header', default=1, type=int,
+                        help='表头在第几行, 0 表示没有, 默认 1')
+    parser.add_argument('--col', default=1, type=int,
+                        help='波长在第几列, 默认 1')
+    parser.add_argument('--sheet', default=None, help='Excel 表名, 默认第一个表')
+    parser.add_argument('--items', nargs='+', default=list(COLOUR_TITLE),
+                        choices=COLOUR_TITLE, metavar='ITEM',
+                        help='输出项目, 默认全部: ' + ', '.join(COLOUR_TITLE))
+    parser.add_argument('--cache', default=None,
+                        help='结果缓存(sqlite)地址, 重复的光谱不再计算')
+    parser.add_argument('--max-memory', default=None, type=float, metavar='MB',
+                        help='每个进程计算时的内存上限(MB), 超过时自动分块')
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='spec2hue', description='光谱批量计算色度, 结果合并为一张表')
+    parser.add_argument('files', nargs='+', help='数据文件或通配符, 第一列(--col)为波长')
+    add_calc_arguments(parser)
+    parser.add_argument('-j', '--workers', default=None, type=int,
+                        help='进程数, 默认 cpu 数; 1 为不使用进程池')
+    parser.add_argument('-o', '--output', default=None,
+                        help='输出地址, 按扩展名为 csv xlsx npz, 默认以 csv 输出到 stdout')
+    parser.add_argument('--decimals', default=None, type=int,
+                        help='csv 数值保留的小数位数, 默认完整精度')
+    return parser
+
+
+def main(argv: Sequence[str] = None) -> int:
+    args = _parser().parse_args(argv)
+    try:
+        paths = expand_paths(args.files)
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        return 2
+    opts = {k: getattr(args, k) for k in OPTION_KEYS}
+
+    workers = min(args.workers or os.cpu_count() or 1, len(paths))
+    if workers <= 1:
+        results = map(_calc_file_safe, paths, [opts] * len(paths))
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(workers)
+        results = pool.map(_calc_file_safe, paths, [opts] * len(paths))
+
+    meta = {k: opts[k] for k in ('si', 'va', 'unit', 'upper', 'kind', 'dtype')}
+    meta['files'] = paths
+    failed = 0
+    try:
+        with open_output(args.output, args.items, meta, args.decimals) as out:
+            for path, (res, err) in zip(paths, results):
+                if err is not None:
+                    failed += 1
+                    print(f'{path}: {err}', file=sys.stderr)
+                    continue
+                out.write(*res)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return 1 if failed else 0
+
+
+def _calc_file_safe(path: str, opts: Dict):
+    # 单个文件出错不影响其他文件
+    try:
+        return calc_file_result(path, opts), None
+    except Exception as e:
+        return None, e
+
+
+if __name__ == '__main__':
+    sys.exit(main())
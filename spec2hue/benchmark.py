@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准, 不依赖 wx
+
+    python benchmark.py                       # 快速档, 打印结果
+    python benchmark.py --full -o base.json   # 完整档, 保存基准
+    python benchmark.py --compare base.json --threshold 0.2 \\
+        --threshold-for "interp1d*=0.5"       # 与基准比较, 变慢超过阈值时返回 1
+
+数据均为固定随机种子生成的合成数据. 准备或运行出错的项记入基准的 errors, 并返回 1;
+未安装可选依赖的项(如写 xls 用的 xlwt)跳过, 不适用的组合(如点数为奇数时的
+quadratic + periodic 样条)不生成.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+from cie import CIE, CIEHueTransform
+from convert import converter
+from interpolate import interp1d, interp1d_local
+
+QUICK = {'points': (31, 81, 401), 'samples': (1, 100, 1000)}
+FULL = {'points': (31, 81, 401, 4096), 'samples': (1, 100, 10000, 1000000)}
+CONVERTERS = ('xyz2lab', 'xyz2lab_h', 'xyz2yuv', 'xyz2yxy', 'xyz2luv', 'xyz2rgb',
+              'chs', 'lab2xyz', 'lab_h2xyz', 'luv2xyz', 'yxy2xyz', 'yuv2xyz',
+              'rgb2xyz', 'rgb16', 'rgb16_')
+CONVERT_PATHS = (('rgb', 'lab'), ('lab', 'rgb'), ('lab', 'lch'), ('lab', 'luv'))
+
+
+# ---------------------------------------------------------------- 合成数据
+def make_grid(n: int, uneven: bool = False, seed: int = 0) -> np.ndarray:
+    """n 个点的波长, 覆盖 CIE 要求的 400-700nm; uneven 为不等间距"""
+    lo, hi = (400., 700.) if n <= 31 else (380., 780.)
+    if not uneven:
+        return np.linspace(lo, hi, n)
+    rng = np.random.default_rng(seed)
+    step = rng.uniform(0.5, 1.5, n - 1)
+    return np.r_[lo, lo + np.cumsum(step) / step.sum() * (hi - lo)]
+
+
+def make_spectra(grid: np.ndarray, samples: int, seed: int = 0) -> np.ndarray:
+    """平滑的随机光谱, 0-100, 形状 (grid.size, samples)"""
+    rng = np.random.default_rng(seed)
+    t = (grid[:, None] - grid[0]) / (grid[-1] - grid[0])
+    a, f, p = rng.uniform(0, 1, (3, 1, samples))
+    return 50 + 45 * a * np.sin(2 * np.pi * (f * 2 * t + p))
+
+
+def make_xyz(samples: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.uniform(1, 95, (3, samples))
+
+
+# ---------------------------------------------------------------- 计时
+def timeit(func: Callable, min_time: float = 0.2, repeat: int = 5) -> Dict[str, float]:
+    """至少运行 repeat 次或 min_time 秒, 返回秒"""
+    times: List[float] = []
+    start = time.perf_counter()
+    while len(times) < repeat or (time.perf_counter() - start < min_time and len(times) < 1000):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    return {'min': times[0], 'median': times[len(times) // 2], 'n': len(times)}
+
+
+# ---------------------------------------------------------------- 用例
+Case = Tuple[str, Callable[[], Callable]]
+
+
+def _cases_interp(sizes: dict, max_cells: float) -> Iterator[Case]:
+    for n in sizes['points']:
+        for m in sizes['samples']:
+            if n * m > max_cells:
+                continue
+            for kind in interp1d.kind_str:
+                for boundary in interp1d.boundary_str:
+                    if kind == 'quadratic' and boundary == 'periodic' and n % 2:
+                        continue  # 点数为奇数时方程组奇异, 不适用
+                    name = f'interp1d.fit[{kind},{boundary},n={n},m={m}]'
+
+                    def fit(n=n, m=m, kind=kind, boundary=boundary):
+                        x = make_grid(n)
+                        y = make_spectra(x, m)
+                        return lambda: interp1d(x, y, 0, kind, boundary)
+
+                    def call(n=n, m=m, kind=kind, boundary=boundary):
+                        x = make_grid(n)
+                        f = interp1d(x, make_spectra(x, m), 0, kind, boundary)
+                        x1 = np.arange(np.ceil(x[0]), np.floor(x[-1]) + 1)
+                        return lambda: f(x1)
+
+                    yield name, fit
+                    yield name.replace('.fit', '.call'), call
+
+            for kind in interp1d_local.kind_str:
+                name = f'interp1d_local.fit[{kind},n={n},m={m}]'
+
+                def fit(n=n, m=m, kind=kind):
+                    x = make_grid(n)
+                    y = make_spectra(x, m)
+                    return lambda: interp1d_local(x, y, 0, kind)
+
+                def call(n=n, m=m, kind=kind):
+                    x = make_grid(n)
+                    f = interp1d_local(x, make_spectra(x, m), 0, kind)
+                    x1 = np.arange(np.ceil(x[0]), np.floor(x[-1]) + 1)
+                    return lambda: f(x1)
+
+                yield name, fit
+                yield name.replace('.fit', '.call'), call
+
+
+def _cases_cie(sizes: dict, max_cells: float) -> Iterator[Case]:
+    for n in sizes['points']:
+        for m in sizes['samples']:
+            if n * m > max_cells:
+                continue
+
+            def init(n=n, m=m):
+                x = make_grid(n)
+                spec = np.c_[x, make_spectra(x, m)]
+                return lambda: CIE(spec)
+
+            def spec2xyz(n=n, m=m):
+                x = make_grid(n)
+                cie = CIE(np.c_[x, make_spectra(x, m)])
+                return cie.spec2xyz
+
+            def colour(n=n, m=m):
+                x = make_grid(n)
+                cie = CIE(np.c_[x, make_spectra(x, m)])
+                return cie.colour
+
+            yield f'CIE.__init__[n={n},m={m}]', init
+            yield f'CIE.spec2xyz[n={n},m={m}]', spec2xyz
+            yield f'CIE.colour[n={n},m={m}]', colour
+
+
+def _cases_transform(sizes: dict, max_cells: float) -> Iterator[Case]:
+    for m in sizes['samples']:
+        for name in CONVERTERS:
+            if name == 'rgb16_' and m > 10000:
+                continue  # rgb16_ 为逐个拼接, 大数据过慢
+
+            def conv(m=m, name=name):
+                ciet = CIEHueTransform('D65', 2)
+                xyz = make_xyz(m)
+                arg = {
+                    'chs': ciet.xyz2lab(xyz),
+                    'lab2xyz': ciet.xyz2lab(xyz),
+                    'lab_h2xyz': ciet.xyz2lab_h(xyz),
+                    'luv2xyz': ciet.xyz2luv(xyz),
+                    'yxy2xyz': ciet.xyz2yxy(xyz),
+                    'yuv2xyz': ciet.xyz2yuv(xyz),
+                    'rgb2xyz': ciet.xyz2rgb(xyz),
+                    'rgb16': ciet.xyz2rgb(xyz),
+                    'rgb16_': ciet.rgb16(ciet.xyz2rgb(xyz), 1),
+                }.get(name, xyz)
+                func = getattr(ciet, name)
+                if name == 'rgb16':
+                    return lambda: func(arg, 1)
+                return lambda: func(arg)
+
+            yield f'CIEHueTransform.{name}[m={m}]', conv
+
+        for src, dst in CONVERT_PATHS:
+
+            def route(m=m, src=src, dst=dst):
+                data = converter('xyz', src)(make_xyz(m))
+                return lambda: converter(src, dst)(data)
+
+            yield f'convert.{src}->{dst}[m={m}]', route
+
+
+def _cases_reader(sizes: dict, max_cells: float, tmpdir: str) -> Iterator[Case]:
+    import reader
+    for n in sizes['points']:
+        for m in sizes['samples']:
+            if n * m > min(max_cells, 1e7):
+                continue
+            x = make_grid(n)
+            data = np.c_[x, make_spectra(x, m)]
+            hea = ['wl'] + [f'd{i}' for i in range(m)]
+
+            def txt(n=n, m=m, data=data, hea=hea):
+                path = os.path.join(tmpdir, f'{n}_{m}.csv')
+                if not os.path.exists(path):
+                    # 分隔符识别只读前 4096 字节, 完整精度时宽表一行就超过
+                    np.savetxt(path, data, fmt='%.6f', delimiter=',', header=','.join(hea),
+                               comments='')
+                return lambda: reader.read_txt(path, 0)
+
+            def xlsx(n=n, m=m, data=data, hea=hea):
+                import openpyxl
+                path = os.path.join(tmpdir, f'{n}_{m}.xlsx')
+                if not os.path.exists(path):
+                    wb = openpyxl.Workbook(write_only=True)
+                    ws = wb.create_sheet('data')
+                    ws.append(hea)
+                    for row in data.tolist():
+                        ws.append(row)
+                    wb.save(path)
+
+                def run():
+                    book = reader.open_book(path)
+                    try:
+                        return reader.read_xlsx(book, 'data', 0)
+                    finally:
+                        reader.close_book(book)
+                return run
+
+            def xls(n=n, m=m, data=data, hea=hea):
+                import xlwt
+                path = os.path.join(tmpdir, f'{n}_{m}.xls')
+                if not os.path.exists(path):
+                    wb = xlwt.Workbook()
+                    ws = wb.add_sheet('data')
+                    for j, v in enumerate(hea):
+                        ws.write(0, j, v)
+                    for i, row in enumerate(data.tolist(), 1):
+                        for j, v in enumerate(row):
+                            ws.write(i, j, v)
+                    wb.save(path)
+
+                def run():
+                    book = reader.open_book(path)
+                    try:
+                        return reader.read_xls(book, 'data', 0)
+                    finally:
+                        reader.close_book(book)
+                return run
+
+            def pdf(n=n, m=m, data=data, hea=hea):
+                from reportlab.lib.pagesizes import A4
+                from reportlab.platypus import PageBreak, SimpleDocTemplate, Table
+                path = os.path.join(tmpdir, f'{n}_{m}.pdf')
+                if not os.path.exists(path):
+                    rows = [[f'{v:.4f}' for v in r] for r in data[:, :6].tolist()]
+                    els = []
+                    for i in range(0, len(rows), 40):
+                        els += [Table([hea[:6]] + rows[i:i + 40]), PageBreak()]
+                    SimpleDocTemplate(path, pagesize=A4).build(els)
+                return lambda: reader.read_pdf(path)
+
+            yield f'reader.read_txt[n={n},m={m}]', txt
+            yield f'reader.read_xlsx[n={n},m={m}]', xlsx
+            if m < 256:  # xls 每个表最多 256 列
+                yield f'reader.read_xls[n={n},m={m}]', xls
+            if m == 1:
+                yield f'reader.read_pdf[n={n}]', pdf
+
+
+def _cases_writer(sizes: dict, max_cells: float, tmpdir: str) -> Iterator[Case]:
+    import writer
+    from cie import ColourResult
+    for m in sizes['samples']:
+        if m * 27 > min(max_cells, 1e7):
+            continue
+        for suffix in writer.WRITERS:
+
+            def write(m=m, suffix=suffix):
+                x = make_grid(81)
+                res = ColourResult(CIE(np.c_[x, make_spectra(x, m)]).colour_values())
+                labels = np.arange(m).astype(str)[:, None]
+                path = os.path.join(tmpdir, f'w_{m}.{suffix}')
+                return lambda: writer.write_result(path, labels, res, ('name',))
+
+            yield f'writer.{suffix}[m={m}]', write
+
+
+def cases(sizes: dict, max_cells: float, tmpdir: str) -> Iterator[Case]:
+    yield from _cases_interp(sizes, max_cells)
+    yield from _cases_cie(sizes, max_cells)
+    yield from _cases_transform(sizes, max_cells)
+    yield from _cases_reader(sizes, max_cells, tmpdir)
+    yield from _cases_writer(sizes, max_cells, tmpdir)
+
+
+# ---------------------------------------------------------------- 运行 比较
+def run(sizes: dict, max_cells: float, patterns: Sequence[str] = ('*',),
+        min_time: float = 0.2, repeat: int = 5
+        ) -> Tuple[Dict[str, Dict[str, float]], Dict[str, str]]:
+    """返回 (结果, 出错的项); 未安装可选依赖的项跳过, 不算出错"""
+    results, errors = {}, {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name, setup in cases(sizes, max_cells, tmpdir):
+            if not any(fnmatch.fnmatch(name, p) for p in patterns):
+                continue
+            try:
+                func = setup()
+                res = timeit(func, min_time, repeat)
+            except ImportError as e:
+                print(f'{name:<60} skip ({e.name} 未安装)')
+                continue
+            except Exception as e:
+                errors[name] = f'{type(e).__name__}: {e}'
+                print(f'{name:<60} error ({errors[name]})')
+                continue
+            results[name] = res
+            print(f'{name:<60} {res["median"] * 1000:12.3f} ms  (n={res["n"]})')
+    return results, errors
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float, thresholds: Dict[str, float]) -> List[str]:
+    """
+    返回变慢超过阈值的项.
+
+    threshold 为默认允许变慢的比例, thresholds 为 {通配符: 比例}, 后出现的优先.
+    """
+    regressions = []
+    for name, res in results.items():
+        if name not in baseline:
+            continue
+        limit = threshold
+        for pattern, value in thresholds.items():
+            if fnmatch.fnmatch(name, pattern):
+                limit = value
+        ratio = res['median'] / baseline[name]['median']
+        if ratio > 1 + limit:
+            regressions.append(f'{name}: {ratio:.2f}x (阈值 {1 + limit:.2f}x)')
+    return regressions
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='spec2hue 性能基准')
+    parser.add_argument('--full', action='store_true', help='完整档 (点数 31-4096, 样本 1-1M)')
+    parser.add_argument('--points', nargs='+', type=int, help='覆盖波长点数')
+    parser.add_argument('--samples', nargs='+', type=int, help='覆盖样本数')
+    parser.add_argument('--max-cells', default=2e7, type=float,
+                        help='跳过 点数*样本数 超过此值的组合, 默认 2e7')
+    parser.add_argument('-k', dest='patterns', nargs='+', default=['*'],
+                        help='只运行名称匹配的项 (通配符)')
+    parser.add_argument('--min-time', default=0.2, type=float, help='每项最少运行秒数')
+    parser.add_argument('--repeat', default=5, type=int, help='每项最少运行次数')
+    parser.add_argument('-o', '--output', help='保存结果为 json 基准')
+    parser.add_argument('--compare', help='与 json 基准比较')
+    parser.add_argument('--threshold', default=0.2, type=float,
+                        help='允许变慢的比例, 默认 0.2')
+    parser.add_argument('--threshold-for', nargs='+', default=[], metavar='PATTERN=RATIO',
+                        help='按名称设置阈值, 如 "reader.*=0.5"')
+    args = parser.parse_args(argv)
+
+    sizes = dict(FULL if args.full else QUICK)
+    if args.points:
+        sizes['points'] = tuple(args.points)
+    if args.samples:
+        sizes['samples'] = tuple(args.samples)
+    results, errors = run(sizes, args.max_cells, args.patterns, args.min_time, args.repeat)
+
+    if args.output:
+        meta = {'python': platform.python_version(), 'numpy': np.__version__,
+                'platform': platform.platform(), 'machine': platform.machine(),
+                'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'sizes': sizes}
+        with open(args.output, 'w', encoding='utf-8') as fp:
+            json.dump({'meta': meta, 'results': results, 'errors': errors}, fp, indent=1)
+    for name, err in errors.items():
+        print('出错:', name, err)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as fp:
+            baseline = json.load(fp)['results']
+        thresholds = dict(i.rsplit('=', 1) for i in args.threshold_for)
+        regressions = compare(results, baseline, args.threshold,
+                              {k: float(v) for k, v in thresholds.items()})
+        for i in regressions:
+            print('变慢:', i)
+        if regressions:
+            return 1
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
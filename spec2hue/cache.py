@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+CIE 色度计算结果缓存, 不依赖 wx
+
+以 (光谱数据, 波长, 光源, 视场角, 单位, 上限) 的哈希为键:
+同一批中相同的光谱只计算一次, 内存中保留 LRU, 可选 sqlite 磁盘缓存(按大小淘汰).
+缓存的是 `CIE.colour_values()` 的数值列, 磁盘中为原始字节.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Literal, Union
+
+from cie import COLOUR_TITLE, ColourResult, colour_chunked
+from numpy import (asarray, ascontiguousarray, c_, dtype as np_dtype, empty, float64,
+                   frombuffer, ndarray)
+
+
+def spectrum_keys(spec: ndarray, si: str, va: int, unit: str, upper: int,
+                  kind: str = 'cubic', dtype: type = float64) -> List[str]:
+    """
+    每个光谱的缓存键.
+
+    Parameters
+    ----------
+    spec : ndarray 2-dim
+        同 `CIE` 的输入, 第0列为波长
+    si, va, unit, upper, kind, dtype
+        同 `CIE`
+
+    Returns
+    -------
+    List[str]
+        长度为 ``spec.shape[1] - 1``
+    """
+    head = hashlib.blake2b(digest_size=16)
+    config = (si.upper(), int(va), unit, int(upper), kind.lower(), np_dtype(dtype).name)
+    head.update(repr(config).encode())
+    head.update(ascontiguousarray(spec[:, 0], float64).tobytes())
+    cols = ascontiguousarray(spec[:, 1:].T, float64)
+    keys = []
+    for col in cols:
+        h = head.copy()
+        h.update(col.tobytes())
+        keys.append(h.hexdigest())
+    return keys
+
+
+class _DiskStore:
+    """sqlite 磁盘缓存, 超过 max_bytes 时淘汰最久未使用的项"""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute('CREATE TABLE IF NOT EXISTS colour ('
+                         'key TEXT PRIMARY KEY, value BLOB, size INTEGER, atime REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS colour_atime ON colour (atime)')
+        self._db.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        res = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                rows = self._db.execute(
+                    f'SELECT key, value FROM colour WHERE key IN ({",".join("?" * len(part))})',
+                    part).fetchall()
+                res.update(rows)
+            if res:
+                now = time.time()
+                self._db.executemany('UPDATE colour SET atime = ? WHERE key = ?',
+                                     [(now, k) for k in res])
+                self._db.commit()
+        return res
+
+    def put_many(self, items: Dict[str, bytes]):
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO colour VALUES (?, ?, ?, ?)',
+                [(k, v, len(k) + len(v), now) for k, v in items.items()])
+            total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM colour').fetchone()[0]
+            if total > self.max_bytes:
+                # 淘汰到 90%, 避免每次写入都淘汰
+                over = total - int(self.max_bytes * 0.9)
+                rows = self._db.execute('SELECT key, size FROM colour ORDER BY atime')
+                drop = []
+                for k, size in rows:
+                    if over <= 0:
+                        break
+                    drop.append((k,))
+                    over -= size
+                self._db.executemany('DELETE FROM colour WHERE key = ?', drop)
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class ColourCache:
+    """
+    `CIE.colour_values()` 的结果缓存.
+
+    Parameters
+    ----------
+    maxsize : int, default 100000
+        内存 LRU 保留的光谱数.
+    path : str or None, default None
+        sqlite 磁盘缓存地址, None 为不使用.
+    max_bytes : int, default 256 MiB
+        磁盘缓存的大小上限.
+    max_memory : int or None, default None
+        未命中部分计算时的内存上限(字节), 见 `cie.colour_chunked`.
+
+    Examples
+    --------
+    >>> cache = ColourCache(path='colour.sqlite')
+    >>> val = cache.colour_values(spec, 'D65', 2)  # 同 CIE(spec, 'D65', 2).colour_values()
+    >>> hue = cache.colour(spec, 'D65', 2)  # 同 CIE(spec, 'D65', 2).colour()
+    """
+
+    def __init__(self, maxsize: int = 100000, path: Union[str, None] = None,
+                 max_bytes: int = 256 * 1024 * 1024,
+                 max_memory: Union[int, None] = None):
+        self.maxsize = maxsize
+        self.max_memory = max_memory
+        self._lru: OrderedDict[str, ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None if path is None else _DiskStore(path, max_bytes)
+        self.info = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'duplicates': 0}
+
+    def colour(self, spec: Union[ndarray, list, tuple],
+               si: Literal['A', 'D65', 'C', 'D50', 'D55', 'D75'] = 'D65',
+               va: Literal[2, 10] = 2,
+               unit: Literal['nm', 'um', 'μm'] = 'nm',
+               upper: Literal[1, 100] = 100,
+               kind: str = 'cubic',
+               dtype: type = float64) -> ndarray:
+        """参数和返回值同 `CIE(spec, si, va, unit, upper, kind, dtype).colour()`"""
+        return ColourResult(self.colour_values(spec, si, va, unit, upper, kind,
+                                               dtype)).to_strings()
+
+    def colour_values(self, spec: Union[ndarray, list, tuple],
+                      si: Literal['A', 'D65', 'C', 'D50', 'D55', 'D75'] = 'D65',
+                      va: Literal[2, 10] = 2,
+                      unit: Literal['nm', 'um', 'μm'] = 'nm',
+                      upper: Literal[1, 100] = 100,
+                      kind: str = 'cubic',
+                      dtype: type = float64) -> ndarray:
+        """参数和返回值同 `CIE(spec, si, va, unit, upper, kind, dtype).colour_values()`"""
+        spec = asarray(spec, float64)
+        keys = spectrum_keys(spec, si, va, unit, upper, kind, dtype)
+        found: Dict[str, ndarray] = {}
+        with self._lock:
+            for k in keys:
+                if k in self._lru and k not in found:
+                    self._lru.move_to_end(k)
+                    found[k] = self._lru[k]
+        hits = len(found)
+
+        # 批内去重, 未命中的键只保留第一次出现的列
+        missing: Dict[str, int] = {}
+        for i, k in enumerate(keys):
+            if k not in found and k not in missing:
+                missing[k] = i
+        if missing and self._disk is not None:
+            for k, v in self._disk.get_many(list(missing)).items():
+                found[k] = frombuffer(v, dtype)
+                del missing[k]
+        disk_hits = len(found) - hits
+
+        new: Dict[str, ndarray] = {}
+        if missing:
+            index = list(missing.values())
+            hue = colour_chunked(c_[spec[:, 0], spec[:, 1:][:, index]], si, va, unit, upper,
+                                 max_memory=self.max_memory, kind=kind,
+                                 dtype=dtype, values=True)
+            for i, k in enumerate(missing):
+                new[k] = hue[:, i].copy()
+            if self._disk is not None:
+                self._disk.put_many({k: v.tobytes() for k, v in new.items()})
+            found.update(new)
+
+        with self._lock:
+            self.info['hits'] += hits
+            self.info['disk_hits'] += disk_hits
+            self.info['misses'] += len(new)
+            self.info['duplicates'] += len(keys) - len(set(keys))
+            for k, v in {**new, **found}.items():
+                self._lru[k] = v
+                self._lru.move_to_end(k)
+            while len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+        if not keys:
+            return empty((len(COLOUR_TITLE), 0), dtype)
+        return asarray([found[k] for k in keys]).T
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
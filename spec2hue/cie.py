@@ -2,27 +2,43 @@
 """
 CIE1931|1964|1976色度计算
 """
-from typing import Literal, Tuple, Union
+from typing import Dict, Iterator, List, Literal, Sequence, Tuple, Union
 
+import instrument
 from cie_data import (Mrgb, Mrgb2, aKabHunter, aStandardIlluminant,
                       aWhitePoint, aWhitePointHunter, axyzL)
-from interpolate import interp1d
+from interpolate import make_interp1d
 from numpy import (arange, arctan2, asarray, c_, ceil, clip, diff, float64,
-                   floor, nan_to_num, ndarray, pi, sqrt, any)
+                   floor, nan_to_num, ndarray, pi, sqrt, any, vstack, einsum,
+                   empty, dtype as np_dtype, float32, hstack, int64, isfinite,
+                   str_, where)
 from numpy.typing import NDArray
 
 aSIKeys = ('A', 'D65', 'C', 'D50', 'D55', 'D75')
+# 行名称, 与 CIE.colour() 的行对应
+COLOUR_TITLE = ('X', 'Y', 'Z', 'x', 'y', 'z', 'CIELAB-L*', 'CIELAB-a*',
+                'CIELAB-b*', 'CIELAB-C*_ab', 'CIELAB-h_ab', 'Hunter L',
+                'Hunter a', 'Hunter b', 'Hunter C_ab', 'Hunter h_ab', 'sRGB',
+                'u\'', 'v\'', 'w\'', 'CIELUV-L*', 'CIELUV-u*', 'CIELUV-v*',
+                'CIELUV-C*_uv', 'CIELUV-h_uv', 'CIELUV-s_uv', 'YI')
 _POW1, _POW2 = float64(1 / 3), float64(3)
 _A1, _A2 = float64(216 / 24389), float64(6 / 29)
 _B1, _B2, _B0 = float64(841 / 108), float64(108 / 841), float64(4 / 29)
 
 
 def _ff(t):
-    return t**_POW1 * (t > _A1) + (_B1 * t + _B0) * (t <= _A1)
+    c = t.dtype.type  # 常数与 t 同精度, 避免 float32 提升为 float64
+    return t**c(_POW1) * (t > c(_A1)) + (c(_B1) * t + c(_B0)) * (t <= c(_A1))
 
 
 def _ff_(t):
-    return t**_POW2 * (t > _A2) + (t - _B0) * _B2 * (t <= _A2)
+    c = t.dtype.type
+    return t**c(_POW2) * (t > c(_A2)) + (t - c(_B0)) * c(_B2) * (t <= c(_A2))
+
+
+def _dot(m: ndarray, x: ndarray) -> ndarray:
+    # 矩阵乘 m @ x, 每列的结果与列数无关, 分块计算与整体计算结果完全相同
+    return einsum('ij,j...->i...', m, x)
 
 
 def _input_check(s) -> ndarray:
@@ -44,16 +60,20 @@ class CIEHueTransform:
         The Standard Illuminant, {'A', 'D65', 'C', 'D50', 'D55', 'D75'}, default: 'D65'.
     va : {2, 10}, default 2
         The Viewing Angle, {2, 10}, default: 2.
+    dtype : {float64, float32}, default float64
+        The floating type of the tables and every conversion output, default: float64.
+        Inputs are cast to it; float32 halves memory and bandwidth.
     """
 
     _wp: Tuple[NDArray[float64], NDArray[float64]]
     _wp_h: Tuple[NDArray[float64], NDArray[float64]]
-    __slots__ = ['_wp', '_wp_h', '_kab', 'info']
+    __slots__ = ['_wp', '_wp_h', '_kab', '_mrgb', 'dtype', 'info']
 
     def __init__(self,
                  si: Literal['A', 'D65', 'C', 'D50', 'D55', 'D75',
                              'a', 'd65', 'c', 'd50', 'd55', 'd75'] = 'D65',
-                 va: Literal[2, 10] = 2):
+                 va: Literal[2, 10] = 2,
+                 dtype: type = float64):
         if not isinstance(si, str):
             raise TypeError(f'{self.__class__}: 光源输入类型错误, 请输入字符串')
         si = si.upper()
@@ -61,15 +81,19 @@ class CIEHueTransform:
             raise ValueError(f'{self.__class__}: 光源种类错误')
         if va != 2 and va != 10:
             raise ValueError(f'{self.__class__}: 视场角错误')
+        self.dtype = np_dtype(dtype)
+        if self.dtype not in (float64, float32):
+            raise ValueError(f'{self.__class__}: dtype 错误, 请输入 float64 或 float32')
 
         self.info = {'SI': si, 'VA': va}
         si_v = self._get_si()
         va_v = self._get_va()
-        wp = aWhitePoint[va_v, :, si_v]
-        wp_h = aWhitePointHunter[va_v, :, si_v]
+        wp = aWhitePoint[va_v, :, si_v].astype(self.dtype)
+        wp_h = aWhitePointHunter[va_v, :, si_v].astype(self.dtype)
         self._wp = (wp, wp[:, None])
         self._wp_h = (wp_h, wp_h[:, None])
-        self._kab: NDArray[float64] = aKabHunter[va_v, :, si_v]
+        self._kab: NDArray[float64] = aKabHunter[va_v, :, si_v].astype(self.dtype)
+        self._mrgb = (Mrgb.astype(self.dtype), Mrgb2.astype(self.dtype))
 
     def _get_si(self) -> int:
         return aSIKeys.index(self.info['SI'])
@@ -77,6 +101,10 @@ class CIEHueTransform:
     def _get_va(self) -> int:
         return (self.info['VA'] - 2) // 8
 
+    def _asarray(self, s) -> ndarray:
+        return asarray(s, self.dtype)
+
+    @instrument.timed('CIEHueTransform.xyz2lab')
     def xyz2lab(self, xyz: ndarray) -> NDArray[float64]:
         """
         CIE XYZ to CIELAB.
@@ -105,6 +133,7 @@ class CIEHueTransform:
         NDArray[float64] 1-dim or 2-dim
             CIELAB matrix, shape is same as `xyz`, axis0 is L* a* b*, axis1 is input item(if 2-dim)
         """
+        xyz = self._asarray(xyz)
         wp = self._wp[xyz.ndim - 1]
         x1, y1, z1 = _ff(xyz / wp)
         L = 116 * y1 - 16
@@ -112,7 +141,9 @@ class CIEHueTransform:
         b = 200 * (y1 - z1)
         return asarray((L, a, b))
 
+    @instrument.timed('CIEHueTransform.xyz2lab_h')
     def xyz2lab_h(self, xyz: ndarray) -> NDArray[float64]:
+        xyz = self._asarray(xyz)
         x1, y1, z1 = xyz / self._wp_h[xyz.ndim - 1]
         y2 = sqrt(y1)
         L = 100 * y2
@@ -120,55 +151,71 @@ class CIEHueTransform:
         b = self._kab[1] * (y1 - z1) / y2
         return asarray((L, a, b))
 
+    @instrument.timed('CIEHueTransform.xyz2yuv')
     def xyz2yuv(self, xyz: ndarray) -> NDArray[float64]:
+        xyz = self._asarray(xyz)
         x, y, z = xyz
         fm = x + 15 * y + 3 * z
         return asarray((y, 4 * x / fm, 9 * y / fm))
 
+    @instrument.timed('CIEHueTransform.xyz2yxy')
     def xyz2yxy(self, xyz: ndarray) -> NDArray[float64]:
+        xyz = self._asarray(xyz)
         temp = xyz[[0, 1]] / xyz.sum(axis=0)
         return asarray((xyz[1], *temp))
 
+    @instrument.timed('CIEHueTransform.xyz2luv')
     def xyz2luv(self, xyz: ndarray) -> NDArray[float64]:
+        xyz = self._asarray(xyz)
         uv = self.xyz2yuv(xyz)[1:]
         uvn = self.xyz2yuv(self._wp[xyz.ndim - 1])[1:]
         L = _ff(xyz[1] / 100) * 116 - 16
         u, v = 13 * L * (uv - uvn)
         return asarray((L, u, v))
 
+    @instrument.timed('CIEHueTransform.xyz2rgb')
     def xyz2rgb(self, xyz: ndarray) -> NDArray[float64]:
-        y1 = Mrgb @ xyz / 100
+        xyz = self._asarray(xyz)
+        y1 = _dot(self._mrgb[0], xyz) / 100
         y2 = 1.055 * nan_to_num(y1**(1 / 2.4)) - 0.058025  # 1.055 * 0.055
         y3 = 12.92 * y1
         # http://www.brucelindbloom.com/index.html?WorkingSpaceInfo.html
         res = y2 * (y1 > 0.0031308) + y3 * (y1 <= 0.0031308)
         return clip(res, 0, 1)
 
+    @instrument.timed('CIEHueTransform.chs')
     def chs(self, luv: ndarray) -> NDArray[float64]:
         """
         get C, h, s with CIELAB or CIELUV.
         """
+        luv = self._asarray(luv)
         L, u, v = luv
         C = sqrt(u**2 + v**2)
         h = arctan2(v, u) * 180 / pi
         s = C / L
         return asarray((C, h, s))
 
+    @instrument.timed('CIEHueTransform.lab2xyz')
     def lab2xyz(self, lab: ndarray) -> NDArray[float64]:
+        lab = self._asarray(lab)
         L, a, b = lab
         y1 = (L + 16) / 116
         x1 = a / 500 + y1
         z1 = y1 - b / 200
         return _ff_(asarray((x1, y1, z1))) * self._wp[lab.ndim - 1]
 
+    @instrument.timed('CIEHueTransform.lab_h2xyz')
     def lab_h2xyz(self, lab_h: ndarray) -> NDArray[float64]:
+        lab_h = self._asarray(lab_h)
         L, a, b = lab_h
         y0 = L**2 / 10000
         x0 = a / self._kab[0] * L / 100 + y0
         z0 = y0 - b / self._kab[1] * L / 100
         return asarray((x0, y0, z0)) * self._wp_h[lab_h.ndim - 1]
 
+    @instrument.timed('CIEHueTransform.luv2xyz')
     def luv2xyz(self, luv: ndarray) -> NDArray[float64]:
+        luv = self._asarray(luv)
         uvn = self.xyz2yuv(self._wp[luv.ndim - 1])[1:]
         L = luv[0]
         u_, v_ = luv[1:] / 13 / L + uvn
@@ -177,24 +224,31 @@ class CIEHueTransform:
         Z = 3 * Y / v_ - X / 3 - 5 * Y
         return asarray((X, Y, Z))
 
+    @instrument.timed('CIEHueTransform.yxy2xyz')
     def yxy2xyz(self, yxy: ndarray) -> NDArray[float64]:
+        yxy = self._asarray(yxy)
         all_sum = yxy[0] / yxy[2]
         return asarray((yxy[1] * all_sum, yxy[0], (1 - yxy[1] - yxy[2]) * all_sum))
 
+    @instrument.timed('CIEHueTransform.yuv2xyz')
     def yuv2xyz(self, yuv: ndarray) -> NDArray[float64]:
+        yuv = self._asarray(yuv)
         # (y, 4 * x / fm, 9 * y / fm)
         y = yuv[0]
         fm = 9 * y / yuv[2]  # x + 15 * y + 3 * z
         x = yuv[1] * fm / 4
         return asarray((x, y, (fm - x - 15 * y) / 3))
 
+    @instrument.timed('CIEHueTransform.rgb2xyz')
     def rgb2xyz(self, rgb: ndarray) -> NDArray[float64]:
+        rgb = self._asarray(rgb)
         rgb = clip(rgb, 0, 1)
         y1 = rgb / 12.92
         y2 = ((rgb + 0.055) / 1.055)**2.4
         yy = y1 * (rgb <= 0.04045) + y2 * (rgb > 0.04045)
-        return Mrgb2 @ yy * 100
+        return _dot(self._mrgb[1], yy) * 100
 
+    @instrument.timed('CIEHueTransform.rgb16')
     def rgb16(self, rgb: ndarray, upper = 255) -> ndarray:
         """
         RGB[int,int,int] 转 16进制.
@@ -240,6 +294,31 @@ class CIEHueTransform:
             s.append(ss)
         return asarray(s)
 
+    def rgb_pack(self, rgb: ndarray, upper = 255) -> ndarray:
+        """
+        RGB 转 0xRRGGBB 整数, 取整方式同 `rgb16`.
+
+        Parameters
+        ----------
+        rgb : array_like of float 1-dim or 2-dim
+            同 `rgb16`
+        upper : float, default 255
+            同 `rgb16`
+
+        Returns
+        -------
+        NDArray[int64] 1-dim
+            ``f'#{v:06x}'`` 与 `rgb16` 的结果相同
+        """
+        rgb = asarray(rgb)
+        if upper != 255:
+            rgb = (rgb/upper*255).round()
+        rgb = clip(rgb.astype(int64), 0, 255)
+        if rgb.ndim == 1 or rgb.shape[0] == 1:
+            rgb = rgb.reshape([3, 1])
+        return (rgb[0] << 16) | (rgb[1] << 8) | rgb[2]
+
+    @instrument.timed('CIEHueTransform.rgb16_')
     def rgb16_(self,
                rgbtxt: Union[ndarray, list, str],
                upper = 255) -> NDArray[float64]:
@@ -273,7 +352,117 @@ class CIEHueTransform:
                 rgblst = rgb
             else:
                 rgblst = c_[rgblst, rgb]
-        return clip(rgblst / upper, 0, 1)
+        return clip(rgblst / upper, 0, 1).astype(self.dtype)
+
+
+class ColourResult:
+    """
+    按名称取行的数值结果, 不含字符串.
+
+    Parameters
+    ----------
+    values : ndarray 1-dim or 2-dim
+        axis0 为各项目, 与 `names` 对应; axis1 为各输入(2-dim 时).
+        sRGB 行为 0xRRGGBB 整数(见 `CIEHueTransform.rgb_pack`), 以浮点保存.
+        不复制, 对 `values` 的原地修改对数值行可见(已生成的 'hex' 不更新).
+    names : sequence of str, default `COLOUR_TITLE`
+        各行的名称.
+
+    Notes
+    -----
+    ``result['X']`` 为数值行(视图); ``result['hex']`` 为 sRGB 的 16进制颜色码,
+    第一次使用时生成并缓存, 未计算(nan)的为 ''. 字符串只在导出时生成,
+    见 `to_strings` 和 `rows`.
+
+    Examples
+    --------
+    >>> res = CIE(spec).colour_result()
+    >>> res['CIELAB-L*'], res.hex
+    >>> res.select(['X', 'Y', 'Z', 'sRGB']).to_strings()  # 同 colour() 的对应行
+    """
+
+    __slots__ = ['values', 'names', '_index', '_hex']
+    RGB = 'sRGB'
+    HEX = 'hex'
+
+    def __init__(self, values: ndarray, names: Sequence[str] = COLOUR_TITLE):
+        values = asarray(values)
+        if values.ndim == 1:
+            values = values[:, None]
+        if values.ndim != 2 or values.shape[0] != len(names):
+            raise ValueError(f'{self.__class__}: values 的行数与 names 不一致')
+        self.values: ndarray = values
+        self.names: Tuple[str, ...] = tuple(names)
+        self._index: Dict[str, int] = {k: i for i, k in enumerate(self.names)}
+        self._hex: Union[ndarray, None] = None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index or (name == self.HEX and self.RGB in self._index)
+
+    def __getitem__(self, name: str) -> ndarray:
+        if name == self.HEX:
+            return self.hex
+        return self.values[self._index[name]]
+
+    def keys(self) -> List[str]:
+        """各行的名称, 有 sRGB 时最后为 'hex'"""
+        return list(self.names) + ([self.HEX] if self.RGB in self._index else [])
+
+    @property
+    def size(self) -> int:
+        """输入数"""
+        return self.values.shape[1]
+
+    @property
+    def hex(self) -> NDArray[str_]:
+        """sRGB 的 16进制颜色码, 同 `CIEHueTransform.rgb16`"""
+        if self._hex is None:
+            rgb = self.values[self._index[self.RGB]]
+            ok = isfinite(rgb)
+            self._hex = asarray([f'#{v:06x}' if f else ''
+                                 for v, f in zip(where(ok, rgb, 0).astype(int64).tolist(),
+                                                 ok.tolist())], str)
+        return self._hex
+
+    def select(self, names: Sequence[str]) -> 'ColourResult':
+        """只保留 `names` 中的行, 按 `names` 的顺序"""
+        return ColourResult(self.values[[self._index[k] for k in names]], names)
+
+    def take(self, index: Union[slice, Sequence[int], ndarray]) -> 'ColourResult':
+        """只保留 `index` 的输入(列)"""
+        return ColourResult(self.values[:, index], self.names)
+
+    @classmethod
+    def concat(cls, results: Sequence['ColourResult']) -> 'ColourResult':
+        """按输入(列)拼接, 各结果的 names 必须相同"""
+        names = results[0].names
+        if not all(r.names == names for r in results):
+            raise ValueError(f'{cls}: names 不一致, 不能拼接')
+        return cls(hstack([r.values for r in results]), names)
+
+    def to_strings(self) -> NDArray[str_]:
+        """字符串矩阵, 数值为完整精度, sRGB 行为 16进制颜色码; 与 `CIE.colour` 的对应行相同"""
+        out = self.values.astype(str)
+        if self.RGB in self._index:
+            out[self._index[self.RGB]] = self.hex
+        return out
+
+    def rows(self) -> Iterator[list]:
+        """逐个输入产出一行, 顺序同 `names`; 数值为 python float, sRGB 为 16进制颜色码"""
+        i_rgb = self._index.get(self.RGB)
+        values = self.values.T.tolist()
+        hexes = self.hex.tolist() if i_rgb is not None else None
+        for j, row in enumerate(values):
+            if i_rgb is not None:
+                row[i_rgb] = hexes[j]
+            yield row
+
+    def to_dict(self) -> Dict[str, list]:
+        """名称 -> python 列表, 可直接序列化为 JSON; sRGB 为 16进制颜色码"""
+        res = {k: v for k, v in zip(self.names, self.values.tolist())}
+        if self.RGB in res:
+            res[self.RGB] = self.hex.tolist()
+        return res
 
 
 class CIE(CIEHueTransform):
@@ -292,21 +481,133 @@ class CIE(CIEHueTransform):
         The wavelength unit of the spectrum, {'nm', 'um', 'μm'}, default: 'nm'.
     upper : {1, 100}, default 100
         The upper limit of the spectrum, {1, 100}, default: 100.
+    kind : {'cubic', 'linear', 'quadratic', 'sprague', 'pchip', 'akima'}, default 'cubic'
+        The interpolation used to resample the spectrum, default: 'cubic'.
+        'sprague' (CIE 167) requires uniformly spaced wavelengths; 'sprague',
+        'pchip' and 'akima' are local and need no linear solve.
+    dtype : {float64, float32}, default float64
+        The floating type of the resampled spectra, the weight tables and every output,
+        default: float64. Wavelengths and the spline fit stay float64.
+        Against the float64 path, float32 stays within ΔE*ab 1e-3 (CIE76); the worst
+        case measured with ``difftest.py`` on random spectra is about 2e-4.
     """
 
-    __slots__ = ['spec', 'si0', 'xyzl0', 'sxyzl', 'spec_interp']
+    __slots__ = ['spec', 'si0', 'xyzl0', 'sxyzl', 'spec_interp', 'w1']
 
     def __init__(self, spec: Union[ndarray, list, tuple],
                  si: Literal['A', 'D65', 'C', 'D50', 'D55', 'D75',
                              'a', 'd65', 'c', 'd50', 'd55', 'd75'] = 'D65',
                  va: Literal[2, 10] = 2,
                  unit: Literal['nm', 'um', 'μm'] = 'nm',
-                 upper: Literal[1, 100] = 100):
-        super().__init__(si, va)
+                 upper: Literal[1, 100] = 100,
+                 kind: Literal['cubic', 'linear', 'quadratic',
+                               'sprague', 'pchip', 'akima'] = 'cubic',
+                 dtype: type = float64):
+        super().__init__(si, va, dtype)
+        with instrument.stage('CIE.check') as st:
+            w0, spec = self._spec_check(spec, unit, upper)
+            st.items, st.nbytes = spec.shape[-1], spec.nbytes
+        wn = w0.min()
+        wm = w0.max()
+        self.spec_interp = make_interp1d(w0, spec, axis=0, kind=kind, dtype=self.dtype)
+
+        dy = diff(w0)
+        if all(dy == dy[0]):
+            step = int(clip(dy[0], 1, 10))
+        else:
+            dy_mean = dy.mean().round()
+            step = int(clip(dy_mean, 1, 10))
+        if wn > 400:
+            raise ValueError(f'{self.__class__}: 光谱最小波长不能大于400nm')
+        wn = floor(wn / step) * step if wn > 380 else 380
+        if wm < 700:
+            raise ValueError(f'{self.__class__}: 光谱最大波长不能小于700nm')
+        wm = ceil(wm / step) * step if wm < 780 else 780
+        self.info['wavelength_step'] = step
+        self.info['wavelength_range'] = (wn, wm)
+        self.info['item_number'] = spec.shape[-1]
+        w1 = arange(wn, wm+step, step, int)
+        w1 = w1[w1 <= 780]  # 步长不整除时不超过 780nm
+
+        self.w1: NDArray[int64] = w1
+        # 单列时插值结果为 1-dim, 统一为 (波长, 光谱数)
+        self.spec: NDArray[float64] = self.spec_interp(w1).reshape(w1.size, -1)
+        self._set_weight()
+
+    def _set_weight(self):
+        # 按 w1 和光源 视场角取权重表
+        with instrument.stage('CIE.weight', self.w1.size) as st:
+            w1 = self.w1 - 380
+            self.si0: NDArray[float64] = aStandardIlluminant[w1, 1 + self._get_si()]
+            self.xyzl0: NDArray[float64] = axyzL[self._get_va(), w1, 1:].T
+            self.sxyzl: NDArray[float64] = (self.si0 * self.xyzl0).astype(self.dtype)
+            st.nbytes = self.sxyzl.nbytes
+
+    def set_illuminant(self,
+                       si: Literal['A', 'D65', 'C', 'D50', 'D55', 'D75',
+                                   'a', 'd65', 'c', 'd50', 'd55', 'd75'] = 'D65',
+                       va: Literal[2, 10] = 2):
+        """
+        Change the Standard Illuminant and the Viewing Angle in place.
+
+        Only the white points and the weight tables are replaced; the fitted
+        and resampled spectra are kept, so no spline is fitted again.
+        """
+        info = self.info
+        CIEHueTransform.__init__(self, si, va, self.dtype)
+        self.info = {**info, **self.info}
+        self._set_weight()
+
+    def with_spec(self, spec: ndarray) -> 'CIE':
+        """
+        A calculator sharing the wavelengths, the illuminant and the weight tables,
+        with `spec` as the resampled spectra (``spec.shape[0] == self.w1.size``).
+        """
+        other = object.__new__(type(self))
+        for cls in (CIEHueTransform, CIE):
+            for k in cls.__slots__:
+                setattr(other, k, getattr(self, k))
+        other.info = {**self.info, 'item_number': spec.shape[-1]}
+        other.spec = spec
+        return other
+
+    def subset(self, index: Union[slice, Sequence[int], ndarray]) -> 'CIE':
+        """
+        The calculator of the columns `index` (a view when `index` is a slice),
+        ``self.subset(index).colour()`` equals ``self.colour()[:, index]``.
+        """
+        return self.with_spec(self.spec[:, index])
+
+    def update(self, index: Union[Sequence[int], ndarray],
+               spec: Union[ndarray, list, tuple],
+               unit: Literal['nm', 'um', 'μm'] = 'nm',
+               upper: Literal[1, 100] = 100,
+               kind: Literal['cubic', 'linear', 'quadratic',
+                             'sprague', 'pchip', 'akima'] = 'cubic'):
+        """
+        Fit and resample again only the columns `index`, in place.
+
+        Parameters
+        ----------
+        index : sequence of int
+            The columns of the resampled spectra to replace, ``len(index) == spec.shape[1] - 1``.
+        spec : ndarray
+            The new spectra of these columns, the same layout as the `CIE` input;
+            the wavelengths must give the same resampling grid.
+        unit, upper, kind
+            Same as `CIE`.
+        """
+        part = CIE(spec, self.info['SI'], self.info['VA'], unit, upper, kind, self.dtype)
+        if part.w1.shape != self.w1.shape or any(part.w1 != self.w1):
+            raise ValueError(f'{self.__class__}: 波长与原光谱不一致')
+        self.spec[:, index] = part.spec
+
+    def _spec_check(self, spec, unit, upper) -> Tuple[NDArray[float64], NDArray[float64]]:
+        """按波长排序, 检查上限和单位; 返回 (波长nm, 光谱0-100)"""
         if isinstance(spec, (ndarray, list, tuple)):
             spec = asarray(spec)
             spec = spec[spec[:, 0].argsort()]
-            w0 = spec[:, 0]
+            w0 = asarray(spec[:, 0], float64)
             spec = spec[:, 1:]
         else:
             raise TypeError(f'{self.__class__}: 光谱 格式错误')
@@ -326,38 +627,14 @@ class CIE(CIEHueTransform):
             w0 = w0 * 1000
         else:
             raise ValueError(f'{self.__class__}: unit 错误, 请输入 \'nm\'、\'um\' 或 \'μm\'')
-        wn = w0.min()
-        wm = w0.max()
-        self.spec_interp = interp1d(w0, spec, axis=0, kind='cubic')
-
-        dy = diff(w0)
-        if all(dy == dy[0]):
-            step = int(clip(dy[0], 1, 10))
-        else:
-            dy_mean = dy.mean().round()
-            step = int(clip(dy_mean, 1, 10))
-        if wn > 400:
-            raise ValueError(f'{self.__class__}: 光谱最小波长不能大于400nm')
-        wn = floor(wn / step) * step if wn > 380 else 380
-        if wm < 700:
-            raise ValueError(f'{self.__class__}: 光谱最大波长不能小于700nm')
-        wm = ceil(wm / step) * step if wm < 780 else 780
-        self.info['wavelength_step'] = step
-        self.info['wavelength_range'] = (wn, wm)
-        self.info['item_number'] = spec.shape[-1]
-        w1 = arange(wn, wm+step, step, int)
-
-        self.spec: NDArray[float64] = self.spec_interp(w1)
-        w1 -= 380
-        self.si0: NDArray[float64] = aStandardIlluminant[w1, 1 + self._get_si()]
-        self.xyzl0: NDArray[float64] = axyzL[self._get_va(), w1, 1:].T
-        self.sxyzl: NDArray[float64] = self.si0 * self.xyzl0
+        return w0, spec
 
+    @instrument.timed('CIE.spec2xyz')
     def spec2xyz(self) -> NDArray[float64]:
         """spectrum to CIE XYZ."""
         # sumXYZ = self.sxyzl@t/100
         # k = 100/np.sum(sxyz[1])
-        return self.sxyzl @ self.spec / self.sxyzl[1].sum()
+        return _dot(self.sxyzl, self.spec) / self.sxyzl[1].sum()
 
     def spec2yxy(self) -> NDArray[float64]:
         """spectrum to CIE Yxy."""
@@ -382,3 +659,286 @@ class CIE(CIEHueTransform):
     def spec2rgb(self) -> NDArray[float64]:
         """spectrum to sRGB."""
         return self.xyz2rgb(self.spec2xyz())
+
+    def _colour_rows(self) -> Tuple[List[ndarray], ndarray]:
+        # colour() 的各行, sRGB 行之前和之后分开; 返回 (行块, rgb 0-1)
+        XYZ = self.spec2xyz()
+        lab = self.xyz2lab(XYZ)
+        hlab = self.xyz2lab_h(XYZ)
+        rgb = self.xyz2rgb(XYZ)
+        uv_ = self.xyz2yuv(XYZ)[1:]
+        luv = self.xyz2luv(XYZ)
+        xyz = XYZ / XYZ.sum(axis=0)
+        Ch_ab = self.chs(lab)[0:2]
+        Ch_ab_h = self.chs(hlab)[0:2]
+        Chs_uv = self.chs(luv)
+        yi = 100*(1.28*XYZ[0]-1.06*XYZ[2])/XYZ[1]
+        return [XYZ, xyz, lab, Ch_ab, hlab, Ch_ab_h, None,
+                uv_, 1 - uv_.sum(axis=0), luv, Chs_uv, yi], rgb
+
+    @instrument.timed('CIE.colour')
+    def colour(self) -> ndarray:
+        """
+        spectrum to all hue items.
+
+        Returns
+        -------
+        ndarray 2-dim
+            rows are `COLOUR_TITLE`, axis1 is input item,
+            the sRGB row is hex string, so the array dtype is str.
+        """
+        return self.colour_result().to_strings()
+
+    @instrument.timed('CIE.colour_values')
+    def colour_values(self) -> NDArray[float64]:
+        """
+        spectrum to all hue items, numeric.
+
+        Returns
+        -------
+        NDArray[float64] 2-dim
+            same as `colour`, but the sRGB row is the packed 0xRRGGBB integer
+            (see `rgb_pack`) stored as float, so no string is built;
+            the dtype is `dtype` (float32 holds 24-bit integers exactly).
+        """
+        rows, rgb = self._colour_rows()
+        rows[6] = self.rgb_pack(rgb, 1).astype(self.dtype)
+        return vstack(rows)
+
+    def colour_result(self) -> ColourResult:
+        """
+        spectrum to all hue items, by name.
+
+        Returns
+        -------
+        ColourResult
+            wraps `colour_values`, rows are `COLOUR_TITLE`;
+            the hex strings are built only when used.
+        """
+        return ColourResult(self.colour_values())
+
+
+# 拟合时同时存在的 float64 长度 n 的数组个数(排序和转置的副本 中间量 系数), tracemalloc 实测
+_FIT_ROWS = {'linear': 6, 'quadratic': 9, 'cubic': 12, 'sprague': 15, 'pchip': 10, 'akima': 10}
+_ORDER = {'linear': 1, 'quadratic': 2, 'cubic': 3, 'sprague': 5, 'pchip': 3, 'akima': 3}
+
+
+def colour_memory(n: int, n1: int = 401, kind: str = 'cubic', dtype: type = float64,
+                  values: bool = False) -> Tuple[int, int]:
+    """
+    估计 ``CIE(spec, kind=kind, dtype=dtype).colour()`` 的峰值内存.
+
+    Parameters
+    ----------
+    n : int
+        输入光谱的波长点数.
+    n1 : int, default 401
+        插值后的点数, 380-780nm 步长 1 时为 401.
+    kind, dtype
+        同 `CIE`.
+    values : bool, default False
+        计算 ``colour_values()``, 不生成字符串.
+
+    Returns
+    -------
+    fixed : int
+        与光谱数无关的字节数(全局样条方程组及其逆, 权重表).
+    per_item : int
+        每个光谱的字节数, 取以下三个阶段的最大值, 另留 10% 余量:
+        拟合(float64, `_FIT_ROWS` 个长度 n 的数组);
+        重采样(系数 (kind+1, n-1) 与约 3 个长度 n1 的数组, dtype);
+        色度(系数 重采样后的光谱 约 60 行中间量, dtype; 字符串 27*35*4).
+    """
+    kind = kind.lower()
+    item = np_dtype(dtype).itemsize
+    fixed = 8 * n1 * 8
+    if kind in ('quadratic', 'cubic'):
+        fixed += 2 * n * n * 8
+    coe = (_ORDER[kind] + 1) * (n - 1) * item
+    fit = _FIT_ROWS[kind] * n * 8
+    resample = coe + 3 * n1 * item
+    colour = coe + n1 * item + 60 * item + (0 if values else len(COLOUR_TITLE) * 35 * 4)
+    return fixed, int(max(fit, resample, colour) * 1.1)
+
+
+def cie_chunks(spec: Union[ndarray, list, tuple],
+               si: Literal['A', 'D65', 'C', 'D50', 'D55', 'D75',
+                           'a', 'd65', 'c', 'd50', 'd55', 'd75'] = 'D65',
+               va: Literal[2, 10] = 2,
+               unit: Literal['nm', 'um', 'μm'] = 'nm',
+               upper: Literal[1, 100] = 100,
+               chunk: int = 1000,
+               kind: str = 'cubic',
+               dtype: type = float64) -> Iterator[Tuple[int, 'CIE']]:
+    """
+    按列分块建立 ``CIE(spec, si, va, unit, upper, kind, dtype)``, 逐块产出.
+
+    Yields
+    ------
+    start : int
+        本块第一个光谱的序号(不含波长列).
+    cie : CIE
+        ``spec[:, start:start + chunk]`` 部分的计算器.
+    """
+    spec = asarray(spec)
+    m = spec.shape[1] - 1
+    chunk = max(int(chunk), 1)
+    for start in range(0, m, chunk):
+        part = c_[spec[:, 0], spec[:, 1 + start:1 + start + chunk]]
+        yield start, CIE(part, si, va, unit, upper, kind, dtype)
+
+
+def colour_chunks(spec: Union[ndarray, list, tuple],
+                  si: Literal['A', 'D65', 'C', 'D50', 'D55', 'D75',
+                              'a', 'd65', 'c', 'd50', 'd55', 'd75'] = 'D65',
+                  va: Literal[2, 10] = 2,
+                  unit: Literal['nm', 'um', 'μm'] = 'nm',
+                  upper: Literal[1, 100] = 100,
+                  chunk: int = 1000,
+                  kind: str = 'cubic',
+                  dtype: type = float64,
+                  values: bool = False) -> Iterator[Tuple[int, ndarray]]:
+    """
+    按列分块计算 ``CIE(spec, si, va, unit, upper, kind, dtype).colour()``, 逐块产出.
+
+    `values` 为 True 时计算 ``colour_values()``.
+
+    Yields
+    ------
+    start : int
+        本块第一个光谱的序号(不含波长列).
+    hue : ndarray
+        ``colour()`` 的 ``[:, start:start + chunk]`` 部分.
+    """
+    for start, cie in cie_chunks(spec, si, va, unit, upper, chunk, kind, dtype):
+        hue = _colour_all(cie, values)
+        del cie  # 建立下一块之前释放本块的系数和光谱
+        yield start, hue
+
+
+def _colour_all(cie: CIE, values: bool) -> ndarray:
+    return cie.colour_values() if values else cie.colour()
+
+
+def colour_chunked(spec: Union[ndarray, list, tuple],
+                   si: Literal['A', 'D65', 'C', 'D50', 'D55', 'D75',
+                               'a', 'd65', 'c', 'd50', 'd55', 'd75'] = 'D65',
+                   va: Literal[2, 10] = 2,
+                   unit: Literal['nm', 'um', 'μm'] = 'nm',
+                   upper: Literal[1, 100] = 100,
+                   max_memory: Union[int, None] = None,
+                   chunk: Union[int, None] = None,
+                   kind: str = 'cubic',
+                   dtype: type = float64,
+                   values: bool = False) -> ndarray:
+    """
+    分块计算 ``CIE(spec, si, va, unit, upper, kind, dtype).colour()``, 结果与不分块完全相同.
+
+    `values` 为 True 时计算 ``colour_values()``, 可直接作为 `ColourResult` 的数据.
+
+    Parameters
+    ----------
+    spec, si, va, unit, upper, kind, dtype
+        同 `CIE`.
+    max_memory : int or None
+        每块计算的内存上限(字节), 按 `colour_memory` 估计块大小;
+        不含输入 `spec` 和返回的结果. None 且 `chunk` 为 None 时不分块.
+    chunk : int or None
+        直接指定每块的光谱数, 优先于 `max_memory`.
+
+    Returns
+    -------
+    ndarray 2-dim
+        同 `CIE.colour()` 或 `CIE.colour_values()`
+    """
+    spec = asarray(spec)
+    m = spec.shape[1] - 1
+    if chunk is None:
+        if max_memory is None:
+            return _colour_all(CIE(spec, si, va, unit, upper, kind, dtype), values)
+        fixed, per_item = colour_memory(spec.shape[0], kind=kind, dtype=dtype, values=values)
+        if max_memory <= fixed + per_item:
+            raise MemoryError(f'max_memory 过小, 至少需要 {fixed + per_item} 字节')
+        chunk = (max_memory - fixed) // per_item
+    chunk = max(int(chunk), 1)
+    if chunk >= m:
+        return _colour_all(CIE(spec, si, va, unit, upper, kind, dtype), values)
+
+    out = None
+    for start, hue in colour_chunks(spec, si, va, unit, upper, chunk, kind, dtype, values):
+        if out is None:
+            out = empty((hue.shape[0], m), hue.dtype)
+        out[:, start:start + hue.shape[1]] = hue
+        del hue
+    return out
+
+
+def colour_ragged(groups: Sequence[Tuple[ndarray, ndarray]],
+                  si: Literal['A', 'D65', 'C', 'D50', 'D55', 'D75',
+                              'a', 'd65', 'c', 'd50', 'd55', 'd75'] = 'D65',
+                  va: Literal[2, 10] = 2,
+                  unit: Literal['nm', 'um', 'μm'] = 'nm',
+                  upper: Literal[1, 100] = 100,
+                  kind: str = 'cubic',
+                  dtype: type = float64,
+                  max_memory: Union[int, None] = None,
+                  values: bool = False) -> ndarray:
+    """
+    不同波长网格的光谱一次计算.
+
+    波长相同的组合并为一块, 每个不同的网格只建一次插值和权重, 结果按输入顺序排列.
+
+    Parameters
+    ----------
+    groups : sequence of (grid, spectra)
+        grid 为 1-dim 波长; spectra 为 (grid.size, m_i) 或 (grid.size,) 的光谱.
+    si, va, unit, upper, kind, dtype
+        同 `CIE`.
+    max_memory : int or None
+        每块的内存上限, 同 `colour_chunked`.
+    values : bool, default False
+        True 时结果同 `CIE.colour_values()`, 否则同 `CIE.colour()`.
+
+    Returns
+    -------
+    ndarray 2-dim
+        同 `CIE.colour()`, 各组的列按 groups 的顺序依次排列, 共 ``sum(m_i)`` 列.
+
+    Examples
+    --------
+    >>> hue = colour_ragged([(w_a, spec_a), (w_b, spec_b), (w_a, spec_c)])
+    >>> hue_b = hue[:, spec_a.shape[1]:spec_a.shape[1] + spec_b.shape[1]]
+    """
+    grids: List[ndarray] = []
+    specs: List[ndarray] = []
+    blocks: Dict[bytes, List[int]] = {}
+    for i, (grid, spectra) in enumerate(groups):
+        grid = asarray(grid, float64).ravel()
+        spectra = asarray(spectra)
+        if spectra.ndim == 1:
+            spectra = spectra[:, None]
+        if spectra.ndim != 2 or spectra.shape[0] != grid.size:
+            raise ValueError(f'colour_ragged: 第 {i} 组的光谱行数与波长数不一致')
+        grids.append(grid)
+        specs.append(spectra)
+        if spectra.shape[1]:
+            blocks.setdefault(grid.tobytes(), []).append(i)
+
+    start = [0]
+    for spectra in specs:
+        start.append(start[-1] + spectra.shape[1])
+    out = None
+    for index in blocks.values():
+        spec = c_[grids[index[0]], hstack([specs[i] for i in index])]
+        hue = colour_chunked(spec, si, va, unit, upper, max_memory=max_memory,
+                             kind=kind, dtype=dtype, values=values)
+        if out is None:
+            out = empty((hue.shape[0], start[-1]), hue.dtype)
+        col = 0
+        for i in index:
+            m = specs[i].shape[1]
+            out[:, start[i]:start[i] + m] = hue[:, col:col + m]
+            col += m
+    if out is None:
+        out = empty((len(COLOUR_TITLE), 0), np_dtype(dtype) if values else str)
+    return out
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+色彩空间之间的直接转换, 不依赖 wx
+
+    lch = convert(lab, 'lab', 'lch')
+    lab = convert(rgb, 'rgb', 'lab', si='D50')
+    de = delta_e(rgb_a, rgb_b, 'rgb')
+
+以 `CIEHueTransform` 的 ``*2xyz`` / ``xyz2*`` 方法为边建图, 按代价找最短路径;
+路径上相邻的线性步骤(如 sRGB 的 Mrgb2 与 CIELAB 的白点缩放)合并为一个矩阵.
+组合后的函数按 (src, dst, si, va, dtype) 缓存.
+"""
+import heapq
+from functools import lru_cache
+from typing import Callable, Dict, List, Literal, Tuple, Union
+
+from cie import CIEHueTransform, _dot, _ff, _ff_
+from numpy import (arctan2, asarray, clip, cos, deg2rad, diag, float64, hypot,
+                   nan_to_num, ndarray, pi, sin, sqrt)
+
+# 空间名称: 各行的含义
+SPACES = {
+    'xyz': 'CIE XYZ',
+    'yxy': 'CIE Y x y',
+    'yuv': "CIE Y u' v'",
+    'lab': 'CIELAB L* a* b*',
+    'lch': 'CIELAB L* C*ab h_ab',
+    'lab_h': 'Hunter L a b',
+    'lch_h': 'Hunter L C h',
+    'luv': 'CIELUV L* u* v*',
+    'lch_uv': 'CIELUV L* C*uv h_uv',
+    'rgb': 'sRGB 0-1',
+}
+
+# 一步: ('mat', 3x3 矩阵) 或 ('fn', 函数, 代价)
+Step = Tuple
+# 边: (起点, 终点) -> 由转换器生成步骤列表的函数
+_EDGES: Dict[Tuple[str, str], Callable[[CIEHueTransform], List[Step]]] = {}
+_MAT_COST = 1.  # 一次 3x3 矩阵乘的代价, 函数步骤的代价相对于它估计
+
+
+def _edge(src: str, dst: str):
+
+    def deco(func):
+        _EDGES[(src, dst)] = func
+        return func
+
+    return deco
+
+
+def _polar(x: ndarray) -> ndarray:
+    # L a b -> L C h, h 为角度 -180~180, 同 CIEHueTransform.chs
+    L, a, b = x
+    return asarray((L, hypot(a, b), arctan2(b, a) * 180 / pi))
+
+
+def _cartesian(x: ndarray) -> ndarray:
+    L, C, h = x
+    h = deg2rad(h)
+    return asarray((L, C * cos(h), C * sin(h)))
+
+
+def _srgb_encode(y1: ndarray) -> ndarray:
+    # 线性 RGB 转 sRGB, 同 CIEHueTransform.xyz2rgb 的后半部分
+    y2 = 1.055 * nan_to_num(y1**(1 / 2.4)) - 0.058025
+    y3 = 12.92 * y1
+    return clip(y2 * (y1 > 0.0031308) + y3 * (y1 <= 0.0031308), 0, 1)
+
+
+def _srgb_decode(rgb: ndarray) -> ndarray:
+    # sRGB 转线性 RGB, 同 CIEHueTransform.rgb2xyz 的前半部分
+    rgb = clip(rgb, 0, 1)
+    y1 = rgb / 12.92
+    y2 = ((rgb + 0.055) / 1.055)**2.4
+    return y1 * (rgb <= 0.04045) + y2 * (rgb > 0.04045)
+
+
+def _lab_encode(t: ndarray) -> ndarray:
+    # XYZ/白点 -> L* a* b*
+    x1, y1, z1 = _ff(t)
+    return asarray((116 * y1 - 16, 500 * (x1 - y1), 200 * (y1 - z1)))
+
+
+def _lab_decode(lab: ndarray) -> ndarray:
+    L, a, b = lab
+    y1 = (L + 16) / 116
+    return _ff_(asarray((a / 500 + y1, y1, y1 - b / 200)))
+
+
+@_edge('xyz', 'rgb')
+def _xyz_rgb(c: CIEHueTransform) -> List[Step]:
+    return [('mat', c._mrgb[0] / 100), ('fn', _srgb_encode, 3.)]
+
+
+@_edge('rgb', 'xyz')
+def _rgb_xyz(c: CIEHueTransform) -> List[Step]:
+    return [('fn', _srgb_decode, 3.), ('mat', c._mrgb[1] * 100)]
+
+
+@_edge('xyz', 'lab')
+def _xyz_lab(c: CIEHueTransform) -> List[Step]:
+    return [('mat', diag(1 / c._wp[0])), ('fn', _lab_encode, 3.)]
+
+
+@_edge('lab', 'xyz')
+def _lab_xyz(c: CIEHueTransform) -> List[Step]:
+    return [('fn', _lab_decode, 3.), ('mat', diag(c._wp[0]))]
+
+
+@_edge('xyz', 'lab_h')
+def _xyz_lab_h(c: CIEHueTransform) -> List[Step]:
+    kab = c._kab
+
+    def encode(t: ndarray) -> ndarray:
+        x1, y1, z1 = t
+        y2 = sqrt(y1)
+        return asarray((100 * y2, kab[0] * (x1 - y1) / y2, kab[1] * (y1 - z1) / y2))
+
+    return [('mat', diag(1 / c._wp_h[0])), ('fn', encode, 2.)]
+
+
+@_edge('lab_h', 'xyz')
+def _lab_h_xyz(c: CIEHueTransform) -> List[Step]:
+    kab = c._kab
+
+    def decode(lab_h: ndarray) -> ndarray:
+        L, a, b = lab_h
+        y0 = L**2 / 10000
+        return asarray((a / kab[0] * L / 100 + y0, y0, y0 - b / kab[1] * L / 100))
+
+    return [('fn', decode, 2.), ('mat', diag(c._wp_h[0]))]
+
+
+@_edge('xyz', 'yxy')
+def _xyz_yxy(c: CIEHueTransform) -> List[Step]:
+    return [('fn', c.xyz2yxy, 1.)]
+
+
+@_edge('yxy', 'xyz')
+def _yxy_xyz(c: CIEHueTransform) -> List[Step]:
+    return [('fn', c.yxy2xyz, 1.)]
+
+
+@_edge('xyz', 'yuv')
+def _xyz_yuv(c: CIEHueTransform) -> List[Step]:
+    return [('fn', c.xyz2yuv, 1.)]
+
+
+@_edge('yuv', 'xyz')
+def _yuv_xyz(c: CIEHueTransform) -> List[Step]:
+    return [('fn', c.yuv2xyz, 1.)]
+
+
+@_edge('xyz', 'luv')
+def _xyz_luv(c: CIEHueTransform) -> List[Step]:
+    return [('fn', c.xyz2luv, 4.)]
+
+
+@_edge('luv', 'xyz')
+def _luv_xyz(c: CIEHueTransform) -> List[Step]:
+    return [('fn', c.luv2xyz, 4.)]
+
+
+for _a, _b in (('lab', 'lch'), ('lab_h', 'lch_h'), ('luv', 'lch_uv')):
+    _EDGES[(_a, _b)] = lambda c: [('fn', _polar, 2.)]
+    _EDGES[(_b, _a)] = lambda c: [('fn', _cartesian, 2.)]
+
+
+def _step_cost(step: Step) -> float:
+    return _MAT_COST if step[0] == 'mat' else step[2]
+
+
+@lru_cache(maxsize=None)
+def find_path(src: str, dst: str) -> Tuple[str, ...]:
+    """代价最小的路径, 包含 src 和 dst"""
+    for k in (src, dst):
+        if k not in SPACES:
+            raise ValueError(f'convert: 未知的色彩空间 {k!r}, 可选 {list(SPACES)}')
+    c = CIEHueTransform()
+    cost = {k: sum(_step_cost(s) for s in f(c)) for k, f in _EDGES.items()}
+    queue = [(0., (src,))]
+    done = set()
+    while queue:
+        d, path = heapq.heappop(queue)
+        node = path[-1]
+        if node == dst:
+            return path
+        if node in done:
+            continue
+        done.add(node)
+        for (a, b), w in cost.items():
+            if a == node and b not in done:
+                heapq.heappush(queue, (d + w, path + (b,)))
+    raise ValueError(f'convert: 没有从 {src!r} 到 {dst!r} 的路径')
+
+
+@lru_cache(maxsize=None)
+def _transform(si: str, va: int, dtype: str) -> CIEHueTransform:
+    return CIEHueTransform(si, va, dtype)
+
+
+def fuse(steps: List[Step]) -> List[Step]:
+    """相邻的矩阵步骤相乘合并"""
+    res: List[Step] = []
+    for step in steps:
+        if step[0] == 'mat' and res and res[-1][0] == 'mat':
+            res[-1] = ('mat', step[1] @ res[-1][1])
+        else:
+            res.append(step)
+    return res
+
+
+@lru_cache(maxsize=256)
+def converter(src: str, dst: str, si: str = 'D65', va: int = 2,
+              dtype: str = 'float64') -> Callable[[ndarray], ndarray]:
+    """
+    `convert` 的组合函数, 按 (src, dst, si, va, dtype) 缓存.
+
+    Returns
+    -------
+    Callable
+        输入输出同 `convert` 的 data 和返回值.
+    """
+    c = _transform(si.upper(), va, dtype)
+    path = find_path(src, dst)
+    steps = []
+    for a, b in zip(path[:-1], path[1:]):
+        steps.extend(_EDGES[(a, b)](c))
+    steps = [('mat', s[1].astype(c.dtype)) if s[0] == 'mat' else s for s in fuse(steps)]
+
+    def func(data: ndarray) -> ndarray:
+        x = c._asarray(data)
+        for step in steps:
+            x = _dot(step[1], x) if step[0] == 'mat' else step[1](x)
+        return asarray(x)
+
+    func.path = path
+    func.steps = steps
+    return func
+
+
+def convert(data: Union[ndarray, list, tuple], src: str, dst: str,
+            si: Literal['A', 'D65', 'C', 'D50', 'D55', 'D75'] = 'D65',
+            va: Literal[2, 10] = 2, dtype: type = float64) -> ndarray:
+    """
+    色彩空间转换.
+
+    Parameters
+    ----------
+    data : array_like 1-dim or 2-dim
+        ``data.shape[0] == 3``, axis1 为各输入(2-dim 时).
+    src, dst : str
+        `SPACES` 中的空间名称, 如 'rgb' 'lab' 'lch'.
+    si, va, dtype
+        同 `CIEHueTransform`.
+
+    Returns
+    -------
+    ndarray
+        形状同 `data`.
+    """
+    return converter(src, dst, si, va, asarray(0, dtype).dtype.name)(data)
+
+
+def delta_e(data1: Union[ndarray, list, tuple], data2: Union[ndarray, list, tuple],
+            src: str = 'lab',
+            si: Literal['A', 'D65', 'C', 'D50', 'D55', 'D75'] = 'D65',
+            va: Literal[2, 10] = 2) -> ndarray:
+    """两组颜色的 CIE76 色差 ΔE*ab, 先由 `src` 转为 CIELAB"""
+    lab = converter(src, 'lab', si, va)
+    return sqrt(((lab(data1) - lab(data2))**2).sum(axis=0))
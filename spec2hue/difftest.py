@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""
+差分测试: 随机生成数据, 对比各加速实现与 reference.py 的参考实现
+
+    python difftest.py -n 300 --seed 0
+
+每个用例随机生成: 波长(等间距/不等间距, nm/μm), 光谱(上限 1/100), 样条 kind 和 boundary,
+光源和视场角. 插值类与参考 interp1d 比较插值结果, 色度类与参考 spec2xyz 比较 XYZ;
+两者都换算为 CIELAB 色差 ΔE*ab 报告最大偏差. 失败时打印种子以便复现.
+
+注册新的加速实现::
+
+    @register('interp', 'my_spline', tol=1e-6)
+    def my_spline(x, y, kind, boundary):
+        return lambda x_new: ...    # 形状同 reference.interp1d(x, y, 0, kind, boundary)(x_new)
+
+返回 None 表示该用例不适用(如 sprague 遇到不等间距), 不计入统计.
+与参考样条不同的插值方法用 `reference` 指定独立的参考, 见 `FastPath`.
+
+    @register('cie', 'my_xyz', tol=1e-6)
+    def my_xyz(spec, si, va, unit, upper):
+        return ...                  # (3, m) 同 CIE(...).spec2xyz()
+"""
+import argparse
+import sys
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Literal, Sequence, Tuple
+
+import numpy as np
+import reference
+from cie import (CIE, CIEHueTransform, ColourResult, aSIKeys, cie_chunks, colour_chunked,
+                 colour_ragged)
+from interpolate import interp1d, interp1d_local
+from watch import ColourEngine
+
+try:
+    from scipy.interpolate import Akima1DInterpolator, PchipInterpolator
+except ImportError:  # 没有 scipy 时不检查 pchip akima
+    Akima1DInterpolator = PchipInterpolator = None
+
+
+@dataclass
+class FastPath:
+    """
+    tol 为允许的最大 ΔE*ab; abs_tol 为插值结果允许的最大绝对误差(光谱 0-100), None 为不检查.
+    kinds 为该实现支持的样条阶数, boundaries 为支持的边界条件.
+    reference 为独立的参考 ``reference(case) -> (y, f)``: 用 y 代替用例的光谱,
+    ``f(x_new)`` 为参考结果, nan 的点不比较; 返回 None 为不适用.
+    None 时与 `reference.interp1d` 的 kind boundary 样条比较.
+    """
+    group: Literal['interp', 'cie']
+    name: str
+    func: Callable
+    tol: float
+    abs_tol: float = None
+    kinds: Tuple[str, ...] = interp1d.kind_str
+    boundaries: Tuple[str, ...] = interp1d.boundary_str
+    reference: Callable = None
+
+
+FAST_PATHS: Dict[str, FastPath] = {}
+
+
+def register(group: Literal['interp', 'cie'], name: str, tol: float,
+             abs_tol: float = None, kinds: Sequence[str] = interp1d.kind_str,
+             boundaries: Sequence[str] = interp1d.boundary_str, reference: Callable = None):
+    """注册加速实现, 见模块说明"""
+
+    def deco(func):
+        FAST_PATHS[name] = FastPath(group, name, func, tol, abs_tol,
+                                    tuple(kinds), tuple(boundaries), reference)
+        return func
+
+    return deco
+
+
+# ---------------------------------------------------------------- 已有实现
+# 参考实现用全局幂基系数 (x**3 ~ 3e8), 抵消误差约 1e-6 (光谱 0-100);
+# 局部坐标系数比参考实现更准, 容差按参考实现的舍入误差设置
+@register('interp', 'interpolate.interp1d', tol=1e-7, abs_tol=1e-5)
+def _interp1d(x, y, kind, boundary):
+    return interp1d(x, y, 0, kind, boundary)
+
+
+@register('cie', 'cie.CIE', tol=1e-7)
+def _cie(spec, si, va, unit, upper):
+    xyz = CIE(spec, si, va, unit, upper).spec2xyz()
+    return xyz if xyz.ndim == 2 else xyz[:, None]
+
+
+@register('cie', 'cie.colour_chunked', tol=1e-7)
+def _cie_chunked(spec, si, va, unit, upper):
+    hue = colour_chunked(spec, si, va, unit, upper, chunk=3)
+    return hue[:3].astype(float)
+
+
+# 同 Spec2Hue._calc_full: 分块插值后拼接, 再按列取子集. 每块 m-1 列, 末块只有一列
+# (如 1001 列每块 1000); m 为 1 时只有一块一列
+@register('cie', 'cie.cie_chunks', tol=1e-7)
+def _cie_chunks(spec, si, va, unit, upper):
+    m = spec.shape[1] - 1
+    parts = []
+    for _, cie in cie_chunks(spec, si, va, unit, upper, chunk=max(m - 1, 1)):
+        parts.append(cie.spec)
+    return cie.with_spec(np.concatenate(parts, axis=1)).subset(slice(None)).spec2xyz()
+
+
+@register('cie', 'cie.colour_ragged', tol=1e-7)
+def _cie_ragged(spec, si, va, unit, upper):
+    # 拆成三组: 原网格, 倒序的网格(视为另一个网格), 再回到原网格
+    w, y = spec[:, 0], spec[:, 1:]
+    m = y.shape[1]
+    groups = [(w, y[:, :m // 3]), (w[::-1], y[::-1, m // 3:2 * m // 3]), (w, y[:, 2 * m // 3:])]
+    hue = colour_ragged(groups, si, va, unit, upper)
+    return hue[:3].astype(float)
+
+
+# 分两块计算后按列拼接结果, 同名称的结果必须能拼接
+@register('cie', 'cie.ColourResult.concat', tol=1e-7)
+def _concat(spec, si, va, unit, upper):
+    m = spec.shape[1] - 1
+    parts = [y for y in (spec[:, 1:1 + m // 2], spec[:, 1 + m // 2:]) if y.shape[1]]
+    res = ColourResult.concat([CIE(np.c_[spec[:, 0], y], si, va, unit, upper).colour_result()
+                               for y in parts])
+    return res.select(['X', 'Y', 'Z']).values
+
+
+# 预先求出的重采样矩阵, 只差矩阵乘的舍入
+@register('cie', 'watch.ColourEngine', tol=1e-7)
+def _engine(spec, si, va, unit, upper):
+    return ColourEngine(spec[:, 0], si, va, unit, upper).colour_values(spec[:, 1:])[:3]
+
+
+# float32 的容差为 ΔE 1e-3, 实测上限约 2e-4, 见 cie.CIE 的 dtype
+@register('cie', 'cie.CIE[float32]', tol=1e-3)
+def _cie_f32(spec, si, va, unit, upper):
+    xyz = CIE(spec, si, va, unit, upper, dtype=np.float32).spec2xyz()
+    return xyz if xyz.ndim == 2 else xyz[:, None]
+
+
+# 局部插值与参考样条是不同的方法, 各自与独立的参考比较, 容差为舍入误差.
+# sprague: 内部区间精确重现 4次多项式; 两端各两个区间用 CIE 的外延系数,
+# 只重现 1次多项式, 不比较
+def _ref_sprague(case):
+    rng = np.random.default_rng(case.seed)
+    coef = rng.uniform(-1, 1, (5, case.y.shape[1]))
+    lo, hi = case.x[0], case.x[-1]
+
+    def poly(x):
+        return 50 + 9 * np.polynomial.polynomial.polyval(2 * (x - lo) / (hi - lo) - 1, coef).T
+
+    def f(x_new):
+        res = poly(x_new)
+        if case.x.size >= 6:
+            res[(x_new < case.x[2]) | (x_new > case.x[-3])] = np.nan
+        return res
+
+    return poly(case.x), f
+
+
+def _ref_scipy(cls):
+    def ref(case):
+        if cls is None:
+            return None
+        return case.y, cls(case.x, case.y, axis=0)
+    return ref
+
+
+@register('interp', 'interpolate.sprague', tol=1e-9, abs_tol=1e-9, reference=_ref_sprague)
+def _sprague(x, y, kind, boundary):
+    dx = np.diff(x)
+    if x.size < 6 or not np.allclose(dx, dx[0], rtol=1e-6, atol=0):
+        return None
+    return interp1d_local(x, y, 0, 'sprague')
+
+
+@register('interp', 'interpolate.pchip', tol=1e-9, abs_tol=1e-9,
+          reference=_ref_scipy(PchipInterpolator))
+def _pchip(x, y, kind, boundary):
+    return interp1d_local(x, y, 0, 'pchip')
+
+
+@register('interp', 'interpolate.akima', tol=1e-9, abs_tol=1e-9,
+          reference=_ref_scipy(Akima1DInterpolator))
+def _akima(x, y, kind, boundary):
+    return interp1d_local(x, y, 0, 'akima')
+
+
+# ---------------------------------------------------------------- 随机数据
+@dataclass
+class Case:
+    seed: int
+    x: np.ndarray  # 波长 nm
+    y: np.ndarray  # (n, m) 0-100
+    kind: str
+    boundary: str
+    si: str
+    va: int
+    unit: str
+    upper: int
+    info: Dict = field(default_factory=dict)
+
+    def spec(self) -> np.ndarray:
+        """CIE 的输入, 按 unit upper 换算"""
+        x = self.x / 1000 if self.unit == 'um' else self.x
+        y = self.y / 100 if self.upper == 1 else self.y
+        return np.c_[x, y]
+
+
+def make_case(seed: int) -> Case:
+    rng = np.random.default_rng(seed)
+    lo, hi = rng.uniform(340, 400), rng.uniform(700, 830)
+    n = int(rng.integers(12, 120))
+    if rng.random() < 0.5:
+        x = np.linspace(lo, hi, n)
+        if rng.random() < 0.5:  # 整数步长 如 5nm 10nm
+            step = int(rng.choice((1, 2, 5, 10)))
+            x = np.arange(np.floor(lo / step) * step, hi + step, step, float)
+    else:
+        step = rng.uniform(0.3, 1.7, n - 1)
+        x = np.r_[lo, lo + np.cumsum(step) / step.sum() * (hi - lo)]
+    m = int(rng.integers(1, 12))
+    t = (x[:, None] - x[0]) / (x[-1] - x[0])
+    y = np.zeros((x.size, m))
+    for _ in range(3):
+        a, f, p = rng.uniform(0, 1, (3, 1, m))
+        y += 15 * a * np.sin(2 * np.pi * (f * 3 * t + p))
+    y = np.clip(50 + y + rng.normal(0, 0.5, y.shape), 0, 100)
+    return Case(seed, x, y,
+                kind=str(rng.choice(interp1d.kind_str)),
+                boundary=str(rng.choice(interp1d.boundary_str)),
+                si=str(rng.choice(aSIKeys)), va=int(rng.choice((2, 10))),
+                unit=str(rng.choice(('nm', 'um'))), upper=int(rng.choice((1, 100))))
+
+
+# ---------------------------------------------------------------- 比较
+def delta_e(xyz0: np.ndarray, xyz1: np.ndarray, si: str, va: int) -> np.ndarray:
+    """CIE76 色差 ΔE*ab"""
+    ciet = CIEHueTransform(si, va)
+    return np.sqrt(((ciet.xyz2lab(xyz0) - ciet.xyz2lab(xyz1))**2).sum(axis=0))
+
+
+def _weight(x1: np.ndarray, y1: np.ndarray, si: str, va: int) -> np.ndarray:
+    # 插值结果按参考流程加权为 XYZ, 用于把插值误差换算为 ΔE
+    w1 = x1.astype(int) - 380
+    sxyzl = reference.aStandardIlluminant[w1, 1 + aSIKeys.index(si)] \
+        * reference.axyzL[(va - 2) // 8, w1, 1:].T
+    return sxyzl @ y1 / sxyzl[1].sum()
+
+
+def check(path: FastPath, case: Case) -> Tuple[float, float]:
+    """返回 (ΔE, 绝对误差); 参考实现出错时返回 None"""
+    if path.group == 'interp':
+        if case.kind not in path.kinds or case.boundary not in path.boundaries:
+            return None
+        x1 = np.arange(max(np.ceil(case.x[0]), 380), min(np.floor(case.x[-1]), 780) + 1)
+        y = case.y
+        if path.reference is None:
+            try:
+                ref = reference.interp1d(case.x, y, 0, case.kind, case.boundary)(x1)
+            except np.linalg.LinAlgError:
+                return None
+        else:
+            own = path.reference(case)
+            if own is None:
+                return None
+            y, f = own
+            ref = f(x1)
+        ref = np.asarray(ref, float).reshape(x1.size, -1)
+        func = path.func(case.x, y, case.kind, case.boundary)
+        if func is None:
+            return None
+        res = np.asarray(func(x1), float).reshape(x1.size, -1)
+        keep = np.isfinite(ref).all(axis=1)
+        if not keep.any():
+            return None
+        x1, ref, res = x1[keep], ref[keep], res[keep]
+        err = float(np.abs(res - ref).max())
+        # 不覆盖 380-780nm 时按覆盖的部分加权(随机波长至少覆盖 400-700nm)
+        de = delta_e(_weight(x1, ref, case.si, case.va),
+                     _weight(x1, res, case.si, case.va), case.si, case.va)
+        return float(de.max()), err
+    try:
+        ref = reference.spec2xyz(case.spec(), case.si, case.va, case.unit, case.upper)
+    except IndexError:
+        return None  # 参考实现在步长不整除 780 时越界, 见 cie.CIE
+    res = path.func(case.spec(), case.si, case.va, case.unit, case.upper)
+    if res is None:
+        return None
+    res = np.asarray(res, float)
+    return float(delta_e(ref, res, case.si, case.va).max()), float(np.abs(res - ref).max())
+
+
+@dataclass
+class Report:
+    name: str
+    tol: float
+    cases: int = 0
+    worst_de: float = 0.
+    worst_abs: float = 0.
+    worst_seed: int = None
+    failures: List[int] = field(default_factory=list)
+
+    def __str__(self):
+        state = 'FAIL' if self.failures else 'ok'
+        return (f'{self.name:<28}{state:<5} cases {self.cases:<5} '
+                f'max ΔE {self.worst_de:.3e} (tol {self.tol:.0e})  '
+                f'max |Δ| {self.worst_abs:.3e}  seed {self.worst_seed}')
+
+
+def run(n: int = 200, seed: int = 0, names: Sequence[str] = None) -> List[Report]:
+    paths = [FAST_PATHS[i] for i in names] if names else list(FAST_PATHS.values())
+    reports = {p.name: Report(p.name, p.tol) for p in paths}
+    for s in range(seed, seed + n):
+        case = make_case(s)
+        for p in paths:
+            r = reports[p.name]
+            try:
+                res = check(p, case)
+            except Exception as e:
+                r.cases += 1
+                r.failures.append(s)
+                r.worst_seed = s
+                print(f'{p.name}: seed {s} {type(e).__name__}: {e}', file=sys.stderr)
+                continue
+            if res is None:
+                continue
+            de, err = res
+            r.cases += 1
+            if de >= r.worst_de:
+                r.worst_de, r.worst_seed = de, s
+            r.worst_abs = max(r.worst_abs, err)
+            if de > p.tol or (p.abs_tol is not None and err > p.abs_tol):
+                r.failures.append(s)
+    return list(reports.values())
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='加速实现与参考实现的差分测试')
+    parser.add_argument('-n', default=200, type=int, help='用例数, 默认 200')
+    parser.add_argument('--seed', default=0, type=int, help='起始种子')
+    parser.add_argument('-k', dest='names', nargs='+', choices=list(FAST_PATHS),
+                        help='只测试这些实现')
+    args = parser.parse_args(argv)
+    reports = run(args.n, args.seed, args.names)
+    for r in reports:
+        print(r)
+        if r.failures:
+            print(f'    失败的种子: {r.failures[:20]}')
+    return 1 if any(r.failures for r in reports) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+"""
+数值数组作为数据的虚拟表格
+
+表格不保存字符串, 单元格的文字和 sRGB 色块属性在显示时按需生成.
+
+计算输出:
+
+    grid = HueGrid(parent)
+    grid.SetResult(header, result)          # result 为 CIE.colour_result() 或其 select()
+    grid.SetCols(done)                      # 计算中逐块显示
+
+光谱输入, 读取的 float 数组直接作为数据, 计算时不复制:
+
+    grid = SpectrumGrid(parent)
+    grid.SetSubject(data)                   # reader 的结果, 空单元格为 nan
+    spe = grid.GetSubject()
+"""
+from ast import literal_eval
+from typing import List, Tuple, Union
+
+import wx
+import wx.grid
+from cie import ColourResult
+from numpy import asarray, float64, full, isfinite, isnan, nan, ndarray, zeros
+from reader import rows2float
+
+ATTR_CACHE_SIZE = 4096  # 缓存的 sRGB 单元格属性数, 超过时清空
+
+
+def rgb_hex(v: float) -> str:
+    """`CIE.rgb_pack` 的整数转 16进制颜色码, 同 `CIE.rgb16`"""
+    return f'#{int(v):06x}'
+
+
+class HueTable(wx.grid.GridTableBase):
+    """
+    计算结果的表格模型.
+
+    行: 表头 `header` 的各行, 然后是 `result` 的各行;
+    列: 第0列为表头/项目名, 之后每个光谱一列, 只显示前 `cols` 列.
+    """
+
+    def __init__(self, fmt: str = '{:.3f}'):
+        super(HueTable, self).__init__()
+        self.fmt = fmt
+        self.header: ndarray = zeros((0, 1), str)
+        self.result = ColourResult(zeros((0, 0)), ())
+        self.titles: List[str] = []
+        self.values: ndarray = self.result.values
+        self.cols = 0
+        self._rgb_row = -1  # sRGB 在 values 中的行号
+        self._attrs = {}
+
+    def SetResult(self, header: ndarray, result: ColourResult, cols: int = None):
+        self.header = header
+        self.result = result
+        self.titles = list(result.names)
+        self.values = result.values
+        self.cols = result.size if cols is None else cols
+        self._rgb_row = self.titles.index(result.RGB) if result.RGB in self.titles else -1
+
+    def GetNumberRows(self) -> int:
+        return len(self.header) + len(self.titles)
+
+    def GetNumberCols(self) -> int:
+        return 1 + self.cols
+
+    def IsEmptyCell(self, row: int, col: int) -> bool:
+        return False
+
+    def GetValue(self, row: int, col: int) -> str:
+        nh = len(self.header)
+        if row < nh:
+            return str(self.header[row, col])
+        row -= nh
+        if col == 0:
+            return self.titles[row]
+        v = self.values[row, col - 1]
+        if row == self._rgb_row:
+            return rgb_hex(v) if isfinite(v) else ''
+        return self.fmt.format(v)
+
+    def SetValue(self, row: int, col: int, value: str):
+        pass  # 只读
+
+    def GetAttr(self, row: int, col: int, kind) -> wx.grid.GridCellAttr:
+        # 只有 sRGB 行有颜色, 其余单元格用默认属性, 不需要逐个重置
+        row -= len(self.header)
+        if row != self._rgb_row or col == 0 or row < 0:
+            return None
+        v = self.values[row, col - 1]
+        if not isfinite(v):
+            return None
+        v = int(v)
+        attr = self._attrs.get(v)
+        if attr is None:
+            if len(self._attrs) >= ATTR_CACHE_SIZE:
+                self._attrs.clear()
+            r, g, b = v >> 16, (v >> 8) & 255, v & 255
+            attr = wx.grid.GridCellAttr()
+            attr.SetBackgroundColour(wx.Colour(r, g, b))
+            gray = 0.299 * r + 0.578 * g + 0.114 * b
+            attr.SetTextColour(wx.WHITE if gray < 0.78 else wx.BLACK)
+            self._attrs[v] = attr
+        attr.IncRef()  # 表格会释放返回的属性
+        return attr
+
+    def export_labels(self) -> Tuple[List[str], ndarray]:
+        """
+        按光谱导出时的标签列, 见 `writer.write_result`.
+
+        Returns
+        -------
+        label_names : List[str]
+            name name2 ..., 对应表头的各行; 没有表头时为 name.
+        labels : ndarray of str
+            (cols, len(label_names)), 表头各行(第0列除外)的转置; 没有表头时为 Data1 Data2 ...
+        """
+        nh = len(self.header)
+        if nh == 0:
+            return ['name'], asarray([f'Data{i}' for i in range(1, self.cols + 1)])[:, None]
+        label_names = ['name'] + [f'name{i}' for i in range(2, nh + 1)]
+        return label_names, asarray(self.header[:, 1:1 + self.cols], str).T
+
+
+class _VirtualGrid(wx.grid.Grid):
+    table: wx.grid.GridTableBase
+
+    def SetFont(self, font: wx.Font) -> bool:
+        self.SetDefaultCellFont(font)
+        return super(_VirtualGrid, self).SetFont(font)
+
+    def _notify(self, nr: int, nc: int):
+        # 通知控件行列数的变化, 不重建表格
+        table = self.table
+        self.BeginBatch()
+        for old, new, delete, append in (
+                (nr, table.GetNumberRows(), wx.grid.GRIDTABLE_NOTIFY_ROWS_DELETED,
+                 wx.grid.GRIDTABLE_NOTIFY_ROWS_APPENDED),
+                (nc, table.GetNumberCols(), wx.grid.GRIDTABLE_NOTIFY_COLS_DELETED,
+                 wx.grid.GRIDTABLE_NOTIFY_COLS_APPENDED)):
+            if new < old:
+                self.ProcessTableMessage(wx.grid.GridTableMessage(table, delete, new, old - new))
+            elif new > old:
+                self.ProcessTableMessage(wx.grid.GridTableMessage(table, append, new - old))
+        self.ProcessTableMessage(
+            wx.grid.GridTableMessage(table, wx.grid.GRIDTABLE_REQUEST_VIEW_GET_VALUES))
+        self.EndBatch()
+        self.ForceRefresh()
+
+
+class HueGrid(_VirtualGrid):
+    """`HueTable` 的表格控件, 参数 read_only 仅为与 _widgets.json 的写法兼容"""
+
+    def __init__(self, parent, read_only: bool = True, **kwargs):
+        super(HueGrid, self).__init__(parent, **kwargs)
+        self.table = HueTable()
+        self.SetTable(self.table, True)
+        self.EnableEditing(False)
+        self.DisableDragRowSize()
+
+    def SetShowFormat(self, fmt: str):
+        self.table.fmt = fmt
+
+    def SetResult(self, header: ndarray, result: ColourResult, cols: int = None):
+        """设置结果; cols 为显示的光谱数, None 为全部"""
+        nr, nc = self.table.GetNumberRows(), self.table.GetNumberCols()
+        self.table.SetResult(header, result, cols)
+        self._notify(nr, nc)
+        self._default_col_size()
+
+    def SetCols(self, cols: int):
+        """显示前 cols 个光谱"""
+        nr, nc = self.table.GetNumberRows(), self.table.GetNumberCols()
+        self.table.cols = cols
+        self._notify(nr, nc)
+
+    def _default_col_size(self):
+        # 按格式化后的最长文字设置列宽, 不逐列测量(AutoSizeColumns 会读取所有单元格)
+        table = self.table
+        samples = [table.fmt.format(-1234.5678), '#ffffff']
+        samples += [str(i) for i in table.header[:, 1:2].ravel()]
+        dc = wx.ClientDC(self.GetGridWindow())
+        dc.SetFont(self.GetDefaultCellFont())
+        width = max(dc.GetTextExtent(i)[0] for i in samples)
+        self.SetDefaultColSize(width + 12, True)
+        self.AutoSizeColumn(0)
+
+
+class SpectrumTable(wx.grid.GridTableBase):
+    """
+    光谱输入的表格模型.
+
+    行: 表头 `header` 的各行(字符串), 然后是 `data` 的各行(float, 空单元格为 nan);
+    列: 第0列为波长, 之后每个光谱一列.
+    """
+
+    def __init__(self, rows: int, cols: int, fmt: str = '{:.10g}'):
+        super(SpectrumTable, self).__init__()
+        self.fmt = fmt
+        self.header: List[List[str]] = []
+        self.data: ndarray = full((rows, cols), nan)
+        self.labels: List[str] = []
+        self._header_attr: Union[wx.grid.GridCellAttr, None] = None
+
+    def SetHeader(self, header: List[List[str]]):
+        m = self.data.shape[1]
+        header = [['' if v is None else str(v) for v in row] for row in header]
+        m = max([m] + [len(row) for row in header])
+        self.header = [row + [''] * (m - len(row)) for row in header]
+        self.Resize(self.data.shape[0], m)
+
+    def SetSubject(self, data: ndarray):
+        self.data = data
+        self.Resize(*data.shape)
+
+    def Resize(self, rows: int, cols: int):
+        """行列数不小于 (rows, cols), 新单元格为空"""
+        n, m = self.data.shape
+        if rows > n or cols > m:
+            data = full((max(rows, n), max(cols, m)), nan, self.data.dtype)
+            data[:n, :m] = self.data
+            self.data = data
+        m = self.data.shape[1]
+        self.header = [row + [''] * (m - len(row)) for row in self.header]
+
+    def GetNumberRows(self) -> int:
+        return len(self.header) + self.data.shape[0]
+
+    def GetNumberCols(self) -> int:
+        return self.data.shape[1]
+
+    def GetColLabelValue(self, col: int) -> str:
+        return self.labels[col] if col < len(self.labels) else str(col + 1)
+
+    def GetRowLabelValue(self, row: int) -> str:
+        nh = len(self.header)
+        return '' if row < nh else str(row - nh + 1)
+
+    def IsEmptyCell(self, row: int, col: int) -> bool:
+        nh = len(self.header)
+        if row < nh:
+            return not self.header[row][col]
+        return bool(isnan(self.data[row - nh, col]))
+
+    def GetValue(self, row: int, col: int) -> str:
+        nh = len(self.header)
+        if row < nh:
+            return self.header[row][col]
+        v = self.data[row - nh, col]
+        return '' if isnan(v) else self.fmt.format(v)
+
+    def SetValue(self, row: int, col: int, value: str):
+        nh = len(self.header)
+        if row < nh:
+            self.header[row][col] = value
+            return
+        value = value.strip()
+        try:
+            self.data[row - nh, col] = float(value) if value else nan
+        except ValueError:
+            wx.LogWarning(f'只能输入数字: {value}')
+
+    def GetAttr(self, row: int, col: int, kind) -> wx.grid.GridCellAttr:
+        # 表头行灰色背景
+        if row >= len(self.header):
+            return None
+        if self._header_attr is None:
+            self._header_attr = wx.grid.GridCellAttr()
+            self._header_attr.SetBackgroundColour(wx.Colour(235, 235, 235))
+        self._header_attr.IncRef()
+        return self._header_attr
+
+    def GetSubject(self) -> ndarray:
+        """去掉末尾的空行和空列, 返回数据的视图"""
+        data = self.data
+        n, m = data.shape
+        empty = isnan(data)
+        while n > 0 and empty[n - 1, :m].all():
+            n -= 1
+        while m > 0 and empty[:n, m - 1].all():
+            m -= 1
+        return data[:n, :m]
+
+
+class SpectrumGrid(_VirtualGrid):
+    """
+    `SpectrumTable` 的表格控件, 可编辑, 支持 Ctrl+C Ctrl+V 和 Delete.
+
+    Parameters
+    ----------
+    subject : str, default '(20, 3)'
+        初始的数据行列数, 同 _widgets.json 的写法.
+    """
+
+    def __init__(self, parent, subject: Union[str, tuple] = '(20, 3)', **kwargs):
+        super(SpectrumGrid, self).__init__(parent, **kwargs)
+        if isinstance(subject, str):
+            subject = literal_eval(subject)
+        self.table = SpectrumTable(*subject)
+        self.SetTable(self.table, True)
+        self.DisableDragRowSize()
+        self.Bind(wx.EVT_KEY_DOWN, self._on_key)
+
+    def SetHeader(self, header: List[List[str]]):
+        nr, nc = self.table.GetNumberRows(), self.table.GetNumberCols()
+        self.table.SetHeader(header)
+        self._notify(nr, nc)
+
+    def SetHeaderLabels(self, labels: List[str]):
+        self.table.labels = list(labels)
+        self.ForceRefresh()
+
+    def SetSubject(self, data: Union[ndarray, List[List[str]]]):
+        """data 为 float 数组时直接使用, 不复制; 字符串行按 `reader.rows2float` 转换"""
+        if isinstance(data, ndarray) and data.dtype.kind == 'f':
+            data = asarray(data, float64)
+        else:
+            data = rows2float(data)
+        nr, nc = self.table.GetNumberRows(), self.table.GetNumberCols()
+        self.table.SetSubject(data)
+        self._notify(nr, nc)
+
+    def GetHeader(self) -> ndarray:
+        """表头, 列数与 `GetSubject` 相同"""
+        m = self.table.GetSubject().shape[1]
+        return asarray([row[:m] for row in self.table.header], str).reshape(-1, m)
+
+    def GetSubject(self) -> ndarray:
+        """光谱数据的视图(不复制), 空单元格为 nan; 计算中不要修改"""
+        return self.table.GetSubject()
+
+    def _selection(self):
+        # 选择的区域 (r0, c0, r1, c1), 没有选择时为光标所在的单元格
+        tl, br = self.GetSelectionBlockTopLeft(), self.GetSelectionBlockBottomRight()
+        if tl:
+            return tl[0].GetRow(), tl[0].GetCol(), br[0].GetRow(), br[0].GetCol()
+        r, c = self.GetGridCursorRow(), self.GetGridCursorCol()
+        return r, c, r, c
+
+    def _on_key(self, event: wx.KeyEvent):
+        key = event.GetKeyCode()
+        if event.ControlDown() and key == ord('C'):
+            self._copy()
+        elif event.ControlDown() and key == ord('V'):
+            self._paste()
+        elif key in (wx.WXK_DELETE, wx.WXK_BACK) and self.IsEditable():
+            r0, c0, r1, c1 = self._selection()
+            for r in range(r0, r1 + 1):
+                for c in range(c0, c1 + 1):
+                    self.table.SetValue(r, c, '')
+            self.ForceRefresh()
+        else:
+            event.Skip()
+
+    def _copy(self):
+        r0, c0, r1, c1 = self._selection()
+        text = '\n'.join('\t'.join(self.table.GetValue(r, c) for c in range(c0, c1 + 1))
+                         for r in range(r0, r1 + 1))
+        if wx.TheClipboard.Open():
+            wx.TheClipboard.SetData(wx.TextDataObject(text))
+            wx.TheClipboard.Close()
+
+    def _paste(self):
+        if not self.IsEditable():
+            return
+        obj = wx.TextDataObject()
+        if not wx.TheClipboard.Open():
+            return
+        ok = wx.TheClipboard.GetData(obj)
+        wx.TheClipboard.Close()
+        if not ok:
+            return
+        rows = [line.split('\t') for line in obj.GetText().splitlines()]
+        if not rows:
+            return
+        r0, c0 = self.GetGridCursorRow(), self.GetGridCursorCol()
+        nr, nc = self.table.GetNumberRows(), self.table.GetNumberCols()
+        nh = len(self.table.header)
+        self.table.Resize(r0 + len(rows) - nh, c0 + max(len(row) for row in rows))
+        for i, row in enumerate(rows):
+            for j, v in enumerate(row):
+                self.table.SetValue(r0 + i, c0 + j, v)
+        self._notify(nr, nc)
@@ -1,15 +1,44 @@
 ﻿# -*- coding: utf-8 -*-
-from typing import List
+from functools import lru_cache
+from typing import List, Tuple
 
 import wx
 from _base import line_v, WIDGETS_TOTAL
-from cie import CIEHueTransform
-from numpy import array, concatenate, float64, ndarray
+from cie import CIEHueTransform, ColourResult
+from convert import converter
+from gridtable import HueGrid
+from numpy import array, concatenate, float64, isnan, ndarray, vstack
+from reader import rows2float
+
+# yanse_values() 的行名称, 与输出文本框的顺序相同
+YANSE_TITLE = ('X', 'Y', 'Z', 'x', 'y', 'u\'', 'v\'', 'CIELAB-L*', 'CIELAB-a*',
+               'CIELAB-b*', 'CIELAB-C*', 'CIELAB-h', 'Hunter L', 'Hunter a', 'Hunter b',
+               'Hunter C', 'Hunter h', 'CIELUV-L*', 'CIELUV-u*', 'CIELUV-v*', 'CIELUV-C*',
+               'CIELUV-h', 'CIELUV-s', 'R', 'G', 'B', 'sRGB')
+# 输入类型 -> convert.SPACES 中的空间
+INPUT_SPACE = {'CIE XYZ': 'xyz', 'CIE Yxy': 'yxy', 'CIELAB': 'lab', 'Hunter Lab': 'lab_h',
+               'sRGB': 'rgb', 'CIE Yu\'v\'': 'yuv', 'CIELUV': 'luv'}
+LIVE_DELAY = 300  # 实时转换的防抖间隔(毫秒)
 
 
 class CIEHueTransform(CIEHueTransform):
 
-    def yanse(self, xyz: ndarray):
+    def to_xyz(self, intype: str, s: ndarray) -> ndarray:
+        """`INPUT_SPACE` 中的输入类型转 XYZ, sRGB 的范围为 0-255; 见 `convert.converter`"""
+        if intype == 'sRGB':
+            s = s / 255
+        func = converter(INPUT_SPACE[intype], 'xyz', self.info['SI'], self.info['VA'],
+                         self.dtype.name)
+        return func(s)
+
+    def yanse_values(self, xyz: ndarray) -> ndarray:
+        """
+        XYZ 转全部输出, 行为 `YANSE_TITLE`, 列为各输入;
+        sRGB 行为 0xRRGGBB 整数, 见 `rgb_pack`
+        """
+        xyz = self._asarray(xyz)
+        if xyz.ndim == 1:
+            xyz = xyz[:, None]
         lab = self.xyz2lab(xyz)
         hlab = self.xyz2lab_h(xyz)
         xy_ = self.xyz2yxy(xyz)[1:]
@@ -19,20 +48,23 @@ class CIEHueTransform(CIEHueTransform):
         chh = self.chs(hlab)[:2]
         chs2 = self.chs(luv)
         srgb = self.xyz2rgb(xyz)
-        rgb16 = self.rgb16(srgb, 1)
-        srgb = srgb * 255
-        return concatenate([
-            xyz.round(3),
-            xy_.round(3),
-            uv_.round(3),
-            lab.round(3),
-            ch1.round(3),
-            hlab.round(3),
-            chh.round(3),
-            luv.round(3),
-            chs2.round(3),
-            srgb.round(3), rgb16
-        ])
+        return vstack([xyz, xy_, uv_, lab, ch1, hlab, chh, luv, chs2, srgb * 255,
+                       self.rgb_pack(srgb, 1)])
+
+    def yanse_result(self, xyz: ndarray) -> ColourResult:
+        """`yanse_values` 按名称取行, 16进制颜色码为其 hex"""
+        return ColourResult(self.yanse_values(xyz), YANSE_TITLE)
+
+    def yanse(self, xyz: ndarray):
+        """第一个输入的输出文本, 数值保留 3 位小数"""
+        res = self.yanse_result(xyz)
+        return concatenate([res.values[:-1, 0].round(3), res.hex[:1]])
+
+
+@lru_cache(maxsize=None)
+def get_transform(si: str, va: int) -> CIEHueTransform:
+    """每个 (光源, 视场角) 只建立一次"""
+    return CIEHueTransform(si, va)
 
 
 WIDGETS_LABEL = WIDGETS_TOTAL['huetrans']
@@ -51,6 +83,7 @@ class HueTrans(wx.Panel):
         self.Show()
 
     def _init_ui(self):
+        self._live = None  # 实时转换的 wx.CallLater
         self.box_out = wx.StaticBox(self, label=WIDGETS_LABEL['box_out'])
         self.box_in = wx.StaticBox(self, label=WIDGETS_LABEL['box_in'])
         # 输入
@@ -83,6 +116,7 @@ class HueTrans(wx.Panel):
 
         self.btn_l6 = wx.Button(self, label=WIDGETS_LABEL['button'])
         self.btn_l6.SetMinSize((-1, 65))
+        self.cb_live = wx.CheckBox(self, label=WIDGETS_LABEL['live'])
         self.lab_input = [lab_l30, lab_l40, lab_l50]
         self.le_input = [le_l31, le_l41, le_l51]
 
@@ -100,6 +134,13 @@ class HueTrans(wx.Panel):
             self.labs.extend(labs1)
             self.le_output.extend(les1)
             self.layoutr.Add(layout1, 1, wx.ALL | wx.EXPAND, 3)
+        # 批量
+        self.box_bulk = wx.StaticBox(self, label=WIDGETS_LABEL['box_bulk'])
+        self.le_bulk = wx.TextCtrl(self, style=wx.TE_MULTILINE | wx.HSCROLL)
+        self.le_bulk.SetMinSize((240, -1))
+        self.btn_bulk = wx.Button(self, label=WIDGETS_LABEL['button_bulk'])
+        self.grid_bulk = HueGrid(self)
+        self.grid_bulk.HideColLabels()
 
     def _init_ui_r1(self, title: str, lab_list: List[str]):
         labs = [wx.StaticText(self, label=title)]
@@ -121,7 +162,14 @@ class HueTrans(wx.Panel):
 
     def _set_bind(self):
         self.btn_l6.Bind(wx.EVT_BUTTON, self._on_btn)
+        self.btn_bulk.Bind(wx.EVT_BUTTON, self._on_btn_bulk)
         self.cb_l_intype.Bind(wx.EVT_CHOICE, self._on_cb)
+        # 实时转换: 输入和选项改变后防抖转换
+        for le in self.le_input:
+            le.Bind(wx.EVT_TEXT, self._on_live)
+        self.cb_si.Bind(wx.EVT_CHOICE, self._on_live)
+        self.cb_vi.Bind(wx.EVT_CHOICE, self._on_live)
+        self.cb_live.Bind(wx.EVT_CHECKBOX, self._on_live)
 
     def _set_font(self):
         FONT0 = wx.Font(14, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_NORMAL,
@@ -139,6 +187,11 @@ class HueTrans(wx.Panel):
         # self.lab_r0.SetFont(FONT1)
         self.box_out.SetFont(FONT1)
         self.btn_l6.SetFont(FONT1)
+        self.cb_live.SetFont(FONT0)
+        self.box_bulk.SetFont(FONT1)
+        self.le_bulk.SetFont(FONT0)
+        self.btn_bulk.SetFont(FONT0)
+        self.grid_bulk.SetFont(FONT0)
         self.lab_l00.SetFont(FONT0)
         self.lab_l01.SetFont(FONT0)
         self.cb_si.SetFont(FONT0)
@@ -154,7 +207,13 @@ class HueTrans(wx.Panel):
         self.layout0.Add(line_v(self), 0, wx.ALL | wx.EXPAND, 10)
         self.layout0.Add(self.layoutr, 1, wx.ALL | wx.EXPAND, 3)
         self.layout.Add(self.layout0, 0, wx.ALL | wx.EXPAND, 0)
-        self.layout.Add(wx.StaticText(self), 1, wx.ALL | wx.EXPAND, 0)
+        layout_bulk = wx.StaticBoxSizer(self.box_bulk, wx.HORIZONTAL)
+        layout1 = wx.BoxSizer(wx.VERTICAL)
+        layout1.Add(self.le_bulk, 1, wx.ALL | wx.EXPAND, 3)
+        layout1.Add(self.btn_bulk, 0, wx.ALL | wx.EXPAND, 3)
+        layout_bulk.Add(layout1, 0, wx.ALL | wx.EXPAND, 3)
+        layout_bulk.Add(self.grid_bulk, 1, wx.ALL | wx.EXPAND, 3)
+        self.layout.Add(layout_bulk, 1, wx.ALL | wx.EXPAND, 3)
         self.SetSizer(self.layout)
 
     def _layout_l(self):
@@ -178,6 +237,7 @@ class HueTrans(wx.Panel):
         layout.Add(layout1, 0, wx.EXPAND, 3)
         layout.Add(layout2, 0, wx.EXPAND, 3)
         layout.Add(self.btn_l6, 0, wx.EXPAND, 3)
+        layout.Add(self.cb_live, 0, wx.ALL, 3)
         return layout
 
     def _on_cb(self, event):
@@ -187,33 +247,66 @@ class HueTrans(wx.Panel):
         # print(selection)
         for s, lab in zip(ss, self.lab_input):
             lab.SetLabel(s)
+        self._on_live(event)
 
-    def _on_btn(self, event):
+    def _transform(self) -> CIEHueTransform:
         si = self.cb_si.GetStringSelection()
         vi = self.cb_vi.GetSelection() * 8 + 2
-        selection = self.cb_l_intype.GetStringSelection()
-        ciet = CIEHueTransform(si, vi)
+        return get_transform(si, vi)
+
+    def _convert(self):
+        ciet = self._transform()
         s = array([le.GetValue() for le in self.le_input], float64)
-        if selection == 'CIE XYZ':
-            pass
-        elif selection == 'CIE Yxy':
-            s = ciet.yxy2xyz(s)
-        elif selection == 'CIELAB':
-            s = ciet.lab2xyz(s)
-        elif selection == 'Hunter Lab':
-            s = ciet.lab_h2xyz(s)
-        elif selection == 'sRGB':
-            s = ciet.rgb2xyz(s / 255)
-        elif selection == 'CIE Yu\'v\'':
-            s = ciet.yuv2xyz(s)
-        else:  # if selection == 'CIELUV':
-            s = ciet.luv2xyz(s)
-
-        dat = ciet.yanse(s)
+        dat = ciet.yanse(ciet.to_xyz(self.cb_l_intype.GetStringSelection(), s))
         # print(dat)
         for d, v in zip(dat, self.le_output):
             v.SetValue(d)
 
+    def _on_btn(self, event):
+        try:
+            self._convert()
+        except Exception as e:
+            self._err(e)
+
+    def _on_live(self, event):
+        event.Skip()
+        if not self.cb_live.GetValue():
+            return
+        if self._live is None:
+            self._live = wx.CallLater(LIVE_DELAY, self._convert_live)
+        else:
+            self._live.Restart(LIVE_DELAY)
+
+    def _convert_live(self):
+        # 输入不完整(如正在输入负号)时不转换, 也不提示
+        try:
+            self._convert()
+        except ValueError:
+            pass
+
+    def _on_btn_bulk(self, event):
+        # 每行一组输入, 一次向量化转换
+        try:
+            text = self.le_bulk.GetValue()
+            rows = [line.replace(',', ' ').replace(';', ' ').split()
+                    for line in text.splitlines() if line.strip()]
+            s = rows2float(rows)
+            if s.ndim != 2 or s.shape[1] != 3 or isnan(s).any():
+                raise ValueError(WIDGETS_LABEL['bulk_error'])
+            ciet = self._transform()
+            intype = self.cb_l_intype.GetStringSelection()
+            res = ciet.yanse_result(ciet.to_xyz(intype, s.T))
+        except Exception as e:
+            self._err(e)
+            return
+        names = self.cb_l_intype_choices_value[self.cb_l_intype.GetSelection()]
+        header = array([[name] + [f'{v:g}' for v in col] for name, col in zip(names, s.T)])
+        self.grid_bulk.SetShowFormat('{:.3f}')
+        self.grid_bulk.SetResult(header, res)
+
+    def _err(self, text):
+        wx.MessageBox(str(text), '警告', wx.OK | wx.ICON_ERROR)
+
 
 if __name__ == '__main__':
     app = wx.App()
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+分阶段计时和计数, 默认关闭
+
+    with instrument.collect() as records:
+        CIE(spec).colour()
+    print(instrument.summary(records))
+
+    instrument.add_callback(instrument.JsonLinesSink('stages.jsonl'))
+
+每条记录为 dict: stage 阶段名, seconds 耗时, items 项数, bytes 产生的数组字节数,
+depth 外层阶段数; depth > 0 的耗时已含在外层阶段中(如 xyz2luv 中的 xyz2yuv).
+`add_callback` 的回调收到所有线程的记录, `collect` 只收集当前线程(协程)的记录.
+没有回调和 collect 时 `stage` 返回空的上下文, `timed` 直接调用原函数.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Union
+
+_CALLBACKS: List[Callable[[dict], None]] = []
+_LOCK = threading.Lock()
+_COLLECTING = 0  # 进行中的 collect 数
+ACTIVE = False  # 有回调或 collect 时为 True
+_SINKS: ContextVar[tuple] = ContextVar('instrument_sinks', default=())  # 当前上下文的 collect
+_DEPTH: ContextVar[int] = ContextVar('instrument_depth', default=0)  # 当前上下文的阶段层数
+
+
+class _Null:
+    __slots__ = ()
+    items = 0
+    nbytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL = _Null()
+
+
+class _Stage:
+    __slots__ = ['name', 'items', 'nbytes', '_t0', '_depth']
+
+    def __init__(self, name: str, items: int, nbytes: int):
+        self.name = name
+        self.items = items
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self._depth = _DEPTH.get()
+        _DEPTH.set(self._depth + 1)
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._t0
+        # 不用 token 还原: 块内有 yield 时退出可能在另一个上下文
+        _DEPTH.set(self._depth)
+        emit({'stage': self.name, 'seconds': seconds, 'items': int(self.items),
+              'bytes': int(self.nbytes), 'depth': self._depth})
+        return False
+
+
+def _recording() -> bool:
+    # 其他线程在 collect 时, 本线程仍不计时
+    return ACTIVE and bool(_CALLBACKS or _SINKS.get())
+
+
+def stage(name: str, items: int = 0, nbytes: int = 0):
+    """
+    计时一个阶段, 可在块内设置 ``st.items`` ``st.nbytes``.
+
+    >>> with stage('interp1d.fit', items=m) as st:
+    ...     st.nbytes = coe.nbytes
+    """
+    if not _recording():
+        return _NULL
+    return _Stage(name, items, nbytes)
+
+
+def timed(name: str):
+    """
+    函数装饰器: 计时.
+
+    items 为返回数组最后一维的长度(列表为行数), bytes 为数组字节数;
+    返回 tuple 时取第一个元素.
+    """
+
+    def deco(func):
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _recording():
+                return func(*args, **kwargs)
+            with _Stage(name, 0, 0) as st:
+                res = func(*args, **kwargs)
+                out = res[0] if isinstance(res, tuple) else res
+                shape = getattr(out, 'shape', None)
+                if shape is None:
+                    st.items = len(out) if isinstance(out, list) else 1
+                else:
+                    st.items = shape[-1] if len(shape) > 1 else 1
+                    st.nbytes = out.nbytes
+            return res
+
+        return wrapper
+
+    return deco
+
+
+def emit(record: dict):
+    for cb in list(_CALLBACKS):
+        cb(record)
+    for sink in _SINKS.get():
+        sink(record)
+
+
+def add_callback(cb: Callable[[dict], None]):
+    """所有线程的记录都交给 cb"""
+    global ACTIVE
+    with _LOCK:
+        _CALLBACKS.append(cb)
+        ACTIVE = True
+
+
+def remove_callback(cb: Callable[[dict], None]):
+    global ACTIVE
+    with _LOCK:
+        if cb in _CALLBACKS:
+            _CALLBACKS.remove(cb)
+        ACTIVE = bool(_CALLBACKS) or _COLLECTING > 0
+
+
+@contextmanager
+def collect(records: Union[List[dict], None] = None) -> Iterator[List[dict]]:
+    """
+    收集块内当前线程(协程)的记录, 其他线程和新建的线程不收集.
+
+    records 为 None 时新建列表; 传入同一列表可在多个线程中分别收集同一任务的记录.
+    嵌套时外层也收到内层的记录.
+    """
+    global ACTIVE, _COLLECTING
+    if records is None:
+        records = []
+    sinks = _SINKS.get()
+    _SINKS.set(sinks + (records.append,))
+    with _LOCK:
+        _COLLECTING += 1
+        ACTIVE = True
+    try:
+        yield records
+    finally:
+        _SINKS.set(sinks)
+        with _LOCK:
+            _COLLECTING -= 1
+            ACTIVE = bool(_CALLBACKS) or _COLLECTING > 0
+
+
+class JsonLinesSink:
+    """把记录逐行写入 json lines 文件, 用作回调"""
+
+    def __init__(self, path: str):
+        self._fp = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def __call__(self, record: dict):
+        line = json.dumps({'time': time.time(), **record}, ensure_ascii=False)
+        with self._lock:
+            self._fp.write(line + '\n')
+            self._fp.flush()
+
+    def close(self):
+        self._fp.close()
+
+
+def summary(records: List[dict]) -> Dict[str, Dict[str, float]]:
+    """
+    按阶段汇总: calls seconds items bytes depth, 按首次出现的顺序.
+
+    depth 为该阶段记录中最小的 depth.
+    """
+    res: Dict[str, Dict[str, float]] = {}
+    for r in records:
+        s = res.setdefault(r['stage'], {'calls': 0, 'seconds': 0., 'items': 0, 'bytes': 0,
+                                        'depth': r.get('depth', 0)})
+        s['depth'] = min(s['depth'], r.get('depth', 0))
+        s['calls'] += 1
+        s['seconds'] += r['seconds']
+        s['items'] += r['items']
+        s['bytes'] += r['bytes']
+    return res
+
+
+def total_seconds(records: List[dict]) -> float:
+    """总耗时, 只加 depth 为 0 的记录, 嵌套的阶段不重复计算"""
+    return sum(r['seconds'] for r in records if not r.get('depth', 0))
+
+
+def format_summary(records: List[dict]) -> str:
+    """各阶段一行, 嵌套的阶段缩进; 最后一行为 `total_seconds`"""
+    lines = []
+    for name, s in summary(records).items():
+        name = '  ' * s['depth'] + name
+        lines.append(f'{name:<28}{s["seconds"] * 1000:10.2f} ms  x{s["calls"]:<4}'
+                     f'items {s["items"]:<8}{s["bytes"] / 1024:10.1f} KiB')
+    if lines:
+        lines.append(f'{"total":<28}{total_seconds(records) * 1000:10.2f} ms')
+    return '\n'.join(lines)
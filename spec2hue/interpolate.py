@@ -1,7 +1,12 @@
 ﻿# -*- coding: utf-8 -*-
 
-from numpy import argsort, asarray, c_, diff, insert, ndarray, zeros
+from functools import lru_cache
+
+from numpy import (abs, allclose, arange, argsort, asarray, clip, diff, empty,
+                   errstate, float64, floor, insert, intp, ndarray, searchsorted,
+                   sign, stack, tensordot, where, zeros)
 from numpy.linalg import inv
+import instrument
 try:
     from . import interp1d_coe
     INTERP1D_COE = True
@@ -16,12 +21,30 @@ def ndim_check(x: ndarray) -> ndarray:
     return x
 
 
+def uniform_step(x: ndarray) -> float:
+    """升序的 x 为等间距时返回步长, 否则返回 None"""
+    if x.size < 2:
+        return None
+    dx = diff(x)
+    h = (x[-1] - x[0]) / (x.size - 1)
+    return float(h) if allclose(dx, h, rtol=1e-9, atol=0) else None
+
+
 class interp1d:
+    """
+    全局样条插值.
+
+    每个区间的多项式以局部坐标 (x - x[i]) 保存系数 ``self.coe``, 形状
+    (kind+1, x.size-1, m), 高次在前, 求值用 Horner 法; 所有列共用同一个系数矩阵,
+    一次求解. 求解用 float64, 系数和结果为 dtype.
+    """
     kind_str = ('linear', 'quadratic', 'cubic')
     boundary_str = ('natural', 'not-a-knot', 'periodic')
 
-    def __init__(self, x: ndarray, y: ndarray, axis=0, kind=3, boundary='not-a-knot'):
-        self.input_check(x, y, axis, kind, boundary.lower())
+    def __init__(self, x: ndarray, y: ndarray, axis=0, kind=3, boundary='not-a-knot',
+                 dtype=float64):
+        with instrument.stage('interp1d.check'):
+            self.input_check(x, y, axis, kind, boundary.lower())
 
         if self.kind == 1:
             fun = self.mcoe_cal1
@@ -29,10 +52,14 @@ class interp1d:
             fun = self.mcoe_cal3
         elif self.kind == 2:
             fun = self.mcoe_cal2
-        if self.y.ndim == 1:
-            self.mcoe = fun(self.y)
-        else:
-            self.mcoe = [fun(ii) for ii in self.y]
+        with instrument.stage('interp1d.fit') as st:
+            # self.y 为 (m, n) 或 (n,), 按列计算
+            if self.y.ndim == 1:
+                self.coe = fun(self.y[:, None])
+            else:
+                self.coe = fun(self.y.T)
+            self.coe = self.coe.astype(dtype, copy=False)
+            st.items, st.nbytes = self.coe.shape[-1], self.coe.nbytes
 
     def input_check(self, x, y, axis, kind, boundary):
         x, y = asarray(x), asarray(y)
@@ -42,6 +69,7 @@ class interp1d:
         x = ndim_check(x)
         x_sort_index = argsort(x)
         self.x = x[x_sort_index]
+        self.step = uniform_step(self.x)
 
         # y 一维向量 | 二维行向量的堆叠
         if y.ndim != 1:
@@ -81,107 +109,342 @@ class interp1d:
         else:
             raise ValueError('boundary must in ("natural", "periodic", "not-a-knot")')
 
-    def xin_index(self, x_in: ndarray):
-        xin_ind, start = [], 0
-        for i1 in x_in:
-            if i1 >= self.x[-1]:
-                xin_ind.append(self.x.size - 2)
-                continue
-            for i2 in range(start, self.x.size - 1):
-                if i1 < self.x[i2 + 1]:
-                    xin_ind.append(i2)
-                    start = i2
-                    break
-        return xin_ind
-
     def __call__(self, x_in: ndarray) -> ndarray:
-        x_in = asarray(x_in).flatten()
+        with instrument.stage('interp1d.call') as st:
+            res = self._call(x_in)
+            st.items, st.nbytes = res.size, res.nbytes
+        return res
+
+    def _call(self, x_in: ndarray) -> ndarray:
+        x_in = asarray(x_in, float).flatten()
         x_in.sort()
-        x_in_ind = self.xin_index(x_in)
-        # c_[tuple([x_in**ii for ii in range(self.kind + 1)])]
-        X = x_in[:, None]**range(self.kind + 1)
+        res = ppoly_eval(self.x, self.coe, x_in, self.step)
+        return res[:, 0] if self.y.ndim == 1 else res
 
-        if self.y.ndim == 1:
-            res = [self.mcoe[val] @ X[ii] for ii, val in enumerate(x_in_ind)]
-            return asarray(res)
-        else:
-            res = [[coe[val] @ X[ii] for ii, val in enumerate(x_in_ind)]
-                   for coe in self.mcoe]
-            return c_[tuple(res)]
+    def _system_inv(self, kind: int, dx: ndarray) -> ndarray:
+        # 等间距时方程组只与 (点数, 步长, 边界) 有关, 缓存其逆
+        if self.step is not None:
+            return _uniform_inv(kind, self.boundary, self.x.size, self.step)
+        return inv(_system(kind, self.boundary, dx))
 
     def mcoe_cal1(self, y) -> ndarray:
-        dx, dy = diff(self.x), diff(y)
-        k = dy / dx
-        a, xx = y[:-1], self.x[:-1]
-        return c_[a - k * xx, k]
+        dx, dy = diff(self.x)[:, None], diff(y, axis=0)
+        return stack([dy / dx, y[:-1]])
 
     def mcoe_cal2(self, y) -> ndarray:
-        dx, dy = diff(self.x), diff(y)
-        # k = dy/dx
-        a, xx = y[:-1], self.x[:-1]
+        dx, dy = diff(self.x), diff(y, axis=0)
+        a = y[:-1]
+        dx = dx[:, None]
         # yy = 2 * dy / dx
-        yy = insert(2 * dy / dx, 0, 0)
+        yy = insert(2 * dy / dx, 0, 0, axis=0)
+
+        b_ = self._system_inv(2, dx[:, 0]) @ yy
+        b = b_[:-1]
+        c = diff(b_, axis=0) / dx / 2
+        return stack([c, b, a])
+
+    def mcoe_cal3(self, y) -> ndarray:
+        dx, dy = diff(self.x), diff(y, axis=0)
+        k = dy / dx[:, None]
+        a = y[:-1]
+
+        yy = diff(k, axis=0) * 3
+        yy = insert(yy, [0, yy.shape[0]], 0, axis=0)
+        if self.boundary == 2:
+            yy[-1] = dy[-1] - dy[0]
+
+        dx = dx[:, None]
+        c0 = self._system_inv(3, dx[:, 0]) @ yy
+        c = c0[:-1]
+        d = diff(c0, axis=0) / dx / 3
+        b = k - dx * c * 2 / 3 - dx * c0[1:] / 3
+        return stack([d, c, b, a])
 
+
+def _system(kind: int, boundary: int, dx: ndarray) -> ndarray:
+    """样条方程组的系数矩阵, 只与 x 的间距和边界有关"""
+    n = dx.size + 1
+    if kind == 2:
         if INTERP1D_COE:
-            mcoe = interp1d_coe.mcoe2(self.x.size)
+            mcoe = interp1d_coe.mcoe2(n)
         else:
-            mcoe = zeros([self.x.size, self.x.size])
-            for ii in range(1, self.x.size):
+            mcoe = zeros([n, n])
+            for ii in range(1, n):
                 mcoe[ii, ii - 1] = 1
                 mcoe[ii, ii] = 1
 
-        if self.boundary == 0:
+        if boundary == 0:
             mcoe[0, 0] = 1
-        elif self.boundary == 1:
+        elif boundary == 1:
             mcoe[0, 0] = dx[1]
             mcoe[0, 1] = -(dx[0] + dx[1])
             mcoe[0, 2] = dx[0]
-        elif self.boundary == 2:
+        elif boundary == 2:
             mcoe[0, 0] = 1
             mcoe[0, -1] = -1
+        return mcoe
 
-        b_ = inv(mcoe) @ yy
-        b = b_[:-1]
-        c = diff(b_) / dx / 2
-        return c_[a - b * xx + c * xx**2, b - c * xx * 2, c]
+    if INTERP1D_COE:
+        mcoe = interp1d_coe.mcoe3(n, asarray(dx, float))
+    else:
+        mcoe = zeros([n, n])
+        for ii in range(1, n - 1):
+            mcoe[ii, ii - 1] = dx[ii - 1]
+            mcoe[ii, ii] = 2 * (dx[ii] + dx[ii - 1])
+            mcoe[ii, ii + 1] = dx[ii]
 
-    def mcoe_cal3(self, y) -> ndarray:
-        dx, dy = diff(self.x), diff(y)
-        k = dy / dx
-        a, xx = y[:-1], self.x[:-1]
+    if boundary == 0:
+        mcoe[0, 0], mcoe[-1, -1] = 1, 1
+    elif boundary == 1:
+        mcoe[0, 0] = -dx[1]
+        mcoe[0, 1] = dx[0] + dx[1]
+        mcoe[0, 2] = -dx[0]
+        mcoe[-1, -1] = -dx[-2]
+        mcoe[-1, -2] = dx[-1] + dx[-2]
+        mcoe[-1, -3] = -dx[-1]
+    elif boundary == 2:
+        mcoe[0, 0] = 1
+        mcoe[0, -1] = -1
+        mcoe[-1, -1] = dx[-1] / 6
+        mcoe[-1, -2] = dx[-1] / 3
+        mcoe[-1, 1] = -dx[0] / 6
+        mcoe[-1, 0] = -dx[0] / 3
+    return mcoe
 
-        yy = diff(k) * 3
-        yy = insert(yy, [0, yy.size], 0)
-        if INTERP1D_COE:
-            mcoe = interp1d_coe.mcoe3(self.x.size, asarray(dx, float))
+
+@lru_cache(maxsize=32)
+def _uniform_inv(kind: int, boundary: int, n: int, step: float) -> ndarray:
+    mcoe_inv = inv(_system(kind, boundary, zeros(n - 1) + step))
+    mcoe_inv.flags.writeable = False
+    return mcoe_inv
+
+
+# Sprague 插值 (CIE 167:2005), 区间 [x_i, x_i+1] 的五次多项式系数由 p_i-2 ... p_i+3 得到
+_SPRAGUE_A = asarray([[0, 0, 24, 0, 0, 0],
+                      [2, -16, 0, 16, -2, 0],
+                      [-1, 16, -30, 16, -1, 0],
+                      [-9, 39, -70, 66, -33, 7],
+                      [13, -64, 126, -124, 61, -12],
+                      [-5, 25, -50, 50, -25, 5]]) / 24
+# 两端各外延两个点 p_-2 p_-1 | p_n p_n+1
+_SPRAGUE_C = asarray([[884, -1960, 3033, -2648, 1080, -180],
+                      [508, -540, 488, -367, 144, -24],
+                      [-24, 144, -367, 488, -540, 508],
+                      [-180, 1080, -2648, 3033, -1960, 884]]) / 209
+
+
+def ppoly_eval(x: ndarray, coe: ndarray, x_in: ndarray, step: float = None) -> ndarray:
+    """
+    分段多项式求值 (Horner).
+
+    coe 形状 (k+1, x.size-1, m), 为局部坐标 (x_in - x[i]) 的系数, 高次在前;
+    区间外用端点区间的多项式外推. 返回 (x_in.size, m).
+    step 为 x 的等间距步长(见 `uniform_step`), 此时区间号直接计算, 不查找;
+    x_in 也等间距且与 x 对齐时(如 5nm 到 1nm)用固定模板计算, 见 `_ppoly_stencil`.
+    """
+    if step is None:
+        ind = searchsorted(x, x_in, 'right') - 1
+    else:
+        if x_in.size > 2:
+            res = _ppoly_stencil(x, coe, x_in, step)
+            if res is not None:
+                return res
+        ind = floor((x_in - x[0]) / step).astype(intp)
+    clip(ind, 0, x.size - 2, out=ind)
+    s = (x_in - x[ind])[:, None].astype(coe.dtype, copy=False)
+    res = coe[0][ind]
+    for c in coe[1:]:
+        res *= s
+        res += c[ind]
+    return res
+
+
+@lru_cache(maxsize=64)
+def _stencil_weights(k: int, r: int, d: float, dtype) -> ndarray:
+    # 区间内第 o 个点 s = o*d 的各次幂, (k+1, r), 高次在前
+    s = arange(r) * d
+    return stack([s**(k - j) for j in range(k + 1)]).astype(dtype)
+
+
+def _ppoly_stencil(x: ndarray, coe: ndarray, x_in: ndarray, step: float) -> ndarray:
+    """
+    x x_in 都等间距, step / d 为整数 r 且 x_in 落在 x[0] + d 的整数倍上时,
+    每个区间内 r 个点的偏移相同: 权重预先算好, 所有区间所有列一次矩阵乘.
+    不满足条件时返回 None.
+    """
+    d = (x_in[-1] - x_in[0]) / (x_in.size - 1)
+    if d <= 0 or not allclose(diff(x_in), d, rtol=1e-9, atol=0):
+        return None
+    r, g0 = step / d, (x_in[0] - x[0]) / d
+    if abs(r - round(r)) > 1e-6 or abs(g0 - round(g0)) > 1e-6 * max(abs(g0), 1):
+        return None
+    r, g0 = int(round(r)), int(round(g0))
+    g = arange(g0, g0 + x_in.size)
+    iv = g // r
+    inside = (iv >= 0) & (iv < x.size - 1)
+    if not inside.any():
+        return None
+    a, b = inside.argmax(), x_in.size - inside[::-1].argmax()  # 区间内的点连续
+    i0, i1 = iv[a], iv[b - 1] + 1
+    w = _stencil_weights(coe.shape[0] - 1, r, float(d), coe.dtype)
+    # (r, i1-i0, m) -> 按 x 顺序排列的细网格 ((i1-i0)*r, m)
+    full = tensordot(w, coe[:, i0:i1], (0, 0)).transpose(1, 0, 2).reshape(-1, coe.shape[-1])
+    start = g[a] - i0 * r
+    if a == 0 and b == x_in.size:
+        return full[start:start + x_in.size]
+    res = empty((x_in.size, coe.shape[-1]), coe.dtype)
+    res[a:b] = full[start:start + b - a]
+    # 区间外的点外推
+    res[:a] = ppoly_eval(x, coe, x_in[:a])
+    res[b:] = ppoly_eval(x, coe, x_in[b:])
+    return res
+
+
+class interp1d_local:
+    """
+    局部插值, 不解线性方程组, 所有列一次向量化计算.
+
+    kind:
+        'sprague' : Sprague 五次插值 (CIE 167), 要求等间距, 至少 6 个点
+        'pchip'   : 分段三次 Hermite 保形插值 (Fritsch-Carlson), 适用于不等间距
+        'akima'   : Akima 插值, 适用于不等间距
+    参数和返回值同 `interp1d`, 但返回值按 x_in 的原顺序排列.
+    """
+    kind_str = ('sprague', 'pchip', 'akima')
+
+    def __init__(self, x: ndarray, y: ndarray, axis=0, kind='pchip', dtype=float64):
+        with instrument.stage('interp1d_local.check'):
+            self.input_check(x, y, axis, kind)
+        with instrument.stage('interp1d_local.fit') as st:
+            if self.kind == 'sprague':
+                self.coe = self._coe_sprague()
+            elif self.kind == 'pchip':
+                self.coe = self._hermite(self._slope_pchip())
+            else:
+                self.coe = self._hermite(self._slope_akima())
+            self.coe = self.coe.astype(dtype, copy=False)
+            st.items, st.nbytes = self.y.shape[1], self.coe.nbytes
+
+    def input_check(self, x, y, axis, kind):
+        x, y = asarray(x, float), asarray(y, float)
+        if x.ndim != 1 and (x.shape[0] - 1) * (x.shape[1] - 1) != 0:
+            raise ValueError('x is not vector')
+        x = ndim_check(x)
+        x_sort_index = argsort(x)
+        self.x = x[x_sort_index]
+        if any(diff(self.x) == 0):
+            raise ValueError('x has duplicate values')
+        self.step = uniform_step(self.x)
+
+        # 内部统一为 (x.size, m), 每列一条曲线
+        y = ndim_check(y)
+        self.vector = y.ndim == 1
+        if y.ndim == 1:
+            if y.size != x.size:
+                raise ValueError('y.size != x.size')
+            y = y[:, None]
+        elif y.ndim == 2:
+            if axis == 1:
+                y = y.T
+            elif axis != 0:
+                raise ValueError('axis must in (0, 1)')
         else:
-            mcoe = zeros([self.x.size, self.x.size])
-            for ii in range(1, self.x.size - 1):
-                mcoe[ii, ii - 1] = dx[ii - 1]
-                mcoe[ii, ii] = 2 * (dx[ii] + dx[ii - 1])
-                mcoe[ii, ii + 1] = dx[ii]
-
-        if self.boundary == 0:
-            mcoe[0, 0], mcoe[-1, -1] = 1, 1
-        elif self.boundary == 1:
-            mcoe[0, 0] = -dx[1]
-            mcoe[0, 1] = dx[0] + dx[1]
-            mcoe[0, 2] = -dx[0]
-            mcoe[-1, -1] = -dx[-2]
-            mcoe[-1, -2] = dx[-1] + dx[-2]
-            mcoe[-1, -3] = -dx[-1]
-        elif self.boundary == 2:
-            mcoe[0, 0] = 1
-            mcoe[0, -1] = -1
-            mcoe[-1, -1] = dx[-1] / 6
-            mcoe[-1, -2] = dx[-1] / 3
-            mcoe[-1, 1] = -dx[0] / 6
-            mcoe[-1, 0] = -dx[0] / 3
-            yy[-1] = dy[-1] - dy[0]
+            raise ValueError('y.ndim > 2')
+        if y.shape[0] != x.size:
+            raise ValueError('y.shape[axis] != x.size')
+        self.y = y[x_sort_index]
 
-        c0 = inv(mcoe) @ yy
-        c = c0[:-1]
-        d = diff(c0) / dx / 3
-        b = k - dx * c * 2 / 3 - dx * c0[1:] / 3
-        return c_[a - b * xx + c * xx**2 - d * xx**3,
-                  b - c * xx * 2 + d * xx**2 * 3, c - d * xx * 3, d]
+        if not isinstance(kind, str) or kind.lower() not in self.kind_str:
+            raise ValueError('kind must in ("sprague", "pchip", "akima")')
+        self.kind = kind.lower()
+        if self.kind == 'sprague':
+            if self.x.size < 6:
+                raise ValueError('sprague requires at least 6 points')
+            if self.step is None:
+                raise ValueError('sprague requires uniformly spaced x')
+        elif self.x.size < 3:
+            raise ValueError(f'{self.kind} requires at least 3 points')
+
+    def __call__(self, x_in: ndarray) -> ndarray:
+        with instrument.stage('interp1d_local.call') as st:
+            x_in = asarray(x_in, float).flatten()
+            res = ppoly_eval(self.x, self.coe, x_in, self.step)
+            if self.vector:
+                res = res[:, 0]
+            st.items, st.nbytes = res.size, res.nbytes
+        return res
+
+    def _coe_sprague(self) -> ndarray:
+        y, n = self.y, self.x.size
+        h = self.step
+        ye = empty((n + 4, y.shape[1]))
+        ye[:2] = _SPRAGUE_C[:2] @ y[:6]
+        ye[2:-2] = y
+        ye[-2:] = _SPRAGUE_C[2:] @ y[-6:]
+        # 每个区间的 6 点模板 (6, n-1, m)
+        p = stack([ye[i:i + n - 1] for i in range(6)])
+        a = tensordot(_SPRAGUE_A, p, 1)
+        # 系数 a_j 对应 ((x - x_i) / h)**j, 换算到 (x - x_i)**j, 高次在前
+        for j in range(1, 6):
+            a[j] /= h**j
+        return a[::-1]
+
+    def _hermite(self, d: ndarray) -> ndarray:
+        # 由节点斜率 d 得到分段三次 Hermite 系数
+        h = diff(self.x)[:, None]
+        delta = diff(self.y, axis=0) / h
+        c2 = (3 * delta - 2 * d[:-1] - d[1:]) / h
+        c3 = (d[:-1] + d[1:] - 2 * delta) / h**2
+        return stack([c3, c2, d[:-1], self.y[:-1]])
+
+    def _slope_pchip(self) -> ndarray:
+        h = diff(self.x)[:, None]
+        delta = diff(self.y, axis=0) / h
+        d = empty(self.y.shape)
+        # 内点: 加权调和平均, 单调性改变处斜率为 0
+        w1 = 2 * h[1:] + h[:-1]
+        w2 = h[1:] + 2 * h[:-1]
+        same = sign(delta[:-1]) * sign(delta[1:]) > 0
+        with errstate(divide='ignore', invalid='ignore'):
+            hm = (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:])
+        d[1:-1] = where(same, hm, 0)
+        d[0] = self._pchip_end(h[0], h[1], delta[0], delta[1])
+        d[-1] = self._pchip_end(h[-1], h[-2], delta[-1], delta[-2])
+        return d
+
+    @staticmethod
+    def _pchip_end(h0, h1, m0, m1):
+        # 三点公式, 保持形状
+        d = ((2 * h0 + h1) * m0 - h0 * m1) / (h0 + h1)
+        d = where(sign(d) != sign(m0), 0, d)
+        return where((sign(m0) != sign(m1)) & (abs(d) > abs(3 * m0)), 3 * m0, d)
+
+    def _slope_akima(self) -> ndarray:
+        h = diff(self.x)[:, None]
+        n = self.x.size
+        m = empty((n + 3, self.y.shape[1]))
+        m[2:-2] = diff(self.y, axis=0) / h
+        # 两端各外延两个斜率
+        m[1] = 2 * m[2] - m[3]
+        m[0] = 2 * m[1] - m[2]
+        m[-2] = 2 * m[-3] - m[-4]
+        m[-1] = 2 * m[-2] - m[-3]
+        dm = abs(diff(m, axis=0))
+        f1, f2 = dm[2:], dm[:-2]
+        f12 = f1 + f2
+        d = (m[3:] + m[:-3]) / 2  # 两侧斜率差都为 0 时
+        ind = f12 > 1e-9 * f12.max(axis=0)
+        with errstate(divide='ignore', invalid='ignore'):
+            d = where(ind, (f1 * m[1:-2] + f2 * m[2:-1]) / f12, d)
+        return d
+
+
+KIND_STR = interp1d.kind_str + interp1d_local.kind_str
+
+
+def make_interp1d(x: ndarray, y: ndarray, axis=0, kind='cubic', boundary='not-a-knot',
+                  dtype=float64):
+    """按 kind 返回 `interp1d` (全局样条) 或 `interp1d_local` (局部插值)"""
+    if isinstance(kind, str) and kind.lower() in interp1d_local.kind_str:
+        return interp1d_local(x, y, axis, kind, dtype)
+    return interp1d(x, y, axis, kind, boundary, dtype)
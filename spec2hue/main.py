@@ -1,5 +1,7 @@
 ﻿# -*- coding: utf-8 -*-
-import huetrans
+import multiprocessing
+from typing import Callable, List
+
 import spec2hue
 import wx
 from _base import WIDGETS_TOTAL
@@ -7,6 +9,30 @@ from _base import WIDGETS_TOTAL
 WIDGETS_LABEL = WIDGETS_TOTAL['main']
 
 
+def _hue_trans(parent: wx.Window) -> wx.Panel:
+    # 第二页用到时才导入
+    import huetrans
+    return huetrans.HueTrans(parent)
+
+
+class LazyPage(wx.Panel):
+    """Notebook 的页, 第一次显示时才由 factory(self) 创建内容"""
+
+    def __init__(self, parent: wx.Window, factory: Callable[[wx.Window], wx.Window]):
+        super(LazyPage, self).__init__(parent)
+        self.factory = factory
+        self.page = None
+        self.SetSizer(wx.BoxSizer(wx.VERTICAL))
+
+    def build(self) -> wx.Window:
+        if self.page is None:
+            with wx.WindowUpdateLocker(self):
+                self.page = self.factory(self)
+                self.GetSizer().Add(self.page, 1, wx.EXPAND | wx.ALL, 0)
+                self.Layout()
+        return self.page
+
+
 class MainWin(wx.Frame):
 
     def __init__(self):
@@ -18,27 +44,42 @@ class MainWin(wx.Frame):
         self._init_ui()
         self.Centre()
         self.Show()
+        # 窗口显示后再创建第一页
+        wx.CallAfter(self._build_page, 0)
+
+    @property
+    def tab1(self) -> spec2hue.Spec2Hue:
+        return self.pages[0].build()
 
     def _init_ui(self):
         # 创建一个Notebook控件
-        notebook = wx.Notebook(self)
+        self.notebook = notebook = wx.Notebook(self)
         notebook.SetFont(
             wx.Font(14, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_NORMAL,
                     wx.FONTWEIGHT_NORMAL, False, WIDGETS_LABEL['font']))
-        # 创建第一个Tab页
-        self.tab1 = spec2hue.Spec2Hue(notebook)
-        # 创建第二个Tab页
-        tab2 = huetrans.HueTrans(notebook)
+        # Tab页的内容在第一次切换到时才创建
+        self.pages: List[LazyPage] = [LazyPage(notebook, spec2hue.Spec2Hue),
+                                      LazyPage(notebook, _hue_trans)]
         # 将Tab页添加到Notebook中
-        notebook.AddPage(self.tab1, WIDGETS_LABEL['tab1'])
-        notebook.AddPage(tab2, WIDGETS_LABEL['tab2'])
+        notebook.AddPage(self.pages[0], WIDGETS_LABEL['tab1'])
+        notebook.AddPage(self.pages[1], WIDGETS_LABEL['tab2'])
+        notebook.Bind(wx.EVT_NOTEBOOK_PAGE_CHANGED, self._on_page_changed)
         # 设置Notebook的布局
         sizer = wx.BoxSizer(wx.VERTICAL)
         sizer.Add(notebook, 1, wx.EXPAND | wx.ALL, 0)
         self.SetSizer(sizer)
 
+    def _build_page(self, index: int):
+        if self:  # 窗口可能已关闭
+            self.pages[index].build()
+
+    def _on_page_changed(self, event):
+        self._build_page(event.GetSelection())
+        event.Skip()
+
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # 打包后 read_pdf 的进程池需要
     app = wx.App()
     MainWin()
     app.MainLoop()
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+读取光谱数据文件 csv txt tsv xlsx xls pdf
+
+不依赖 wx, 第三方读取库在用到时才导入
+"""
+import csv
+import os.path
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from typing import Iterable, List, Tuple, Union
+
+import instrument
+from numpy import array, concatenate, empty, float64, isnan, ndarray
+
+_PDF_PAGES_MIN = 8  # 每个进程至少处理的页数
+
+
+def get_encoding(path: str) -> str:
+    """读取csv的编码"""
+    import chardet
+    detect = chardet.detect(open(path, 'rb').read(4096))
+    return detect['encoding']
+
+
+def get_delimiter(path: str) -> Tuple[str, str]:
+    """读取csv的分隔符 return (delimiter, encoding)"""
+    sniffer = csv.Sniffer()
+    encoding = get_encoding(path)
+    with open(path, encoding=encoding) as fp:
+        text = fp.read(4096)
+    # 截断的末行列数不同, Sniffer 会识别失败; 只用完整的行, 没有换行时(一行超过 4096)用全部
+    end = text.rfind('\n')
+    delimiter = sniffer.sniff(text[:end] if end > 0 else text).delimiter
+    return delimiter, encoding
+
+
+@instrument.timed('reader.read_txt')
+def read_txt(
+    path: str,
+    header: Union[int, None] = None,
+    col: slice = slice(0, None, None)
+) -> Tuple[List[List[str]], List[str]]:
+    """
+    读取csv txt
+
+    Parameters
+    ----------
+    path: str
+        地址
+    header: int | None
+        表头行号 int 从0开始计数; 若无表头None
+    col: slice
+        列读取范围
+
+    Returns
+    -------
+    data: List[List[str]]
+        读取的数据
+    header: List[str]
+        表头
+    """
+    delimiter, encoding = get_delimiter(path)
+    with open(path, encoding=encoding, newline='') as csvfile:
+        csv_reader = csv.reader(csvfile, delimiter=delimiter)
+        if header is None:
+            data_header = []
+        elif isinstance(header, int):
+            for _ in range(header):
+                next(csv_reader)
+            data_header = next(csv_reader)[col]
+        else:
+            raise ValueError('header')
+
+        data = [row[col] for row in csv_reader]
+    return data, data_header
+
+
+def pdf_pages(path: str) -> int:
+    """读取pdf的页数"""
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        n = len(pdf.pages)
+    return n
+
+
+def _page_tables(pages: Iterable) -> List[List[List[str]]]:
+    """各页的表格 每页去掉表头行"""
+    tables = []
+    for page in pages:
+        table = page.extract_table()
+        tables.append(table[1:] if table else [])
+        page.flush_cache()
+    return tables
+
+
+def _pdf_tables(path: str, pages: List[int]) -> List[List[List[str]]]:
+    """读取pdf中指定页的表格 每页去掉表头行; 用于进程池"""
+    import pdfplumber
+    with pdfplumber.open(path, pages=[i + 1 for i in pages]) as pdf:
+        return _page_tables(pdf.pages)
+
+
+@instrument.timed('reader.read_pdf')
+def read_pdf(path: str,
+             data_ye: int = 0,
+             pages: Union[range, slice, None] = None,
+             workers: Union[int, None] = None,
+             n_pages: Union[int, None] = None) -> List[List[str]]:
+    """
+    读取表格pdf
+
+    Parameters
+    ----------
+    path: str
+        地址
+    data_ye: int
+        数据跨了几页 0为数据单页; 末尾不足一组的页不读取
+    pages: range | slice | None
+        读取的页码范围 从0开始计数; None为全部页
+    workers: int | None
+        进程数; None 为按 cpu 数和页数自动选择, 1 为不使用进程池
+    n_pages: int | None
+        总页数, 已知时(如 `pdf_pages` 的结果)传入; None 时打开文件计数,
+        不使用进程池时直接从这次打开的文件读取
+
+    Returns
+    -------
+    data: List[List[str]]
+        按页码顺序合并的数据
+    """
+    assert isinstance(data_ye, int)
+    data_ye += 1
+    pdf = None
+    if n_pages is None:
+        import pdfplumber
+        pdf = pdfplumber.open(path)
+        n_pages = len(pdf.pages)
+    try:
+        if pages is None:
+            pages = range(n_pages)
+        elif isinstance(pages, slice):
+            pages = range(n_pages)[pages]
+        pages = [i for i in pages if 0 <= i < n_pages]
+        pages = pages[:len(pages) // data_ye * data_ye]  # 去掉不足一组的页
+
+        if workers is None:
+            workers = min(os.cpu_count() or 1, len(pages) // _PDF_PAGES_MIN)
+        if workers <= 1:
+            if pdf is None:
+                return list(chain.from_iterable(_pdf_tables(path, pages)))
+            return list(chain.from_iterable(_page_tables(pdf.pages[i] for i in pages)))
+    finally:
+        if pdf is not None:
+            pdf.close()
+
+    size = -(-len(pages) // workers)
+    chunks = [pages[i:i + size] for i in range(0, len(pages), size)]
+    with ProcessPoolExecutor(workers) as pool:
+        # map 保证结果按页码顺序
+        tables = pool.map(_pdf_tables, [path] * len(chunks), chunks)
+        return list(chain.from_iterable(chain.from_iterable(tables)))
+
+
+def rows2float(rows: Iterable[Iterable], dtype: type = float64) -> ndarray:
+    """
+    read_txt read_pdf 的字符串行转为 dtype 数组, 空单元格('' 或 None)为 nan,
+    行长度不同时以 nan 补齐, 去掉末尾的空行
+    """
+    rows = [['' if v is None else v for v in row] for row in rows]
+    n = max((len(row) for row in rows), default=0)
+    rows = [row + [''] * (n - len(row)) if len(row) < n else row for row in rows]
+    try:
+        return _rows2array(([None if v == '' else v for v in row] for row in rows),
+                           dtype=dtype)
+    except ValueError as e:
+        raise ValueError(f'数据格式不正确, 必须全部是数字:\n{e}') from None
+
+
+def _rows2array(rows: Iterable[tuple], chunk: int = 4096, dtype: type = float64) -> ndarray:
+    """按块把行转为 dtype 数组, 空单元格为 nan, 去掉末尾的空行"""
+    blocks, buf = [], []
+    for row in rows:
+        buf.append(row)
+        if len(buf) == chunk:
+            blocks.append(array(buf, dtype=object).astype(dtype))
+            buf = []
+    if buf:
+        blocks.append(array(buf, dtype=object).astype(dtype))
+    if not blocks:
+        return empty((0, 0), dtype)
+    data = concatenate(blocks) if len(blocks) > 1 else blocks[0]
+    n = len(data)
+    while n > 0 and isnan(data[n - 1]).all():
+        n -= 1
+    return data[:n]
+
+
+@instrument.timed('reader.read_xlsx')
+def read_xlsx(
+    book: 'openpyxl.Workbook',
+    sheet: str,
+    header: Union[int, None] = None,
+    col: slice = slice(0, None, None),
+    dtype: type = float64
+) -> Tuple[ndarray, List[str]]:
+    """
+    读取xlsx 只读流式 只读取所选的表和列
+
+    Parameters
+    ----------
+    book: openpyxl.Workbook
+        以 read_only=True, data_only=True 打开的工作簿
+    sheet: str
+        表名
+    header: int | None
+        表头行号 int 从0开始计数; 若无表头None
+    col: slice
+        列读取范围
+    dtype: float64 | float32
+        数据类型
+
+    Returns
+    -------
+    data: ndarray
+        读取的数据 dtype 空单元格为 nan
+    header: List[str]
+        表头
+    """
+    ws = book[sheet]
+    min_col = (col.start or 0) + 1
+    max_col = col.stop if col.stop is not None else ws.max_column
+    start = 1 if header is None else header + 1
+    rows = ws.iter_rows(min_row=start, min_col=min_col, max_col=max_col,
+                        values_only=True)
+    if header is None:
+        data_header = []
+    elif isinstance(header, int):
+        data_header = list(next(rows, ()))
+    else:
+        raise ValueError('header')
+    return _rows2array(rows, dtype=dtype), data_header
+
+
+@instrument.timed('reader.read_xls')
+def read_xls(
+    book: 'xlrd.book.Book',
+    sheet: str,
+    header: Union[int, None] = None,
+    col: slice = slice(0, None, None),
+    dtype: type = float64
+) -> Tuple[ndarray, List[str]]:
+    """
+    读取xls 按列整块读取所选的表和列
+
+    Parameters
+    ----------
+    book: xlrd.book.Book
+        工作簿
+    sheet: str
+        表名
+    header: int | None
+        表头行号 int 从0开始计数; 若无表头None
+    col: slice
+        列读取范围
+    dtype: float64 | float32
+        数据类型
+
+    Returns
+    -------
+    data: ndarray
+        读取的数据 dtype 空单元格为 nan
+    header: List[str]
+        表头
+    """
+    ws = book.sheet_by_name(sheet)
+    cols = range(ws.ncols)[col]
+    if header is None:
+        data_header, start = [], 0
+    elif isinstance(header, int):
+        data_header = [ws.cell_value(header, i) for i in cols]
+        start = header + 1
+    else:
+        raise ValueError('header')
+    data = array([ws.col_values(i, start) for i in cols], dtype=object).T
+    data[data == ''] = None
+    return _rows2array(data, dtype=dtype), data_header
+
+
+def open_book(path: str):
+    """打开Excel工作簿 xlsx 为只读流式, xls 为按需加载"""
+    if path.rpartition('.')[-1].lower() == 'xlsx':
+        import openpyxl
+        return openpyxl.load_workbook(path, read_only=True, data_only=True)
+    import xlrd
+    return xlrd.open_workbook(path, on_demand=True)
+
+
+def close_book(book) -> None:
+    """关闭 open_book 打开的工作簿"""
+    if hasattr(book, 'release_resources'):
+        book.release_resources()
+    else:
+        book.close()
+
+
+def read_file(
+    path: str,
+    header: Union[int, None] = None,
+    col: slice = slice(0, None, None),
+    sheet: Union[str, None] = None,
+    pages: Union[range, slice, None] = None,
+    data_ye: int = 0,
+    dtype: type = float64
+) -> Tuple[ndarray, List[str]]:
+    """
+    按后缀读取数据文件为 float 数组
+
+    Parameters
+    ----------
+    path: str
+        地址
+    header: int | None
+        表头行号 int 从0开始计数; 若无表头None. pdf 不使用
+    col: slice
+        列读取范围. pdf 不使用
+    sheet: str | None
+        Excel 表名; None 为第一个表
+    pages: range | slice | None
+        pdf 读取的页码范围
+    data_ye: int
+        pdf 数据跨了几页
+    dtype: float64 | float32
+        数据类型
+
+    Returns
+    -------
+    data: ndarray
+        读取的数据 dtype
+    header: List[str]
+        表头
+    """
+    suffix = path.rpartition('.')[-1].lower()
+    if suffix in ('csv', 'txt', 'tsv'):
+        data, hea = read_txt(path, header, col)
+        return rows2float(data, dtype), hea
+    if suffix == 'pdf':
+        return rows2float(read_pdf(path, data_ye, pages), dtype), []
+    if suffix not in ('xlsx', 'xls'):
+        raise ValueError(f'不支持的文件格式: {suffix}')
+    book = open_book(path)
+    try:
+        if suffix == 'xlsx':
+            return read_xlsx(book, sheet or book.sheetnames[0], header, col, dtype)
+        return read_xls(book, sheet or book.sheet_names()[0], header, col, dtype)
+    finally:
+        close_book(book)
+
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+本地 HTTP/JSON 色度计算服务, 不依赖 wx
+
+同一配置(光源 视场角 单位 上限 插值方法 精度 波长)的并发请求在 `max_delay` 秒内合并为一批,
+一次矩阵计算后再分发回各请求.
+
+    python server.py --port 8765
+
+POST /colour  JSON::
+
+    {"wavelength": [380, 385, ...], "spectra": [[...], [...]],
+     "si": "D65", "va": 2, "unit": "nm", "upper": 100, "items": ["X", "Y", "Z"],
+     "kind": "cubic", "dtype": "float64"}
+
+`kind` 见 `interpolate.KIND_STR`, `dtype` 为 float64 或 float32, 同 `CIE`.
+
+POST /colour?n=81&si=D65&kind=linear  application/octet-stream:
+    float64 小端, 形状 (n, 1 + m) 按行存储, 第0列为波长, 同 `CIE` 的输入
+
+GET /metrics  延迟 吞吐 批大小
+"""
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from cie import CIE, COLOUR_TITLE, ColourResult
+from numpy import asarray, c_, float32, float64, frombuffer, hstack, ndarray, percentile
+
+DTYPES = {'float64': float64, 'float32': float32}
+
+
+class MicroBatcher:
+    """
+    合并同一配置的并发请求.
+
+    Parameters
+    ----------
+    max_delay : float, default 0.005
+        一批最多等待的秒数.
+    max_batch : int, default 4096
+        一批最多的光谱数, 达到后立即计算.
+    """
+
+    def __init__(self, max_delay: float = 0.005, max_batch: int = 4096):
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._pending: Dict[tuple, List[Tuple[ndarray, Future, float]]] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._latency = deque(maxlen=10000)
+        self._stats = {'requests': 0, 'spectra': 0, 'batches': 0, 'errors': 0}
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, config: tuple, wavelength: ndarray, spectra: ndarray) -> Future:
+        """
+        提交一组光谱.
+
+        Parameters
+        ----------
+        config : tuple
+            (si, va, unit, upper, kind, dtype), 同 `CIE` 的参数
+        wavelength : ndarray 1-dim
+        spectra : ndarray 2-dim
+            ``spectra.shape[0] == wavelength.size``, axis1 is input item
+
+        Returns
+        -------
+        Future
+            结果为 `CIE.colour_values()` 的对应列
+        """
+        fut = Future()
+        key = (*config, wavelength.tobytes())
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('MicroBatcher 已关闭')
+            self._pending.setdefault(key, []).append(
+                (spectra, fut, time.perf_counter()))
+            self._cond.notify()
+        return fut
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def metrics(self) -> Dict[str, float]:
+        """延迟(ms) 吞吐(光谱/s) 平均批大小"""
+        with self._cond:
+            lat = asarray(self._latency) * 1000
+            res = dict(self._stats)
+        elapsed = time.perf_counter() - self._start
+        res['spectra_per_second'] = res['spectra'] / elapsed if elapsed else 0.
+        res['mean_batch_size'] = res['spectra'] / res['batches'] if res['batches'] else 0.
+        if lat.size:
+            res['latency_ms_p50'], res['latency_ms_p95'], res['latency_ms_max'] = (
+                float(i) for i in percentile(lat, (50, 95, 100)))
+        return res
+
+    def _take(self):
+        # 取出一批: 最早的请求已等待 max_delay 或 光谱数达到 max_batch
+        with self._cond:
+            while True:
+                if self._closed and not self._pending:
+                    return None, None
+                now = time.perf_counter()
+                wait = self.max_delay
+                for key, items in self._pending.items():
+                    size = sum(i[0].shape[1] for i in items)
+                    age = now - items[0][2]
+                    if self._closed or size >= self.max_batch or age >= self.max_delay:
+                        return key, self._pending.pop(key)
+                    wait = min(wait, self.max_delay - age)
+                self._cond.wait(wait if self._pending else None)
+
+    def _run(self):
+        while True:
+            key, items = self._take()
+            if key is None:
+                return
+            self._compute(key, items)
+
+    def _compute(self, key: tuple, items: List[Tuple[ndarray, Future, float]]):
+        *config, wbytes = key
+        w = frombuffer(wbytes, float64)
+        try:
+            hue = CIE(c_[w, hstack([i[0] for i in items])], *config).colour_values()
+            results, start = [], 0
+            for spec, _, _ in items:
+                results.append(hue[:, start:start + spec.shape[1]])
+                start += spec.shape[1]
+        except Exception:
+            # 整批出错时逐个计算, 只让出错的请求失败
+            results = []
+            for spec, _, _ in items:
+                try:
+                    results.append(CIE(c_[w, spec], *config).colour_values())
+                except Exception as e:
+                    results.append(e)
+        now = time.perf_counter()
+        with self._cond:
+            self._stats['batches'] += 1
+            for (spec, fut, t0), res in zip(items, results):
+                self._stats['requests'] += 1
+                self._latency.append(now - t0)
+                if isinstance(res, Exception):
+                    self._stats['errors'] += 1
+                    fut.set_exception(res)
+                else:
+                    self._stats['spectra'] += spec.shape[1]
+                    fut.set_result(res)
+
+
+class ColourService:
+    """
+    解析请求并交给 `MicroBatcher`, 供 HTTP 服务和 `LocalClient` 共用.
+    """
+
+    def __init__(self, max_delay: float = 0.005, max_batch: int = 4096):
+        self.batcher = MicroBatcher(max_delay, max_batch)
+
+    def colour(self, payload: dict) -> dict:
+        """JSON 请求 -> JSON 结果"""
+        w = asarray(payload['wavelength'], float64)
+        spectra = asarray(payload['spectra'], float64)
+        if spectra.ndim == 1:
+            spectra = spectra[None]
+        return self._colour(w, spectra.T, payload)
+
+    def colour_bin(self, body: bytes, params: dict) -> dict:
+        """二进制请求 -> JSON 结果, 见模块说明"""
+        n = int(params['n'])
+        data = frombuffer(body, '<f8').reshape(n, -1)
+        return self._colour(data[:, 0], data[:, 1:], params)
+
+    def _colour(self, w: ndarray, spectra: ndarray, params: dict) -> dict:
+        if spectra.shape[0] != w.size:
+            raise ValueError('spectra 与 wavelength 长度不一致')
+        dtype = str(params.get('dtype', 'float64'))
+        if dtype not in DTYPES:
+            raise ValueError(f'dtype 只能为 {", ".join(DTYPES)}')
+        config = (str(params.get('si', 'D65')).upper(), int(params.get('va', 2)),
+                  params.get('unit', 'nm'), int(params.get('upper', 100)),
+                  str(params.get('kind', 'cubic')).lower(), DTYPES[dtype])
+        items = params.get('items') or COLOUR_TITLE
+        if isinstance(items, str):
+            items = items.split(',')
+        index = [COLOUR_TITLE.index(i) for i in items]
+        hue = self.batcher.submit(config, w, spectra).result()
+        return {'items': list(items),
+                'result': list(ColourResult(hue[index], items).rows())}
+
+    def metrics(self) -> dict:
+        return self.batcher.metrics()
+
+    def close(self):
+        self.batcher.close()
+
+
+class LocalClient:
+    """
+    不经过网络的客户端, 接口与 HTTP 相同, 用于测试.
+
+    Examples
+    --------
+    >>> client = LocalClient()
+    >>> client.post('/colour', {'wavelength': w.tolist(), 'spectra': s.tolist()})
+    """
+
+    def __init__(self, service: ColourService = None):
+        self.service = service or ColourService()
+
+    def post(self, path: str, payload, params: dict = None) -> dict:
+        if path != '/colour':
+            raise KeyError(path)
+        if isinstance(payload, (bytes, bytearray, memoryview)):
+            return self.service.colour_bin(bytes(payload), params or {})
+        return self.service.colour(payload)
+
+    def get(self, path: str) -> dict:
+        if path != '/metrics':
+            raise KeyError(path)
+        return self.service.metrics()
+
+
+def make_handler(service: ColourService):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _send(self, code: int, obj):
+            body = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if urlparse(self.path).path == '/metrics':
+                self._send(200, service.metrics())
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != '/colour':
+                self._send(404, {'error': 'not found'})
+                return
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                if self.headers.get('Content-Type', '').startswith('application/octet-stream'):
+                    params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                    self._send(200, service.colour_bin(body, params))
+                else:
+                    self._send(200, service.colour(json.loads(body)))
+            except Exception as e:
+                self._send(400, {'error': str(e)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host: str = '127.0.0.1', port: int = 8765,
+          max_delay: float = 0.005, max_batch: int = 4096):
+    service = ColourService(max_delay, max_batch)
+    httpd = ThreadingHTTPServer((host, port), make_handler(service))
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地色度计算服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', default=8765, type=int)
+    parser.add_argument('--max-delay', default=0.005, type=float,
+                        help='合并请求最多等待的秒数, 默认 0.005')
+    parser.add_argument('--max-batch', default=4096, type=int,
+                        help='一批最多的光谱数, 默认 4096')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.max_delay, args.max_batch)
@@ -1,45 +1,22 @@
 ﻿# -*- coding: utf-8 -*-
-import csv
 import json
 import os.path
+import threading
+import time
 from typing import Dict, List, Union
 
-import about
+import instrument
 import wx
 from _base import (WIDGETS_TOTAL, line, line_h, line_v, load_setting,
                    save_setting, ReadFileData)
-from cie import CIE
-from mywxwidgets.grid.gridnumpy import Grid, GridWithHeader
-from numpy import array, c_, ndarray, vstack
-
-
-class CIE(CIE):
-
-    def colour(self):
-        XYZ = self.spec2xyz()
-        if XYZ.ndim == 1:
-            XYZ = XYZ[:, None]
-        lab = self.xyz2lab(XYZ)
-        hlab = self.xyz2lab_h(XYZ)
-        rgb = self.xyz2rgb(XYZ)
-        uv_ = self.xyz2yuv(XYZ)[1:]
-        luv = self.xyz2luv(XYZ)
-        # rgb16_ = self.rgb16(rgb, 1)
-        xyz = XYZ / XYZ.sum(axis=0)
-        # uvw_ = np.asarray([*uv_, 1 - uv_.sum(axis=0)])
-        Ch_ab = self.chs(lab)[0:2]
-        Ch_ab_h = self.chs(hlab)[0:2]
-        Chs_uv = self.chs(luv)
-        yi = 100*(1.28*XYZ[0]-1.06*XYZ[2])/XYZ[1]
-        return vstack((XYZ, xyz, lab, Ch_ab, hlab, Ch_ab_h, self.rgb16(rgb, 1),
-                       uv_, 1 - uv_.sum(axis=0), luv, Chs_uv, yi))
-
-
-CHECKBOX_TITLE = ['X', 'Y', 'Z', 'x', 'y', 'z', 'CIELAB-L*', 'CIELAB-a*',
-                  'CIELAB-b*', 'CIELAB-C*_ab', 'CIELAB-h_ab', 'Hunter L',
-                  'Hunter a', 'Hunter b', 'Hunter C_ab', 'Hunter h_ab', 'sRGB',
-                  'u\'', 'v\'', 'w\'', 'CIELUV-L*', 'CIELUV-u*', 'CIELUV-v*',
-                  'CIELUV-C*_uv', 'CIELUV-h_uv', 'CIELUV-s_uv']
+from cie import CIE, COLOUR_TITLE, ColourResult, cie_chunks
+from gridtable import HueGrid, SpectrumGrid
+from mywxwidgets.grid.gridnumpy import Grid
+from numpy import array_equal, c_, empty, flatnonzero, isnan, nan, ndarray
+from writer import WRITERS, write_item_rows, write_result
+
+
+CHECKBOX_TITLE = list(COLOUR_TITLE[:-1])
 CHECKBOX_LABEL = ['X', 'Y', 'Z', 'x', 'y', 'z', 'L*', 'a*', 'b*', 'C*_ab',
                  'h_ab', 'L', 'a', 'b', 'C_ab', 'h_ab', 'sRGB', 'u\'', 'v\'',
                  'w\'', 'L*', 'u*', 'v*', 'C*_uv', 'h_uv', 's_uv']
@@ -47,14 +24,20 @@ CHECKBOX_LABEL = ['X', 'Y', 'Z', 'x', 'y', 'z', 'L*', 'a*', 'b*', 'C*_ab',
 #                  False, False, False, False, False, False, False, True, False,
 #                  False, False, False, False, False, False, False, False)
 CHECKBOX_DICT = dict(zip(CHECKBOX_TITLE, CHECKBOX_LABEL))
+EXPORT_SUFFIX = ('csv', 'xlsx', 'npz')  # 导出文件的类型, 与 EXPORT_WILDCARD 的顺序相同
+EXPORT_WILDCARD = 'CSV files (*.csv)|*.csv|Excel files (*.xlsx)|*.xlsx|NumPy files (*.npz)|*.npz'
 WIDGETS_LABEL = WIDGETS_TOTAL['spec2hue']
+CALC_CHUNK = 1000  # 每块计算的光谱数
+REFRESH_INTERVAL = 0.5  # 计算中刷新输出表格的最短间隔(秒)
 MAP_L2W = {
     'label': wx.StaticText,
     'button': wx.Button,
     'text': wx.TextCtrl,
     'choice': wx.Choice,
-    'GridWithHeader': GridWithHeader,
+    'gauge': wx.Gauge,
+    'SpectrumGrid': SpectrumGrid,
     'Grid': Grid,
+    'HueGrid': HueGrid,
     'line': line
 }
 
@@ -185,13 +168,54 @@ class CalcItems(wx.Dialog):
             self.cb_yi.SetFont(FONT0)
 
 
+class CalcState:
+    """上次完成的计算, 下次计算时复用已插值的光谱和结果"""
+
+    def __init__(self, cie: CIE, spe: ndarray, unit: str, upper: int, full: ndarray):
+        self.cie = cie  # 全部光谱的计算器, 保存插值后的光谱
+        self.spe = spe  # 输入光谱的副本, 用于找出修改过的列
+        self.unit = unit
+        self.upper = upper
+        self.full = full  # colour_values() 的全部行
+
+    def match(self, spe: ndarray, unit: str, upper: int) -> bool:
+        # 波长 单位 上限和光谱数都不变时可以复用
+        return (self.spe.shape == spe.shape and self.unit == unit and self.upper == upper
+                and array_equal(self.spe[:, 0], spe[:, 0]))
+
+
+class CalcJob:
+    """后台计算的状态, 由工作线程写入, 主线程读取"""
+
+    def __init__(self, spe: ndarray, args: tuple, values: ndarray, rows: List[int],
+                 state: Union[CalcState, None] = None):
+        self.spe = spe
+        self.args = args  # (si, va, unit, upper)
+        self.values = values  # 选择的项目的数值结果, 计算完成的列逐块填入
+        self.rows = rows  # 选择的计算项目在 colour_values() 中的行号
+        self.state = state  # 复用的上次计算, None 为全部重新计算
+        self.cie: Union[CIE, None] = None  # 完成后全部光谱的计算器
+        self.full: Union[ndarray, None] = None  # colour_values() 的全部行
+        self.total = spe.shape[1] - 1
+        self.done = 0
+        self.shown = 0  # 已显示到表格的列数
+        self.shown_time = 0.
+        self.cancel = threading.Event()
+        self.records: List[dict] = []
+
+
 class Spec2Hue(wx.Panel):
     widgets: Dict[str, Union[wx.StaticText, wx.Button, wx.TextCtrl, wx.Choice,
-                             GridWithHeader, Grid, wx.StaticLine]]
+                             SpectrumGrid, HueGrid, wx.StaticLine]]
 
     def __init__(self, parent):
         super(Spec2Hue, self).__init__(parent)
         self.SetBackgroundColour(wx.Colour(245, 245, 245))
+        self._timing = []  # 上次计算的各阶段记录 见 instrument
+        self._job: Union[CalcJob, None] = None  # 正在进行的计算
+        self._state: Union[CalcState, None] = None  # 上次完成的计算, 见 CalcState
+        self._meta: Dict = {}  # 输出表格的计算条件, 导出 npz 时保存
+        self._about = None  # 操作说明窗口, 关闭前重复打开只显示到最前
         # self.SetSize((800, 500))
         # self.SetMinSize((680, 235))
         self._init_ui()
@@ -218,7 +242,7 @@ class Spec2Hue(wx.Panel):
         widgets_right: Dict[int, list] = {}
         loop_append(WIDGETS_LABEL['right'], widgets_right)
 
-        self.grid_in: GridWithHeader = self.widgets['GridWithHeader_spectrum']
+        self.grid_in: SpectrumGrid = self.widgets['SpectrumGrid_spectrum']
         self.grid_in.SetHeader([['波长', '', '']])
         self.grid_in.SetHeaderLabels([f'标题{i+1}' for i in range(25)])
         self.filepath: wx.TextCtrl = self.widgets['text_import']
@@ -226,9 +250,11 @@ class Spec2Hue(wx.Panel):
         self.widgets['choice_spectrum.upper'].SetSelection(1)
         self.widgets['choice_si'].SetSelection(1)
         self.widgets['choice_va'].SetSelection(0)
-        self.grid_out: Grid = self.widgets['Grid_output']
+        self.grid_out: HueGrid = self.widgets['HueGrid_output']
         self.grid_out.HideRowLabels()
         self.grid_out.HideColLabels()
+        self.gauge: wx.Gauge = self.widgets['gauge_progress']
+        self.widgets['button_cancel'].Disable()
 
         self._set_font()
         layout = wx.BoxSizer(wx.HORIZONTAL)
@@ -270,7 +296,8 @@ class Spec2Hue(wx.Panel):
         layout_right.Add(self.grid_out, 1, wx.ALL | wx.EXPAND, 4)
         layout023 = wx.BoxSizer(wx.HORIZONTAL)
         layout023.Add(widgets_right[4][0], 1, wx.ALL | wx.ALIGN_CENTER_VERTICAL, 4)
-        layout023.Add(widgets_right[4][1], 0, wx.ALL | wx.ALIGN_CENTER_VERTICAL, 4)
+        for w in widgets_right[4][1:]:
+            layout023.Add(w, 0, wx.ALL | wx.ALIGN_CENTER_VERTICAL, 4)
         layout_right.Add(layout023, 0, wx.EXPAND, 4)
         return layout_right
 
@@ -293,7 +320,9 @@ class Spec2Hue(wx.Panel):
         self.widgets['button_select'].Bind(wx.EVT_BUTTON, self._on_btn_filepath)  # 选择文件
         self.widgets['button_import'].Bind(wx.EVT_BUTTON, self._on_btn_import)  # 导入
         self.widgets['button_calculate'].Bind(wx.EVT_BUTTON, self._on_btn_calc)  # 计算
+        self.widgets['button_cancel'].Bind(wx.EVT_BUTTON, self._on_btn_cancel)  # 取消计算
         self.widgets['button_save'].Bind(wx.EVT_BUTTON, self._on_btn_save)  # 导出
+        self.widgets['button_timing'].Bind(wx.EVT_BUTTON, self._on_btn_timing)  # 耗时
         self.Bind(wx.EVT_SIZE, self._on_size)
 
     def _on_size(self, event):
@@ -305,9 +334,13 @@ class Spec2Hue(wx.Panel):
         event.Skip()
 
     def _on_btn_instructions(self, event):
-        # 操作说明
-        win = about.AboutWin(self, '说明')
-        win.Show()
+        # 操作说明; 第一次打开时才导入, 说明文档只读取一次
+        if self._about:  # 关闭后 wx 对象为 False
+            self._about.Raise()
+        else:
+            import about
+            self._about = about.AboutWin(self, '说明')
+        self._about.Show()
 
     def _on_btn_filepath(self, event):
         # 选择文件
@@ -337,10 +370,14 @@ CSV files (*.csv;*.txt;*.tsv)|*.csv;*.txt;*.tsv|PDF file (*.pdf)|*.pdf'
         try:
             path: str = self.filepath.GetValue().replace('\\', '/')
             readfile = ReadFileData(self, path)
-            if readfile.ShowModal() != wx.ID_OK:
-                return
-            self.grid_in.SetSubject(readfile.result[0])
-            self.grid_in.SetHeader([readfile.result[1]])
+            try:
+                if readfile.ShowModal() != wx.ID_OK:
+                    return
+                spec, hea = readfile.result
+            finally:
+                readfile.Destroy()  # 同时关闭缓存的工作簿
+            self.grid_in.SetSubject(spec)
+            self.grid_in.SetHeader([hea])
             self.Layout()
 
             setting = load_setting()
@@ -351,78 +388,192 @@ CSV files (*.csv;*.txt;*.tsv)|*.csv;*.txt;*.tsv|PDF file (*.pdf)|*.pdf'
 
     def _on_btn_calc(self, event):
         # 计算
-        try:
-            header = array(self.grid_in.header.dataBase.data, str)
-        except Exception as e:
-            self._err(f'header 格式不正确:\n{e}')
-            return
-        for i in range(len(header)):
-            header[i, 0] = '-'
-        try:
-            spe = array(self.grid_in.subject.dataBase.data, float)
-        except Exception as e:
-            if str(e).endswith("('')"):
+        with instrument.collect() as rec_parse, instrument.stage('gui.parse') as st:
+            # 表格的数据已是 float 数组, 不再解析字符串
+            spe = self.grid_in.GetSubject()
+            header = self.grid_in.GetHeader()
+            header[:, 0] = '-'
+            if isnan(spe).any():
                 self._err('数据中不能有空单元格, 如果必须请用 0 代替')
-            else:
-                self._err(f'数据格式不正确, 必须全部是数字:\n{e}')
-            return
+                return
+            st.items, st.nbytes = spe.shape[-1], spe.nbytes
 
         si = self.widgets['choice_si'].GetStringSelection()
         choose = CalcItems(self, si=='C')
         if choose.ShowModal() != wx.ID_OK:
             return
 
+        self._timing = rec_parse
+        self._calc(spe, header, si, choose.result)
+
+    def _calc(self, spe: ndarray, header: ndarray, si: str, hue_hea_b: Dict[str, bool]):
+        # 在工作线程中分块计算, 结果逐块显示; 见 _calc_worker _on_calc_chunk
         try:
-            hue_hea_b = choose.result
-            hue = CIE(spe, si,
-                      self.widgets['choice_va'].GetSelection() * 8 + 2,
-                      self.widgets['choice_wavelength.unit'].GetStringSelection(),
-                      int(self.widgets['choice_spectrum.upper'].GetStringSelection())
-                      ).colour()
+            args = (si, self.widgets['choice_va'].GetSelection() * 8 + 2,
+                    self.widgets['choice_wavelength.unit'].GetStringSelection(),
+                    int(self.widgets['choice_spectrum.upper'].GetStringSelection()))
             # hea_ = [hue_hea[i] for i, v in enumerate(hue_hea_b) if v]
-            hue_ = c_[CHECKBOX_TITLE+['YI'], hue][list(hue_hea_b.values())]
-            self.hue: ndarray[str] = vstack([header, hue_])
-
-            self.grid_out.SetShowFormat('{:.3f}')
-            self.grid_out.SetData(self.hue)
-            self.grid_out.AutoSizeColumns()
-            nc = len(self.hue[0])
+            rows = [i for i, v in enumerate(hue_hea_b.values()) if v]
+            values = empty((len(rows), spe.shape[1] - 1))
+            values.fill(nan)
         except Exception as e:
             self._err(e)
             return
 
-        for ir in range(len(self.hue)):
-            for ic in range(nc):
-                # 初始化-覆盖上一次的颜色设置
-                self.grid_out.SetCellBackgroundColour(ir, ic, wx.WHITE)
-                self.grid_out.SetCellTextColour(ir, ic, wx.BLACK)
-        hea_ = hue_[:, 0].tolist()
-        if 'sRGB' in hea_:
-            nr = hea_.index('sRGB') + 1
-            for i in range(1, nc):
-                val: str = self.hue[nr, i]
-                r, g, b = int(val[1:3], 16), int(val[3:5], 16), int(val[5:7], 16)
-                self.grid_out.SetCellBackgroundColour(nr, i, wx.Colour(r, g, b))
-                gray = 0.299 * r + 0.578 * g + 0.114 * b
-                c = wx.WHITE if gray < 0.78 else wx.BLACK
-                self.grid_out.SetCellTextColour(nr, i, c)
+        state = self._state
+        if state is not None and not state.match(spe, args[2], args[3]):
+            state = None
+        self._state = None  # 计算中会原地修改, 完成后再保存
+        job = CalcJob(spe, args, values, rows, state)
+        job.records.extend(self._timing)  # 解析表格的记录
+        self._job = job
+        self.gauge.SetValue(0)
+        self.grid_in.EnableEditing(False)  # spe 是输入表格数据的视图
+        self.widgets['button_calculate'].Disable()
+        self.widgets['button_cancel'].Enable()
+        with instrument.collect(job.records), instrument.stage('gui.grid', 0, values.nbytes):
+            self.grid_out.SetShowFormat('{:.3f}')
+            result = ColourResult(values, [COLOUR_TITLE[i] for i in rows])
+            self.grid_out.SetResult(header, result, 0)
+        self._meta = dict(zip(('si', 'va', 'unit', 'upper'), args))
+        threading.Thread(target=self._calc_worker, args=(job,), daemon=True).start()
+
+    def _calc_worker(self, job: CalcJob):
+        # 工作线程: 不操作控件, 通过 wx.CallAfter 交给主线程
+        with instrument.collect(job.records):
+            try:
+                if job.state is None:
+                    self._calc_full(job)
+                else:
+                    self._calc_incremental(job)
+            except Exception as e:
+                wx.CallAfter(self._on_calc_end, job, e)
+                return
+        wx.CallAfter(self._on_calc_end, job, None)
+
+    def _calc_full(self, job: CalcJob):
+        # 分块插值和计算, 插值后的光谱合并保存, 供下次复用
+        spec = None
+        for start, cie in cie_chunks(job.spe, *job.args, chunk=CALC_CHUNK):
+            if job.cancel.is_set():
+                return
+            if spec is None:
+                spec = empty((cie.spec.shape[0], job.total), cie.spec.dtype)
+                job.full = empty((len(COLOUR_TITLE), job.total))
+            spec[:, start:start + cie.spec.shape[1]] = cie.spec
+            self._calc_put(job, start, cie.colour_values())
+        if spec is None:
+            raise ValueError('没有光谱数据')
+        job.cie = cie.with_spec(spec)
+
+    def _calc_incremental(self, job: CalcJob):
+        # 只重新插值修改过的列; 光源或视场角改变时只换权重表
+        si, va, unit, upper = job.args
+        cie, job.full = job.state.cie, job.state.full
+        dirty = flatnonzero((job.spe[:, 1:] != job.state.spe[:, 1:]).any(axis=0))
+        if dirty.size:
+            cie.update(dirty, c_[job.spe[:, 0], job.spe[:, 1 + dirty]], unit, upper)
+        if (si.upper(), va) != (cie.info['SI'], cie.info['VA']):
+            cie.set_illuminant(si, va)
+            for start in range(0, job.total, CALC_CHUNK):
+                if job.cancel.is_set():
+                    return
+                self._calc_put(job, start, cie.subset(slice(start, start + CALC_CHUNK)).colour_values())
+        else:
+            if dirty.size:
+                job.full[:, dirty] = cie.subset(dirty).colour_values()
+            job.values[:] = job.full[job.rows]
+            job.done = job.total
+        job.cie = cie
+
+    def _calc_put(self, job: CalcJob, start: int, hue: ndarray):
+        # 填入一块结果, 通知主线程
+        job.full[:, start:start + hue.shape[1]] = hue
+        job.values[:, start:start + hue.shape[1]] = hue[job.rows]
+        job.done = start + hue.shape[1]
+        wx.CallAfter(self._on_calc_chunk, job)
+
+    def _on_calc_chunk(self, job: CalcJob):
+        # 主线程: 更新进度, 按间隔刷新表格
+        if job is not self._job:
+            return
+        self.gauge.SetValue(job.done * 100 // max(job.total, 1))
+        if time.perf_counter() - job.shown_time >= REFRESH_INTERVAL:
+            self._show_columns(job)
+
+    def _on_calc_end(self, job: CalcJob, err: Union[Exception, None]):
+        if job is not self._job:
+            return
+        self._job = None
+        self.grid_in.EnableEditing(True)
+        self.widgets['button_calculate'].Enable()
+        self.widgets['button_cancel'].Disable()
+        self._timing = job.records  # 同一列表, 之后显示表格的记录也在其中
+        if err is not None:
+            self.gauge.SetValue(0)
+            self._err(err)
+            return
+        # 取消时只保留已计算的部分
+        self._show_columns(job)
+        if job.cie is not None:
+            _, _, unit, upper = job.args
+            self._state = CalcState(job.cie, job.spe.copy(), unit, upper, job.full)
+            self.gauge.SetValue(100)
+
+    def _on_btn_cancel(self, event):
+        # 取消计算
+        if self._job is not None:
+            self._job.cancel.set()
+            self.widgets['button_cancel'].Disable()
+
+    def _show_columns(self, job: CalcJob):
+        # 显示已计算的列; 文字和颜色由表格在绘制时生成, 见 gridtable.HueTable
+        done = job.done
+        if done == job.shown:
+            return
+        with instrument.collect(job.records), instrument.stage('gui.grid', done - job.shown):
+            self.grid_out.SetCols(done)
+        job.shown = done
+        job.shown_time = time.perf_counter()
+
+    def _on_btn_timing(self, event):
+        # 上次计算各阶段耗时
+        text = instrument.format_summary(self._timing) or WIDGETS_LABEL['timing_none']
+        wx.MessageBox(text, WIDGETS_LABEL['timing_title'], wx.OK | wx.ICON_INFORMATION)
 
     def _on_btn_save(self, event):
         # 导出
+        if self._job is not None:
+            self._err('正在计算, 请等待计算完成或取消')
+            return
+        if not self.grid_out.table.result.names:
+            self._err(WIDGETS_LABEL['timing_none'])
+            return
         path = os.path.dirname(self.filepath.GetValue())
         fileDialog = wx.FileDialog(self,
                                    '选择数据文件',
                                    defaultDir=path,
-                                   wildcard='CSV files (*.csv)|*.csv',
-                                   style=wx.FD_OPEN)
+                                   wildcard=EXPORT_WILDCARD,
+                                   style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
         if fileDialog.ShowModal() != wx.ID_OK:
             return
         path: str = fileDialog.GetPath()
+        suffix = os.path.splitext(path)[1][1:].lower()
+        if suffix not in WRITERS:
+            suffix = EXPORT_SUFFIX[fileDialog.GetFilterIndex()]
+            path = f'{path}.{suffix}'
         # print(path)
         try:
-            with open(path, 'w', encoding='utf-8', newline='') as f:
-                csv_writer = csv.writer(f)
-                csv_writer.writerows(self.hue)
+            table = self.grid_out.table
+            if suffix == 'csv':
+                # 与表格相同的布局: 每个项目一行
+                write_item_rows(path, table.header[:, :1 + table.cols],
+                                table.result.take(slice(0, table.cols)).select(table.titles))
+            else:
+                # 每个光谱一行, 见 writer
+                label_names, labels = table.export_labels()
+                write_result(path, labels, table.result.take(slice(0, table.cols)),
+                             label_names, self._meta)
             wx.MessageBox('保存完毕', '提示', wx.OK | wx.ICON_INFORMATION)
         except Exception as e:
             self._err(e)
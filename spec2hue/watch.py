@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+"""
+监视文件夹, 只计算新增的光谱并追加到结果, 不依赖 wx
+
+    python -m spec2hue watch data/ --layout rows -o result.csv --state watch.json
+
+轮询文件夹(默认每 0.5 秒), 按 (大小, 修改时间) 发现新文件和变化的文件:
+
+- columns: 同 batch, 每列一个光谱. 文件写完(修改时间超过 --settle 秒)后整个文件计算一次,
+  文件被改写时再计算一次.
+- rows: 运行日志, 表头行为波长, 之后每行一个光谱. 记住已读到的字节位置, 只解析追加的完整行;
+  文件变短或被替换时从头读.
+
+同一波长的光谱复用 `ColourEngine`. 结果追加到 csv (见 `writer.CsvWriter`), 每轮写完即 flush;
+--state 保存各文件的读取位置, 重启后不重复计算.
+"""
+import argparse
+import csv
+import glob
+import json
+import os.path
+import sys
+import time
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple, Union
+
+import instrument
+import numpy as np
+from batch import LABEL_NAMES, OPTION_KEYS, add_calc_arguments, calc_file_result
+from cie import CIE, COLOUR_TITLE, ColourResult
+from interpolate import interp1d_local
+from reader import get_encoding, rows2float
+from writer import CsvWriter
+
+TEXT_SUFFIX = ('csv', 'txt', 'tsv')
+BOOK_SUFFIX = ('xlsx', 'xls')
+# 重采样对光谱是线性的插值方法, 可预先求出矩阵
+LINEAR_KINDS = ('linear', 'quadratic', 'cubic', 'sprague')
+
+
+class ColourEngine:
+    """
+    固定波长和计算条件的计算器, 供同一个文件的多次增量计算复用.
+
+    kind 为 `LINEAR_KINDS` 时, 拟合和重采样对光谱是线性的: 用单位矩阵求出重采样矩阵,
+    新光谱只需一次矩阵乘; 其他 kind 和含 nan 的光谱仍按 `CIE` 计算.
+
+    Parameters
+    ----------
+    wavelengths : array_like 1-dim
+        波长, 同 `CIE` 输入的第0列
+    si, va, unit, upper, kind, dtype
+        同 `CIE`
+    """
+
+    def __init__(self, wavelengths: Union[np.ndarray, Sequence[float]],
+                 si: str = 'D65', va: int = 2, unit: str = 'nm', upper: int = 100,
+                 kind: str = 'cubic', dtype: type = np.float64):
+        self.wavelengths = np.asarray(wavelengths, np.float64)
+        self.args = (si, va, unit, upper, kind, dtype)
+        self.matrix = None
+        n = self.wavelengths.size
+        if kind.lower() in LINEAR_KINDS:
+            # 单位矩阵的第 i 列为第 i 个波长处的 1, 排序不影响列的对应关系
+            basis = np.c_[self.wavelengths, np.eye(n) * upper]
+            base = CIE(basis, si, va, unit, upper, kind)
+            self.matrix = base.spec / 100
+            self.cie = base if np.dtype(dtype) == np.float64 else \
+                CIE(basis[:, :2], si, va, unit, upper, kind, dtype)
+        elif kind.lower() not in interp1d_local.kind_str:
+            raise ValueError(f'{self.__class__}: 未知的插值方法 {kind!r}')
+
+    def colour_values(self, spec: np.ndarray) -> np.ndarray:
+        """
+        同 ``CIE(c_[wavelengths, spec], ...).colour_values()``.
+
+        Parameters
+        ----------
+        spec : ndarray 2-dim
+            ``spec.shape[0] == wavelengths.size``, axis1 为各光谱
+        """
+        spec = np.asarray(spec, np.float64).reshape(self.wavelengths.size, -1)
+        if spec.shape[1] == 0:
+            return np.empty((len(COLOUR_TITLE), 0), self.args[-1])
+        if self.matrix is None or not np.isfinite(spec).all():
+            return CIE(np.c_[self.wavelengths, spec], *self.args).colour_values()
+        upper = self.args[3]
+        if (spec > upper).any():
+            raise ValueError(f'{self.__class__}: 光谱 中有值超过上限')
+        with instrument.stage('ColourEngine.resample', spec.shape[1]):
+            spec1 = (self.matrix @ (spec * (100 / upper))).astype(self.cie.dtype)
+        return self.cie.with_spec(spec1).colour_values()
+
+
+@lru_cache(maxsize=16)
+def colour_engine(wavelengths: Tuple[float, ...], si: str = 'D65', va: int = 2,
+                  unit: str = 'nm', upper: int = 100, kind: str = 'cubic',
+                  dtype: str = 'float64') -> ColourEngine:
+    """按 (波长, 计算条件) 缓存的 `ColourEngine`"""
+    return ColourEngine(wavelengths, si, va, unit, upper, kind, getattr(np, dtype))
+
+
+@dataclass
+class FileState:
+    """一个文件的读取进度, 保存在 --state 中"""
+    size: int = 0
+    mtime: int = 0  # ns
+    inode: int = 0
+    offset: int = 0  # rows: 已解析到的字节位置
+    rows: int = 0  # 已输出的光谱数
+
+
+class _LogFormat:
+    # rows 文件的表头: 编码 分隔符 波长; 不保存, 重启后重新读取
+    __slots__ = ['encoding', 'delimiter', 'wavelengths', 'start']
+
+    def __init__(self, encoding: str, delimiter: str, wavelengths: np.ndarray, start: int):
+        self.encoding = encoding
+        self.delimiter = delimiter
+        self.wavelengths = wavelengths
+        self.start = start  # 表头之后的字节位置
+
+
+class FolderWatcher:
+    """
+    轮询文件夹, 把新增的光谱写入 `out`.
+
+    Parameters
+    ----------
+    paths : sequence of str
+        文件夹或通配符; 文件夹匹配其中的 csv txt tsv (columns 另有 xlsx xls)
+    opts : dict
+        同 `batch.calc_file_result`
+    out : CsvWriter
+        结果, 标签列为 `batch.LABEL_NAMES`
+    layout : {'columns', 'rows'}
+        columns 每列一个光谱, 同 batch; rows 每行一个光谱, 表头行为波长
+    state : str or None
+        保存读取位置的 json 地址, None 为不保存
+    settle : float
+        columns 文件修改后等待的秒数, 之后才读取
+    exclude : sequence of str
+        不读取的文件, 如结果文件本身
+    """
+
+    def __init__(self, paths: Sequence[str], opts: Dict, out: CsvWriter,
+                 layout: str = 'columns', state: Union[str, None] = None,
+                 settle: float = 0.2, exclude: Sequence[str] = ()):
+        if layout not in ('columns', 'rows'):
+            raise ValueError(f'{self.__class__}: layout 错误, 请输入 \'columns\' 或 \'rows\'')
+        if layout == 'rows' and not opts['header']:
+            raise ValueError(f'{self.__class__}: rows 需要表头行(波长)')
+        self.paths = list(paths)
+        self.opts = opts
+        self.out = out
+        self.layout = layout
+        self.state_path = state
+        self.settle = settle
+        self.files: Dict[str, FileState] = {}
+        self._formats: Dict[str, _LogFormat] = {}
+        self._skip = {os.path.abspath(p) for p in (state, *exclude) if p}
+        if state and os.path.isfile(state):
+            with open(state, encoding='utf-8') as fp:
+                self.files = {k: FileState(**v) for k, v in json.load(fp).items()}
+
+    def scan(self) -> List[str]:
+        """匹配的文件, 绝对地址"""
+        suffix = TEXT_SUFFIX if self.layout == 'rows' else TEXT_SUFFIX + BOOK_SUFFIX
+        found = []
+        for p in self.paths:
+            if os.path.isdir(p):
+                names = [os.path.join(p, i) for i in sorted(os.listdir(p))
+                         if i.rpartition('.')[-1].lower() in suffix]
+            else:
+                names = sorted(glob.glob(p))
+            for i in names:
+                i = os.path.abspath(i)
+                if i not in self._skip and i not in found and os.path.isfile(i):
+                    found.append(i)
+        return found
+
+    def poll(self) -> int:
+        """检查一轮, 返回写入的光谱数"""
+        paths = self.scan()
+        before = {k: asdict(v) for k, v in self.files.items()}
+        for p in set(self.files) - set(paths):  # 已删除
+            del self.files[p]
+            self._formats.pop(p, None)
+        n = 0
+        for path in paths:
+            try:
+                n += self._poll_file(path)
+            except Exception as e:
+                print(f'{path}: {e}', file=sys.stderr)
+        if n:
+            self.out.flush()
+        if {k: asdict(v) for k, v in self.files.items()} != before:
+            self.save_state()
+        return n
+
+    def run(self, interval: float = 0.5, once: bool = False):
+        """每 interval 秒检查一次; once 为检查一次就返回"""
+        while True:
+            t = time.monotonic()
+            self.poll()
+            if once:
+                return
+            time.sleep(max(0., interval - (time.monotonic() - t)))
+
+    def save_state(self):
+        if not self.state_path:
+            return
+        tmp = self.state_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as fp:
+            json.dump({k: asdict(v) for k, v in self.files.items()}, fp)
+        os.replace(tmp, self.state_path)
+
+    def _poll_file(self, path: str) -> int:
+        stat = os.stat(path)
+        old = self.files.get(path)
+        if old is not None and (old.size, old.mtime, old.inode) == \
+                (stat.st_size, stat.st_mtime_ns, stat.st_ino):
+            return 0
+        if self.layout == 'columns':
+            if time.time_ns() - stat.st_mtime_ns < self.settle * 1e9:
+                return 0  # 可能还在写入
+            # 先记下进度, 出错的文件改写后才再读取
+            st = self.files[path] = FileState(stat.st_size, stat.st_mtime_ns, stat.st_ino,
+                                              stat.st_size)
+            labels, result = calc_file_result(path, self.opts)
+            self.out.write(labels, result)
+            st.rows = result.size
+            return result.size
+
+        if old is None or old.inode != stat.st_ino or old.offset > stat.st_size:
+            old = FileState(inode=stat.st_ino)  # 新文件, 或已被替换 截断
+            self._formats.pop(path, None)
+        fmt = self._formats.get(path) or self._read_format(path)
+        if fmt is None:
+            return 0  # 表头还没写完
+        self._formats[path] = fmt
+        st = self.files[path] = FileState(stat.st_size, stat.st_mtime_ns, stat.st_ino,
+                                          max(old.offset, fmt.start), old.rows)
+        with open(path, 'rb') as fp:
+            fp.seek(st.offset)
+            chunk = fp.read(stat.st_size - st.offset)
+        end = chunk.rfind(b'\n') + 1  # 只解析完整的行
+        if end < len(chunk):
+            st.size = st.offset + end  # 未完整的行, 下一轮再读
+        if not end:
+            return 0
+        text = chunk[:end].decode(fmt.encoding, errors='replace')
+        st.offset += end  # 出错的块也跳过, 不再重复读取
+        n = self._write_rows(path, fmt, text, st.rows)
+        st.rows += n
+        return n
+
+    def _read_format(self, path: str) -> Union[_LogFormat, None]:
+        header, col = self.opts['header'] - 1, self.opts['col'] - 1
+        with open(path, 'rb') as fp:
+            head = fp.read(65536)
+        lines = head.splitlines(keepends=True)
+        if len(lines) <= header or not lines[header].endswith(b'\n'):
+            return None
+        encoding = get_encoding(path)
+        encoding = 'utf-8' if encoding in (None, 'ascii') else encoding  # 之后的行可能有中文
+        text = b''.join(lines[:header + 1]).decode(encoding, errors='replace')
+        delimiter = csv.Sniffer().sniff(text.splitlines()[-1]).delimiter  # 只看表头行
+        row = list(csv.reader(text.splitlines(), delimiter=delimiter))[-1]
+        while row and not row[-1].strip():  # 行末的分隔符
+            row.pop()
+        wavelengths = rows2float([row[col:]])[0]
+        if not np.isfinite(wavelengths).all():
+            raise ValueError('表头行不是波长')
+        start = sum(len(i) for i in lines[:header + 1])
+        return _LogFormat(encoding, delimiter, wavelengths, start)
+
+    def _write_rows(self, path: str, fmt: _LogFormat, text: str, done: int) -> int:
+        col, n = self.opts['col'] - 1, fmt.wavelengths.size
+        names, cells = [], []
+        for row in csv.reader(text.splitlines(), delimiter=fmt.delimiter):
+            data = (row[col:] + [''] * n)[:n]
+            if not any(i.strip() for i in data):
+                continue  # 空行
+            names.append(' '.join(row[:col]) or f'Data{done + len(names) + 1}')
+            cells.append(data)
+        if not cells:
+            return 0
+        try:
+            spec = rows2float(cells)
+        except ValueError:
+            # 逐行找出不是数字的行, 其余照常计算
+            good = []
+            for i, (name, data) in enumerate(zip(names, cells)):
+                try:
+                    rows2float([data])
+                    good.append(i)
+                except ValueError:
+                    print(f'{path}: {name} 数据格式不正确, 已跳过', file=sys.stderr)
+            if not good:
+                return 0
+            names = [names[i] for i in good]
+            spec = rows2float([cells[i] for i in good])
+        with instrument.stage('watch.rows', len(names)):
+            engine = colour_engine(tuple(fmt.wavelengths.tolist()),
+                                   *(self.opts[k] for k in ('si', 'va', 'unit', 'upper')),
+                                   self.opts.get('kind', 'cubic'),
+                                   self.opts.get('dtype', 'float64'))
+            result = ColourResult(engine.colour_values(spec.T)).select(self.opts['items'])
+        labels = np.c_[np.full(len(names), os.path.basename(path)), names]
+        self.out.write(labels, result)
+        return result.size
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='spec2hue watch', description='监视文件夹, 增量计算新增的光谱, 结果追加到 csv')
+    parser.add_argument('paths', nargs='+', help='文件夹或通配符')
+    parser.add_argument('--layout', default='columns', choices=('columns', 'rows'),
+                        help='columns 每列一个光谱(同 batch); rows 每行一个光谱, 表头行为波长, '
+                             '--col 之前的列为光谱名')
+    add_calc_arguments(parser)
+    parser.add_argument('-o', '--output', default=None,
+                        help='结果 csv 地址, 已有时追加; 默认输出到 stdout')
+    parser.add_argument('--decimals', default=None, type=int,
+                        help='csv 数值保留的小数位数, 默认完整精度')
+    parser.add_argument('--state', default=None,
+                        help='保存读取位置的 json 地址, 重启后继续')
+    parser.add_argument('--interval', default=0.5, type=float,
+                        help='检查间隔(秒), 默认 0.5')
+    parser.add_argument('--settle', default=0.2, type=float,
+                        help='columns 文件修改后等待的秒数, 默认 0.2')
+    parser.add_argument('--once', action='store_true', help='只检查一次')
+    return parser
+
+
+def main(argv: Sequence[str] = None) -> int:
+    args = _parser().parse_args(argv)
+    if args.output and not args.output.lower().endswith('.csv'):
+        print('watch 只能追加到 csv', file=sys.stderr)
+        return 2
+    opts = {k: getattr(args, k) for k in OPTION_KEYS}
+    out = CsvWriter(args.output or sys.stdout, args.items, LABEL_NAMES,
+                    decimals=args.decimals, append=True)
+    try:
+        watcher = FolderWatcher(args.paths, opts, out, args.layout, args.state, args.settle,
+                                [args.output])
+        watcher.run(args.interval, args.once)
+    except KeyboardInterrupt:
+        pass
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,478 @@
+# -*- coding: utf-8 -*-
+"""
+导出计算结果 csv xlsx npz, 不依赖 wx
+
+每个光谱一行: 先是标签列(文件名 光谱名等), 然后是各项目. 结果按块写入,
+数值按块整体格式化, 内存与总行数无关.
+
+    with open_writer('result.xlsx', ['X', 'Y', 'Z', 'sRGB'], ['name']) as w:
+        for labels, res in chunks:
+            w.write(labels, res)    # labels 为 (m, 1) 的字符串, res 为 ColourResult
+
+    labels, res, meta = read_npz('result.npz')
+"""
+import csv
+import json
+import os.path
+import shutil
+import tempfile
+import time
+import zipfile
+from typing import IO, Dict, Iterator, List, Sequence, Tuple, Union
+from xml.sax.saxutils import escape
+
+import instrument
+from cie import ColourResult
+from numpy import (asarray, ascontiguousarray, char, dtype as np_dtype, float64, frombuffer,
+                   isfinite, lib, load, ndarray)
+
+XLSX_MAX_ROWS = 1048576  # Excel 每个表的行数上限, 含表头
+EXPORT_CHUNK = 65536  # write_result 每块的光谱数
+FORMAT_CHUNK = 4096  # csv xlsx 每次格式化的行数, 限制字符串和 python 对象的内存
+
+
+def format_values(result: ColourResult, decimals: Union[int, None] = None) -> ndarray:
+    """
+    整块格式化为字符串, 行为 ``result.names``.
+
+    decimals 为 None 时为完整精度, 同 `ColourResult.to_strings`;
+    否则为 decimals 位小数的定点数. sRGB 行为 16进制颜色码, nan 为 'nan'.
+    """
+    if decimals is None:
+        return result.to_strings()
+    out = char.mod(f'%.{decimals}f', result.values)
+    if result.RGB in result.names:
+        out = out.astype(object)
+        out[result.names.index(result.RGB)] = result.hex
+        out = out.astype(str)
+    return out
+
+
+def format_lines(result: ColourResult, decimals: Union[int, None] = None,
+                 delimiter: str = ',') -> List[str]:
+    """
+    每个输入一行文字(不含换行), 各项以 delimiter 连接, 格式同 `format_values`.
+
+    每行用一个 % 格式串整体格式化; float64 的完整精度为 repr, 与 numpy 的字符串相同.
+    """
+    if decimals is None and result.values.dtype != float64:
+        # float32 的最短表示只有 numpy 能生成
+        return [delimiter.join(row) for row in result.to_strings().T.tolist()]
+    item = '%r' if decimals is None else f'%.{decimals}f'
+    i_rgb = result.names.index(result.RGB) if result.RGB in result.names else -1
+    fmt = delimiter.join('%s' if i == i_rgb else item for i in range(len(result.names)))
+    rows = result.values.T.tolist()
+    if i_rgb >= 0:
+        for row, h in zip(rows, result.hex.tolist()):
+            row[i_rgb] = h
+    return [fmt % tuple(row) for row in rows]
+
+
+def _quote(text: str) -> str:
+    # 同 csv.writer 的 QUOTE_MINIMAL
+    if any(c in text for c in ',"\r\n'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+class ResultWriter:
+    """
+    导出器的基类, 子类实现 `_write` 和 `_close`.
+
+    Parameters
+    ----------
+    names : sequence of str
+        输出的项目, `ColourResult` 的行名称, 'sRGB' 输出为 16进制颜色码.
+    label_names : sequence of str, default ('name',)
+        标签列的名称.
+    meta : dict or None
+        计算条件等, 如 si va unit upper; 只有 npz 保存.
+    """
+    suffix = ''
+    chunk = 0  # `_write` 每次的最大行数, 0 为不拆分
+
+    def __init__(self, names: Sequence[str], label_names: Sequence[str] = ('name',),
+                 meta: Union[Dict, None] = None):
+        self.names = tuple(names)
+        self.label_names = tuple(label_names)
+        self.meta = dict(meta or {})
+        self.rows = 0  # 已写入的光谱数
+        self._closed = False
+
+    def __enter__(self) -> 'ResultWriter':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def header(self) -> list:
+        return [*self.label_names, *self.names]
+
+    def write(self, labels: Union[ndarray, Sequence[Sequence[str]]], result: ColourResult):
+        """
+        写入一块.
+
+        Parameters
+        ----------
+        labels : array_like of str, 2-dim
+            形状 ``(result.size, len(label_names))``.
+        result : ColourResult
+            含 `names` 中的全部行, 其余行忽略.
+        """
+        if self._closed:
+            raise ValueError(f'{self.__class__}: 已关闭')
+        labels = asarray(labels, str)
+        if labels.size != result.size * len(self.label_names):
+            raise ValueError(f'{self.__class__}: 标签列数与 label_names 不一致')
+        labels = labels.reshape(result.size, len(self.label_names))
+        if result.names != self.names:
+            result = result.select(self.names)
+        with instrument.stage(f'writer.{self.suffix}', result.size, result.values.nbytes):
+            step = self.chunk or max(result.size, 1)
+            for start in range(0, result.size, step):
+                self._write(labels[start:start + step], result.take(slice(start, start + step)))
+        self.rows += result.size
+
+    def flush(self):
+        """已写入的内容落盘, 默认不做处理"""
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._close()
+
+    def _write(self, labels: ndarray, result: ColourResult):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class CsvWriter(ResultWriter):
+    """
+    csv, 第一行为表头, 格式同 `csv.writer` 的默认格式.
+
+    Parameters
+    ----------
+    path : str or text file
+        地址, 或已打开的文本文件(如 sys.stdout, 不关闭).
+    decimals : int or None, default None
+        数值保留的小数位数, None 为完整精度; 见 `format_values`.
+    append : bool, default False
+        追加到已有的文件末尾, 文件为空时才写表头; 用于增量计算, 见 `watch`.
+    names, label_names, meta
+        同 `ResultWriter`.
+    """
+    suffix = 'csv'
+    chunk = FORMAT_CHUNK
+
+    def __init__(self, path: Union[str, IO[str]], names: Sequence[str],
+                 label_names: Sequence[str] = ('name',), meta: Union[Dict, None] = None,
+                 decimals: Union[int, None] = None, append: bool = False):
+        super(CsvWriter, self).__init__(names, label_names, meta)
+        self.decimals = decimals
+        self._own = isinstance(path, str)
+        if self._own:
+            self._fp = open(path, 'a' if append else 'w', encoding='utf-8', newline='')
+        else:
+            self._fp = path
+        if not (append and self._own and self._fp.tell() > 0):
+            csv.writer(self._fp).writerow(self.header())
+
+    def _write(self, labels: ndarray, result: ColourResult):
+        lines = format_lines(result, self.decimals)
+        labels = [','.join(_quote(i) for i in row) for row in labels.tolist()]
+        self._fp.write(''.join(f'{a},{b}\r\n' for a, b in zip(labels, lines)))
+
+    def flush(self):
+        self._fp.flush()
+
+    def _close(self):
+        if self._own:
+            self._fp.close()
+        else:
+            self._fp.flush()
+
+
+_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_NS_PKG = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_NS_CT = 'http://schemas.openxmlformats.org/package/2006/content-types'
+_CT = 'application/vnd.openxmlformats-officedocument.spreadsheetml'
+_CT_REL = 'application/vnd.openxmlformats-package.relationships+xml'
+
+
+def _xml_text(text: str) -> str:
+    return '<c t="inlineStr"><is><t xml:space="preserve">%s</t></is></c>' % escape(text)
+
+
+class XlsxWriter(ResultWriter):
+    """
+    xlsx, 直接写出 SpreadsheetML, 工作表边生成边压缩写入 zip, 不依赖 openpyxl.
+
+    数值保存为数字, nan 为空单元格, 字符串为内联字符串;
+    超过 `XLSX_MAX_ROWS` 时续写到新表 data2 data3 ...
+
+    Parameters
+    ----------
+    path : str
+        地址.
+    sheet : str, default 'data'
+        表名.
+    compresslevel : int, default 1
+        zlib 压缩级别, 1 最快.
+    names, label_names, meta
+        同 `ResultWriter`.
+    """
+    suffix = 'xlsx'
+    chunk = FORMAT_CHUNK
+
+    def __init__(self, path: str, names: Sequence[str],
+                 label_names: Sequence[str] = ('name',), meta: Union[Dict, None] = None,
+                 sheet: str = 'data', compresslevel: int = 1):
+        super(XlsxWriter, self).__init__(names, label_names, meta)
+        self.path = path
+        self.sheet = sheet
+        self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True,
+                                    compresslevel=compresslevel)
+        self._ws: Union[IO[bytes], None] = None
+        self._sheets: List[str] = []
+        self._sheet_rows = 0
+        self._i_rgb = self.names.index(ColourResult.RGB) \
+            if ColourResult.RGB in self.names else -1
+        # 一行的数值单元格, sRGB 为字符串
+        self._fmt = ''.join('%s' if i == self._i_rgb else '<c><v>%r</v></c>'
+                            for i in range(len(self.names)))
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self._end_sheet()
+        name = self.sheet if not self._sheets else f'{self.sheet}{len(self._sheets) + 1}'
+        self._sheets.append(name)
+        self._ws = self._zip.open(f'xl/worksheets/sheet{len(self._sheets)}.xml', 'w',
+                                  force_zip64=True)
+        self._ws.write(f'{_XML}<worksheet xmlns="{_NS_MAIN}"><sheetData>'.encode())
+        self._ws.write(('<row>%s</row>' % ''.join(map(_xml_text, self.header()))).encode())
+        self._sheet_rows = 1
+
+    def _end_sheet(self):
+        if self._ws is not None:
+            self._ws.write(b'</sheetData></worksheet>')
+            self._ws.close()
+            self._ws = None
+
+    def _lines(self, labels: ndarray, result: ColourResult) -> List[str]:
+        values = result.values.T
+        rows = values.tolist()
+        hexes = [_xml_text(i) for i in result.hex.tolist()] if self._i_rgb >= 0 else None
+        bad = ~isfinite(values)
+        if self._i_rgb >= 0:
+            bad[:, self._i_rgb] = False
+        bad_rows = set(bad.any(axis=1).nonzero()[0].tolist())
+        fmt = self._fmt
+        out = []
+        for i, (label, row) in enumerate(zip(labels.tolist(), rows)):
+            if hexes is not None:
+                row[self._i_rgb] = hexes[i]
+            if i in bad_rows:
+                # 含 nan inf 的行逐个单元格生成, 空单元格不写
+                cells = ''.join(v if j == self._i_rgb else
+                                ('<c><v>%r</v></c>' % v if not bad[i, j] else '<c/>')
+                                for j, v in enumerate(row))
+            else:
+                cells = fmt % tuple(row)
+            out.append('<row>%s%s</row>' % (''.join(map(_xml_text, label)), cells))
+        return out
+
+    def _write(self, labels: ndarray, result: ColourResult):
+        lines = self._lines(labels, result)
+        start = 0
+        while start < len(lines):
+            if self._sheet_rows >= XLSX_MAX_ROWS:
+                self._new_sheet()
+            stop = start + XLSX_MAX_ROWS - self._sheet_rows
+            self._ws.write(''.join(lines[start:stop]).encode())
+            self._sheet_rows += len(lines[start:stop])
+            start = stop
+
+    def _close(self):
+        with instrument.stage('writer.xlsx.save', self.rows):
+            try:
+                self._end_sheet()
+                n = len(self._sheets)
+                self._zip.writestr('[Content_Types].xml', (
+                    f'{_XML}<Types xmlns="{_NS_CT}">'
+                    f'<Default Extension="rels" ContentType="{_CT_REL}"/>'
+                    '<Default Extension="xml" ContentType="application/xml"/>'
+                    f'<Override PartName="/xl/workbook.xml" ContentType="{_CT}.sheet.main+xml"/>'
+                    + ''.join(f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+                              f'ContentType="{_CT}.worksheet+xml"/>' for i in range(1, n + 1))
+                    + '</Types>'))
+                self._zip.writestr('_rels/.rels', (
+                    f'{_XML}<Relationships xmlns="{_NS_PKG}">'
+                    f'<Relationship Id="rId1" Type="{_NS_REL}/officeDocument" '
+                    'Target="xl/workbook.xml"/></Relationships>'))
+                self._zip.writestr('xl/workbook.xml', (
+                    f'{_XML}<workbook xmlns="{_NS_MAIN}" xmlns:r="{_NS_REL}"><sheets>'
+                    + ''.join(f'<sheet name="{escape(name)}" sheetId="{i}" r:id="rId{i}"/>'
+                              for i, name in enumerate(self._sheets, 1))
+                    + '</sheets></workbook>'))
+                self._zip.writestr('xl/_rels/workbook.xml.rels', (
+                    f'{_XML}<Relationships xmlns="{_NS_PKG}">'
+                    + ''.join(f'<Relationship Id="rId{i}" Type="{_NS_REL}/worksheet" '
+                              f'Target="worksheets/sheet{i}.xml"/>' for i in range(1, n + 1))
+                    + '</Relationships>'))
+            finally:
+                self._zip.close()
+
+
+def _npy_header(fp: IO[bytes], dtype: np_dtype, shape: Tuple[int, ...]):
+    lib.format.write_array_header_1_0(
+        fp, {'descr': lib.format.dtype_to_descr(dtype), 'fortran_order': False,
+             'shape': shape})
+
+
+class NpzWriter(ResultWriter):
+    """
+    npz, `numpy.load` 可直接读取, 见 `read_npz`.
+
+    成员:
+
+    - values: (行数, 项目数) 的数值, 计算的 dtype, sRGB 为 0xRRGGBB 整数;
+    - names, label_names: 项目和标签列的名称;
+    - labels: (行数, 标签列数) 的字符串;
+    - meta: 0-dim 字符串, `meta` 的 JSON.
+
+    各块先写入临时文件, 关闭时写入 zip, 数组的形状在关闭时才确定.
+    values 不压缩: 浮点数的尾数几乎不可压缩(约 7%), 压缩的耗时与写盘相当.
+
+    Parameters
+    ----------
+    path : str
+        地址.
+    compress : bool, default True
+        values 以外的成员 ZIP_DEFLATED 压缩, False 为全部 ZIP_STORED.
+    names, label_names, meta
+        同 `ResultWriter`.
+    """
+    suffix = 'npz'
+
+    def __init__(self, path: str, names: Sequence[str],
+                 label_names: Sequence[str] = ('name',), meta: Union[Dict, None] = None,
+                 compress: bool = True):
+        super(NpzWriter, self).__init__(names, label_names, meta)
+        self.path = path
+        self.compress = compress
+        self._dtype: Union[np_dtype, None] = None
+        self._values = tempfile.TemporaryFile()
+        # 标签按块保存为各自宽度的 <U 数组, 关闭时统一为最大宽度
+        self._labels = tempfile.TemporaryFile()
+        self._label_blocks: List[Tuple[int, np_dtype]] = []
+
+    def _write(self, labels: ndarray, result: ColourResult):
+        if self._dtype is None:
+            self._dtype = result.values.dtype
+        self._values.write(ascontiguousarray(result.values.T, self._dtype).tobytes())
+        self._labels.write(ascontiguousarray(labels).tobytes())
+        self._label_blocks.append((labels.shape[0], labels.dtype))
+
+    def _iter_labels(self, dtype: np_dtype) -> Iterator[bytes]:
+        self._labels.seek(0)
+        width = len(self.label_names)
+        for n, dt in self._label_blocks:
+            for start in range(0, n, EXPORT_CHUNK):
+                m = min(EXPORT_CHUNK, n - start)
+                block = frombuffer(self._labels.read(m * width * dt.itemsize), dt)
+                yield block.astype(dtype).tobytes()
+
+    def _member(self, zf: zipfile.ZipFile, name: str, compress: bool) -> IO[bytes]:
+        info = zipfile.ZipInfo(name, time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        return zf.open(info, 'w', force_zip64=True)
+
+    def _close(self):
+        dtype = self._dtype or np_dtype('float64')
+        label_dtype = np_dtype('<U1')
+        for _, dt in self._label_blocks:
+            label_dtype = max(label_dtype, dt, key=lambda i: i.itemsize)
+        try:
+            with instrument.stage('writer.npz.save', self.rows), \
+                    zipfile.ZipFile(self.path, 'w', allowZip64=True) as zf:
+                for key, arr in (('names', asarray(self.names, str)),
+                                 ('label_names', asarray(self.label_names, str)),
+                                 ('meta', asarray(json.dumps(self.meta, ensure_ascii=False)))):
+                    with self._member(zf, f'{key}.npy', self.compress) as fp:
+                        lib.format.write_array(fp, arr)
+                with self._member(zf, 'values.npy', False) as fp:
+                    _npy_header(fp, dtype, (self.rows, len(self.names)))
+                    self._values.seek(0)
+                    shutil.copyfileobj(self._values, fp, 1 << 20)
+                with self._member(zf, 'labels.npy', self.compress) as fp:
+                    _npy_header(fp, label_dtype, (self.rows, len(self.label_names)))
+                    for block in self._iter_labels(label_dtype):
+                        fp.write(block)
+        finally:
+            self._values.close()
+            self._labels.close()
+
+
+WRITERS = {'csv': CsvWriter, 'xlsx': XlsxWriter, 'npz': NpzWriter}
+
+
+def open_writer(path: str, names: Sequence[str], label_names: Sequence[str] = ('name',),
+                meta: Union[Dict, None] = None, **kwargs) -> ResultWriter:
+    """按扩展名选择 `WRITERS` 中的导出器, kwargs 传给导出器"""
+    suffix = os.path.splitext(path)[1][1:].lower()
+    if suffix not in WRITERS:
+        raise ValueError(f'不支持的导出格式: {suffix}, 可选 {list(WRITERS)}')
+    return WRITERS[suffix](path, names, label_names, meta, **kwargs)
+
+
+def write_result(path: str, labels: Union[ndarray, Sequence[Sequence[str]]],
+                 result: ColourResult, label_names: Sequence[str] = ('name',),
+                 meta: Union[Dict, None] = None, chunk: int = EXPORT_CHUNK, **kwargs):
+    """已在内存中的结果按块导出, 参数同 `open_writer` 和 `ResultWriter.write`"""
+    labels = asarray(labels, str).reshape(result.size, len(label_names))
+    with open_writer(path, result.names, label_names, meta, **kwargs) as w:
+        for start in range(0, result.size, chunk):
+            w.write(labels[start:start + chunk], result.take(slice(start, start + chunk)))
+
+
+def write_item_rows(path: str, header: Union[ndarray, Sequence[Sequence[str]]],
+                    result: ColourResult, decimals: Union[int, None] = None):
+    """
+    csv, 每个项目一行, 同 Spec2Hue 结果表格的布局; 格式同 `CsvWriter`.
+
+    Parameters
+    ----------
+    path : str
+        地址
+    header : array_like of str, 2-dim
+        表头各行, 第0列在项目名称列, 其余各列对应各输入; 可以没有行.
+    result : ColourResult
+        按 `names` 的顺序逐行写入, 每次只格式化一行.
+    decimals : int or None, default None
+        同 `format_values`.
+    """
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for row in header:
+            f.write(','.join(_quote(str(i)) for i in row) + '\r\n')
+        for name in result.names:
+            row = format_values(result.select([name]), decimals)[0].tolist()
+            f.write(','.join([_quote(name), *row]) + '\r\n')
+
+
+def read_npz(path: str) -> Tuple[ndarray, ColourResult, Dict]:
+    """
+    读取 `NpzWriter` 的文件.
+
+    Returns
+    -------
+    labels : ndarray of str 2-dim
+    result : ColourResult
+    meta : dict
+    """
+    with load(path) as npz:
+        result = ColourResult(npz['values'].T, npz['names'].tolist())
+        return npz['labels'], result, json.loads(npz['meta'].item())